@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+
+from eps_tlm_parser import *
+
+import argparse
+import array
+import enum
+import os
+import re
+import struct
+import sys
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+
+# ##############################
+# Beacon Parser
+# ##############################
+
+class EpsBeaconData:
+
+	class CUR(enum.Enum):
+		UHF =		0
+		CDH =		1
+		SBAND =		2
+		SMARD1 =	3
+		SMARD2 =	4
+		PL =		5
+		ADCS5V_1 =	6
+		ADCS5V_2 =	7
+		THM =		8
+		ADCS3V3_1 =	9
+		ADCS3V3_2 =	10
+		BAT =		11
+		BCR1 =		12
+		BCR2 =		13
+		BCR3A =		14
+		BCR3B =		15
+		def datatype():
+			return "h"	# int16
+		def bytecount():
+			return 2
+		def unit():
+			return "mA"
+
+	class RES(enum.Enum):
+		MAN	=	0
+		SW =	1
+		BRW =	2
+		def datatype():
+			return "b"	# uint8
+		def bytecount():
+			return 1
+		def unit():
+			return "1"
+
+	class VOL(enum.Enum):
+		BAT =	0
+		BCR1 =	1
+		BCR2 =	2
+		BCR3 =	3
+		def datatype():
+			return "h"	# int16
+		def bytecount():
+			return 2
+		def unit():
+			return "mV"
+
+	FIELDS = list(CUR) + list(RES) + list(VOL)
+
+	# whole beacon frame, little endian and unpadded
+	FRAME = struct.Struct("<" +
+		str(len(CUR)) + CUR.datatype() +
+		str(len(RES)) + RES.datatype() +
+		str(len(VOL)) + VOL.datatype())
+
+	def __init__(self):
+		self.rawBeacon = list()
+		self.beaconSize = len(EpsBeaconData.CUR) + len(EpsBeaconData.RES) + len(EpsBeaconData.VOL)
+		self.byteSize = len(EpsBeaconData.CUR) * EpsBeaconData.CUR.bytecount() + \
+						len(EpsBeaconData.RES) * EpsBeaconData.RES.bytecount() + \
+						len(EpsBeaconData.VOL) * EpsBeaconData.VOL.bytecount()
+		self.data = [0] * self.beaconSize
+
+	def __str__(self):
+		tmp = "Currents"
+		ret = "\n" + tmp + "\n"
+		for i in range(len(tmp)): ret += "="
+		for cur in EpsBeaconData.CUR:
+			ret += ("\n {:9s} | {:6d} | {:2s}").format(cur.name,
+						self.data[cur.value],
+						EpsBeaconData.CUR.unit())
+		tmp = "Resets"
+		ret += "\n\n" + tmp + "\n"
+		for i in range(len(tmp)): ret += "="
+		for res in EpsBeaconData.RES:
+			ret += ("\n {:9s} | {:6d} | {:2s}").format(res.name,
+						self.data[res.value + len(EpsBeaconData.CUR)],
+						EpsBeaconData.RES.unit())
+		tmp = "Voltages"
+		ret += "\n\n" + tmp + "\n"
+		for i in range(len(tmp)): ret += "="
+		for vol in EpsBeaconData.VOL:
+			ret += ("\n {:9s} | {:6d} | {:2s}").format(vol.name,
+						self.data[vol.value + len(EpsBeaconData.CUR) + len(EpsBeaconData.RES)],
+						EpsBeaconData.VOL.unit())
+		return ret
+
+	def fieldName(field):
+		return type(field).__name__ + "_" + field.name
+
+	def fieldUnit(field):
+		return type(field).unit()
+
+	HEX_PATTERN = re.compile(r"[a-fA-FxX]|\S{4}")
+
+	def textFormat(text):
+		return "hex" if EpsBeaconData.HEX_PATTERN.search(text) else "dec"
+
+	def rawBeaconFromText(text, format = "auto"):
+		# decimal ("12 0 255 ...") or hexadecimal ("0c 00 ff ..." or "0c00ff...") bytes
+		if format == "auto":
+			format = EpsBeaconData.textFormat(text)
+		try:
+			if format == "dec":
+				return bytes(map(int, text.split()))
+			elif format == "hex":
+				return bytes.fromhex(text.replace("0x", "").replace("0X", ""))
+		except ValueError:
+			pass
+		return None
+
+	def setRawBeacon(self, raw):
+		self.rawBeacon = EpsBeaconData.rawBeaconFromText(raw)
+		return self.rawBeacon is not None and len(self.rawBeacon) == self.byteSize
+
+	def parseBeacon(self):
+		self.data = list(EpsBeaconData.FRAME.unpack(self.rawBeacon))
+
+
+
+# ##############################
+# Beacon Batch Decoder
+# ##############################
+
+class EpsBeaconDecoder:
+
+	# raw frames are collected in one contiguous buffer and decoded in one pass
+
+	def __init__(self):
+		self.frames = bytearray()
+		self.errorCount = 0
+
+	def __len__(self):
+		return len(self.frames) // EpsBeaconData.FRAME.size
+
+	def addRawBeacon(self, rawBeacon):
+		if rawBeacon is None or len(rawBeacon) != EpsBeaconData.FRAME.size:
+			self.errorCount += 1
+			return False
+		self.frames += rawBeacon
+		return True
+
+	def addText(self, text, format = "auto"):
+		return self.addRawBeacon(EpsBeaconData.rawBeaconFromText(text, format))
+
+	def addBinary(self, data):
+		# concatenated raw frames, an incomplete trailing frame is discarded
+		end = len(data) - len(data) % EpsBeaconData.FRAME.size
+		if end != len(data): self.errorCount += 1
+		self.frames += data[:end]
+		return end == len(data)
+
+	def readStream(self, stream, format = "auto"):
+		# the encoding of a stream is detected once from its first beacon
+		for line in stream:
+			line = line.strip()
+			if line and not line.startswith("#"):
+				if format == "auto": format = EpsBeaconData.textFormat(line)
+				self.addText(line, format)
+
+	def readFile(self, fileName, format = "auto"):
+		if not os.path.isfile(fileName):
+			print("Specified beacon file " + fileName + " does not exist")
+			return False
+		if format == "auto":
+			with open(fileName, "rb") as file:
+				head = file.read(4096)
+			try:
+				head.decode("ascii")
+				format = "text"
+			except UnicodeDecodeError:
+				format = "bin"
+		if format == "bin":
+			with open(fileName, "rb") as file:
+				return self.addBinary(file.read())
+		with open(fileName, "r") as file:
+			self.readStream(file, "auto" if format == "text" else format)
+		return True
+
+	def decode(self):
+		# returns one array per EpsBeaconData.FIELDS member
+		if numpy is not None:
+			dtype = numpy.dtype([(EpsBeaconData.fieldName(field), "<i2" if type(field).bytecount() == 2 else "i1") for field in EpsBeaconData.FIELDS])
+			table = numpy.frombuffer(bytes(self.frames), dtype = dtype)		# copy, so frames can still be appended
+			return dict((field, table[EpsBeaconData.fieldName(field)]) for field in EpsBeaconData.FIELDS)
+
+		columns = dict((field, array.array(type(field).datatype())) for field in EpsBeaconData.FIELDS)
+		for column, values in zip(EpsBeaconData.FIELDS, zip(*EpsBeaconData.FRAME.iter_unpack(self.frames))):
+			columns[column].extend(values)
+		return columns
+
+	def writeToFile(self, fileName, columns = None):
+		if columns is None: columns = self.decode()
+		with open(fileName, "w") as of:
+			of.write(";".join(EpsBeaconData.fieldName(field) for field in EpsBeaconData.FIELDS) + ";\n")
+			for row in zip(*[columns[field] for field in EpsBeaconData.FIELDS]):
+				of.write(";".join(str(value) for value in row) + ";\n")
+
+
+
+# ##############################
+# Beacon Log Reader
+# ##############################
+
+class EpsBeaconLogReader(EpsTlmFileReader):
+
+	# timestamped beacon logs, one "<date> <time>;<beacon bytes>" line per beacon
+
+	FILE_EXTENSIONS = (".txt", ".log", ".bcn")
+	BATCH_SIZE = 10000
+	DUPLICATE_WINDOW = 60.0		# seconds in which an identical beacon counts as a repetition
+
+	# beacon field -> (telemetry channel, scale to the telemetry unit)
+	CHANNELS = {
+		EpsBeaconData.CUR.UHF:			((EpsTlmData.DEVICE.BCN, EpsTlmData.SOURCE.UHF,       EpsTlmData.TYPE.CURRENT), 1.0),
+		EpsBeaconData.CUR.CDH:			((EpsTlmData.DEVICE.BCN, EpsTlmData.SOURCE.CDH,       EpsTlmData.TYPE.CURRENT), 1.0),
+		EpsBeaconData.CUR.SBAND:		((EpsTlmData.DEVICE.BCN, EpsTlmData.SOURCE.SBAND,     EpsTlmData.TYPE.CURRENT), 1.0),
+		EpsBeaconData.CUR.SMARD1:		((EpsTlmData.DEVICE.BCN, EpsTlmData.SOURCE.SMARD1,    EpsTlmData.TYPE.CURRENT), 1.0),
+		EpsBeaconData.CUR.SMARD2:		((EpsTlmData.DEVICE.BCN, EpsTlmData.SOURCE.SMARD2,    EpsTlmData.TYPE.CURRENT), 1.0),
+		EpsBeaconData.CUR.PL:			((EpsTlmData.DEVICE.BCN, EpsTlmData.SOURCE.PL,        EpsTlmData.TYPE.CURRENT), 1.0),
+		EpsBeaconData.CUR.ADCS5V_1:		((EpsTlmData.DEVICE.BCN, EpsTlmData.SOURCE.ADCS5V_1,  EpsTlmData.TYPE.CURRENT), 1.0),
+		EpsBeaconData.CUR.ADCS5V_2:		((EpsTlmData.DEVICE.BCN, EpsTlmData.SOURCE.ADCS5V_2,  EpsTlmData.TYPE.CURRENT), 1.0),
+		EpsBeaconData.CUR.THM:			((EpsTlmData.DEVICE.BCN, EpsTlmData.SOURCE.THM,       EpsTlmData.TYPE.CURRENT), 1.0),
+		EpsBeaconData.CUR.ADCS3V3_1:	((EpsTlmData.DEVICE.BCN, EpsTlmData.SOURCE.ADCS3V3_1, EpsTlmData.TYPE.CURRENT), 1.0),
+		EpsBeaconData.CUR.ADCS3V3_2:	((EpsTlmData.DEVICE.BCN, EpsTlmData.SOURCE.ADCS3V3_2, EpsTlmData.TYPE.CURRENT), 1.0),
+		EpsBeaconData.CUR.BAT:			((EpsTlmData.DEVICE.BCN, EpsTlmData.SOURCE.CELL,      EpsTlmData.TYPE.CURRENT), 1.0),
+		EpsBeaconData.CUR.BCR1:			((EpsTlmData.DEVICE.BCN, EpsTlmData.SOURCE.BCR1,      EpsTlmData.TYPE.CURRENT), 1.0),
+		EpsBeaconData.CUR.BCR2:			((EpsTlmData.DEVICE.BCN, EpsTlmData.SOURCE.BCR2,      EpsTlmData.TYPE.CURRENT), 1.0),
+		EpsBeaconData.CUR.BCR3A:		((EpsTlmData.DEVICE.BCN, EpsTlmData.SOURCE.BCR3,      EpsTlmData.TYPE.CURRENT), 1.0),
+		EpsBeaconData.CUR.BCR3B:		((EpsTlmData.DEVICE.BCN, EpsTlmData.SOURCE.BCR3,      EpsTlmData.TYPE.CURRENTB), 1.0),
+		EpsBeaconData.RES.MAN:			((EpsTlmData.DEVICE.BCN, EpsTlmData.SOURCE.TTC,       EpsTlmData.TYPE.MANRESET), 1.0),
+		EpsBeaconData.RES.SW:			((EpsTlmData.DEVICE.BCN, EpsTlmData.SOURCE.TTC,       EpsTlmData.TYPE.SOFTRESET), 1.0),
+		EpsBeaconData.RES.BRW:			((EpsTlmData.DEVICE.BCN, EpsTlmData.SOURCE.TTC,       EpsTlmData.TYPE.BRWNOUTRESET), 1.0),
+		EpsBeaconData.VOL.BAT:			((EpsTlmData.DEVICE.BCN, EpsTlmData.SOURCE.CELL,      EpsTlmData.TYPE.VOLTAGE), 1e-3),
+		EpsBeaconData.VOL.BCR1:			((EpsTlmData.DEVICE.BCN, EpsTlmData.SOURCE.BCR1,      EpsTlmData.TYPE.VOLTAGE), 1e-3),
+		EpsBeaconData.VOL.BCR2:			((EpsTlmData.DEVICE.BCN, EpsTlmData.SOURCE.BCR2,      EpsTlmData.TYPE.VOLTAGE), 1e-3),
+		EpsBeaconData.VOL.BCR3:			((EpsTlmData.DEVICE.BCN, EpsTlmData.SOURCE.BCR3,      EpsTlmData.TYPE.VOLTAGE), 1e-3)
+	}
+
+	# ++++++++++++++++++++++++++
+
+	def __init__(self, fileName = "", mode = ""):
+		EpsTlmFileReader.__init__(self, fileName, mode)
+		self.recentBeacons = dict()
+		self.duplicateCount = 0
+
+	# ++++++++++++++++++++++++++
+
+	def isDuplicate(self, time, rawBeacon):
+		# a beacon has no counter, so in a stable state every beacon equals the
+		# one before; only repeats within the window of the last kept copy are
+		# dropped, so a stable state is still sampled once per window
+		lastTime = self.recentBeacons.get(rawBeacon)
+		if lastTime is not None and abs((time - lastTime).total_seconds()) < EpsBeaconLogReader.DUPLICATE_WINDOW:
+			return True
+		self.recentBeacons[rawBeacon] = time
+		if len(self.recentBeacons) > EpsBeaconLogReader.BATCH_SIZE:
+			horizon = datetime.timedelta(seconds = EpsBeaconLogReader.DUPLICATE_WINDOW)
+			self.recentBeacons = dict((raw, t) for raw, t in self.recentBeacons.items() if abs(time - t) <= horizon)
+		return False
+
+	# ++++++++++++++++++++++++++
+
+	def addBeacons(self, times, frames):
+		if not times: return
+		columns = zip(*EpsBeaconData.FRAME.iter_unpack(frames))
+		for field, column in zip(EpsBeaconData.FIELDS, columns):
+			cmd, scale = EpsBeaconLogReader.CHANNELS[field]
+			self.data[cmd].extend(zip(times, [value * scale for value in column]))
+		self.publish()
+
+	# ++++++++++++++++++++++++++
+
+	def readFile(self):
+		errorCount = 0
+		itemCount = 0
+
+		if not os.path.isfile(self.tlmFileName):
+			print("Specified beacon log " + self.tlmFileName + " does not exist")
+			return False
+
+		times = list()
+		frames = bytearray()
+		format = "auto"
+		try:
+			with open(self.tlmFileName, "r") as file:
+				for line in file:
+					line = line.strip()
+					if not line or line.startswith("#"): continue
+					itemCount += 1
+
+					tmp = line.split(";", 1)
+					time = parseTime(tmp[0].strip()) if len(tmp) == 2 else None
+					if time is None:
+						errorCount += 1
+						continue
+					if format == "auto": format = EpsBeaconData.textFormat(tmp[1])
+					rawBeacon = EpsBeaconData.rawBeaconFromText(tmp[1], format)
+					if rawBeacon is None or len(rawBeacon) != EpsBeaconData.FRAME.size:
+						errorCount += 1
+						continue
+					if self.isDuplicate(time, rawBeacon):
+						self.duplicateCount += 1
+						continue
+
+					times.append(time)
+					frames += rawBeacon
+					if len(times) >= EpsBeaconLogReader.BATCH_SIZE:
+						self.addBeacons(times, frames)
+						times = list()
+						frames = bytearray()
+		except (IOError, UnicodeDecodeError):
+			print("Error reading beacon log " + self.tlmFileName + ", error rate: " + str(errorCount) + "/" + str(itemCount))
+			return False
+
+		self.addBeacons(times, frames)
+		if self.modePrint:
+			print("Beacon log", self.tlmFileName, ":", itemCount - errorCount - self.duplicateCount, "beacons,", errorCount, "invalid,", self.duplicateCount, "duplicates")
+		return True
+
+
+
+# ##############################
+# Main
+# ##############################
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(prog = "EPS_Beacon_Parser", description = "Decodes files of EPS beacons, one beacon per line or concatenated binary frames")
+	parser.add_argument("beaconFile", nargs = "+", help = "beacon file")
+	parser.add_argument("-f", "--format", choices = ["auto", "dec", "hex", "bin"], default = "auto", help = "beacon encoding")
+	parser.add_argument("-o", "--output", help = "writes the decoded beacons into a *.csv file")
+	parser.add_argument("-l", "--log", help = "reads timestamped beacon logs into the telemetry channels", action = "store_true")
+	parser.add_argument("-d", "--database", help = "imports timestamped beacon logs into an SQLite telemetry store")
+	parser.add_argument("-p", "--print", help = "prints a summary per beacon log", action = "store_true")
+
+	args = parser.parse_args()
+	if args.log or args.database:
+		br = EpsBeaconLogReader(mode = "p" if args.print else "")
+		fileList = list()
+		for fileName in args.beaconFile:
+			if os.path.isdir(fileName):
+				br.setFolder(fileName)
+				fileList += br.fileList
+			else:
+				fileList.append(fileName)
+		br.setFile(fileList)
+		print("Parsing beacon logs", br.fileList)
+		if br.readFileList():
+			print("Parsing completed")
+		else:
+			print("Parsing failed")
+		br.sortAllData()
+		if args.output:
+			br.writeAllDataToFile(args.output)
+			print("Output file", args.output)
+		if args.database:
+			from eps_tlm_store import EpsTlmStore
+			with EpsTlmStore(args.database) as store:
+				print("Imported", store.addTlmData(br), "values into", args.database)
+		sys.exit(0)
+
+	decoder = EpsBeaconDecoder()
+	for fileName in args.beaconFile:
+		decoder.readFile(fileName, args.format)
+	columns = decoder.decode()
+	print("Decoded", len(decoder), "beacons,", decoder.errorCount, "invalid")
+
+	if args.output:
+		decoder.writeToFile(args.output, columns)
+		print("Output file", args.output)
+	elif len(decoder) > 0:
+		for field in EpsBeaconData.FIELDS:
+			values = columns[field]
+			print((" {:13s} | min {:6d} | max {:6d} | last {:6d} | {:2s}").format(EpsBeaconData.fieldName(field),
+				int(min(values)), int(max(values)), int(values[-1]), EpsBeaconData.fieldUnit(field)))
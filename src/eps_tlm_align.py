@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+
+from eps_tlm_parser import *
+
+import argparse
+import datetime
+import os
+
+import numpy
+
+
+
+# ###############################
+# #######   Aligned Table   #####
+# ###############################
+
+class EpsTlmAlignedTable:
+
+	class METHOD:
+		ASOF = "asof"			# last sample at or before the grid time
+		NEAREST = "nearest"		# closest sample
+		LINEAR = "linear"		# linear interpolation between the enclosing samples
+
+	# ++++++++++++++++++++++++++
+
+	def __init__(self, eps, cmds, cadence = None, method = METHOD.ASOF, tolerance = None, startTime = None, endTime = None):
+		# aligns the channels onto a grid of the given cadence in seconds or, without
+		# a cadence, onto the union of their time stamps; a grid time further than
+		# tolerance seconds from the samples used for it is NaN
+		self.cmds = list(cmds)
+		self.cadence = cadence
+		self.method = method
+		self.tolerance = tolerance
+		minimumTime = EpsTlmCatalog.MINIMUM_TIME.timestamp()
+		start = -math.inf if startTime is None else startTime.timestamp()
+		end = math.inf if endTime is None else endTime.timestamp()
+
+		channels = list()
+		for cmd in self.cmds:
+			if len(eps.data.get(cmd, ())) == 0:
+				channels.append((numpy.zeros(0), numpy.zeros(0)))
+				continue
+			t, v = eps.getArrays(cmd)
+			valid = t >= minimumTime
+			channels.append((t[valid], v[valid]))
+
+		if cadence is None:
+			times = numpy.unique(numpy.concatenate([t for t, v in channels])) if channels else numpy.zeros(0)
+			self.times = times[(times >= start) & (times <= end)]
+		else:
+			nonEmpty = [t for t, v in channels if len(t)]
+			if startTime is None: start = min(t[0] for t in nonEmpty) if nonEmpty else 0.0
+			if endTime is None: end = max(t[-1] for t in nonEmpty) if nonEmpty else -1.0
+			self.times = start + cadence * numpy.arange(max(0, int(math.floor((end - start) / cadence)) + 1))
+
+		self.values = numpy.full((len(self.times), len(self.cmds)), numpy.nan)
+		for column, (t, v) in enumerate(channels):
+			self.values[:, column] = EpsTlmAlignedTable.align(t, v, self.times, method, tolerance)
+
+	# ++++++++++++++++++++++++++
+
+	def align(t, v, grid, method = METHOD.ASOF, tolerance = None):
+		result = numpy.full(len(grid), numpy.nan)
+		if len(t) == 0 or len(grid) == 0:
+			return result
+		after = numpy.searchsorted(t, grid, side = "right")
+		before = after - 1
+		hasBefore = before >= 0
+		hasAfter = after < len(t)
+		before = numpy.clip(before, 0, len(t) - 1)
+		after = numpy.clip(after, 0, len(t) - 1)
+		distanceBefore = numpy.where(hasBefore, grid - t[before], numpy.inf)
+		distanceAfter = numpy.where(hasAfter, t[after] - grid, numpy.inf)
+
+		if method == EpsTlmAlignedTable.METHOD.ASOF:
+			valid = hasBefore & (distanceBefore <= (numpy.inf if tolerance is None else tolerance))
+			result[valid] = v[before[valid]]
+		elif method == EpsTlmAlignedTable.METHOD.NEAREST:
+			useAfter = distanceAfter < distanceBefore
+			index = numpy.where(useAfter, after, before)
+			distance = numpy.minimum(distanceBefore, distanceAfter)
+			valid = distance <= (numpy.inf if tolerance is None else tolerance)
+			result[valid] = v[index[valid]]
+		elif method == EpsTlmAlignedTable.METHOD.LINEAR:
+			exact = distanceBefore == 0
+			span = t[after] - t[before]
+			valid = exact | (hasBefore & hasAfter & (span > 0))
+			if tolerance is not None:
+				valid &= exact | ((distanceBefore <= tolerance) & (distanceAfter <= tolerance))
+			weight = numpy.divide(distanceBefore, span, out = numpy.zeros(len(grid)), where = span > 0)
+			interpolated = v[before] + (v[after] - v[before]) * weight
+			result[valid] = numpy.where(exact, v[before], interpolated)[valid]
+		else:
+			raise ValueError("Unknown alignment method " + str(method))
+		return result
+
+	# ++++++++++++++++++++++++++
+
+	def __len__(self):
+		return len(self.times)
+
+	def getColumn(self, cmd):
+		return self.values[:, self.cmds.index(cmd)]
+
+	def getDateTimes(self):
+		return [datetime.datetime.fromtimestamp(time) for time in self.times]
+
+	def getCompleteRows(self):
+		# mask of the grid times at which every channel has a value
+		return ~numpy.isnan(self.values).any(axis = 1)
+
+	# ++++++++++++++++++++++++++
+
+	def writeCsv(self, fileName):
+		with open(fileName, "w") as of:
+			of.write("DATE;TIME;" + "".join(EpsTlmData.cmdToString(cmd) + ";" for cmd in self.cmds) + "\n")
+			lines = list()
+			for time, row in zip(self.getDateTimes(), self.values.tolist()):
+				lines.append(str(time).replace(" ", ";") + ";" + "".join(("" if value != value else "{:f}".format(value)) + ";" for value in row) + "\n")
+				if len(lines) >= 10000:
+					of.write("".join(lines))
+					lines = list()
+			of.write("".join(lines))
+
+	def writeBinary(self, fileName):
+		# NumPy archive of the POSIX times, the value matrix and the channel names
+		numpy.savez(fileName, times = self.times, values = self.values,
+			channels = numpy.array([EpsTlmData.cmdToString(cmd) for cmd in self.cmds]))
+
+	def readBinary(fileName):
+		# (POSIX times, value matrix, channels) as written by writeBinary
+		with numpy.load(fileName) as archive:
+			return (archive["times"], archive["values"], [EpsTlmData.cmdFromString(name) for name in archive["channels"]])
+
+# ++++++++++++++++++++++++++
+
+def getAlignedTable(eps, cmds, cadence = None, method = EpsTlmAlignedTable.METHOD.ASOF, tolerance = None, startTime = None, endTime = None):
+	# the table is cached on eps per channel set and grid, and rebuilt once the
+	# data list of any of its channels is replaced or grows
+	cmds = tuple(cmds)
+	lists = tuple(eps.data.get(cmd) for cmd in cmds)
+	signature = (lists, tuple(len(data) if data is not None else 0 for data in lists))
+	key = (cmds, cadence, method, tolerance, startTime, endTime)
+	cache = getattr(eps, "alignCache", None)
+	if cache is None:
+		cache = eps.alignCache = dict()
+	cached = cache.get(key)
+	if cached is None or any(a is not b for a, b in zip(cached[0][0], lists)) or cached[0][1] != signature[1]:
+		table = EpsTlmAlignedTable(eps, cmds, cadence, method, tolerance, startTime, endTime)
+		# shared with every caller and the pandas adapters, so read only
+		table.times.flags.writeable = False
+		table.values.flags.writeable = False
+		cached = cache[key] = (signature, table)
+	return cached[1]
+
+
+
+# ###############################
+# ########     Main     #########
+# ###############################
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(prog = "EPS_TLM_Align", description = "Aligns EPS telemetry channels onto a common time base and exports them as one table")
+	parser.add_argument("tlmFile", help = "EPS telemetry *.tlm file or folder containing *.tlm files")
+	parser.add_argument("-c", "--channel", action = "append", help = "channel to align, e.g. EPS:BCR1:VOLTAGE (repeatable), all channels with data by default")
+	parser.add_argument("--cadence", type = float, metavar = "SECONDS", help = "fixed grid cadence, the union of the time stamps by default")
+	parser.add_argument("-m", "--method", default = EpsTlmAlignedTable.METHOD.ASOF,
+		choices = [EpsTlmAlignedTable.METHOD.ASOF, EpsTlmAlignedTable.METHOD.NEAREST, EpsTlmAlignedTable.METHOD.LINEAR], help = "fill method")
+	parser.add_argument("-t", "--tolerance", type = float, metavar = "SECONDS", help = "maximum distance to the samples used for a grid time")
+	parser.add_argument("--from", dest = "startTime", help = "start of the grid, e.g. 2017-05-20 13:00:00")
+	parser.add_argument("--to", dest = "endTime", help = "end of the grid")
+	parser.add_argument("-o", "--output", help = "output file, *.npz for a NumPy archive, CSV otherwise")
+
+	args = parser.parse_args()
+	startTime = None if args.startTime is None else parseTime(args.startTime)
+	endTime = None if args.endTime is None else parseTime(args.endTime)
+	if (args.startTime and startTime is None) or (args.endTime and endTime is None):
+		parser.error("invalid time, expected e.g. 2017-05-20 13:00:00")
+
+	fr = EpsTlmFileReader()
+	if os.path.isdir(args.tlmFile):
+		fr.setFolder(args.tlmFile, startTime, endTime)
+	else:
+		fr.setFile([args.tlmFile])
+	fr.readFileList()
+	fr.sortAllData()
+
+	if args.channel:
+		cmds = [EpsTlmData.cmdFromString(channel) for channel in args.channel]
+		if None in cmds:
+			parser.error("invalid channel in " + str(args.channel))
+	else:
+		cmds = [cmd for cmd in EpsTlmData.VALID_COMMANDS if len(fr.data[cmd]) > 0]
+
+	table = getAlignedTable(fr, cmds, args.cadence, args.method, args.tolerance, startTime, endTime)
+	print("Aligned", len(cmds), "channels onto", len(table), "grid times,", int(numpy.sum(table.getCompleteRows())), "complete")
+	if args.output:
+		if args.output.endswith(".npz"):
+			table.writeBinary(args.output)
+		else:
+			table.writeCsv(args.output)
+		print("Output file", args.output)
@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+
+from eps_tlm_parser import *
+
+import argparse
+import bisect
+import collections
+import datetime
+import heapq
+import math
+import os
+import struct
+import sys
+
+
+
+# ###############################
+# #######   Bit Packing   #######
+# ###############################
+
+def writeVarint(buffer, value):
+	# unsigned LEB128
+	while value > 0x7f:
+		buffer.append((value & 0x7f) | 0x80)
+		value >>= 7
+	buffer.append(value)
+
+def readVarint(buffer, offset):
+	value = 0
+	shift = 0
+	while True:
+		byte = buffer[offset]
+		offset += 1
+		value |= (byte & 0x7f) << shift
+		if byte < 0x80:
+			return (value, offset)
+		shift += 7
+
+def zigzag(value):
+	return (value << 1) if value >= 0 else ((-value << 1) - 1)
+
+def unzigzag(value):
+	return (value >> 1) if not value & 1 else -((value + 1) >> 1)
+
+# ++++++++++++++++++++++++++
+
+FLOAT_BITS = struct.Struct("<Q")
+FLOAT_VALUE = struct.Struct("<d")
+
+def floatToBits(value):
+	return FLOAT_BITS.unpack(FLOAT_VALUE.pack(value))[0]
+
+def bitsToFloat(bits):
+	return FLOAT_VALUE.unpack(FLOAT_BITS.pack(bits))[0]
+
+
+
+# ###############################
+# #######   Chunk Codec   #######
+# ###############################
+
+class EpsTlmChunk:
+
+	# up to CHUNK_SIZE samples of one channel, time stamps (in microseconds) are
+	# stored as zigzag varints of their delta of delta, which is a single zero
+	# byte for a regular cadence, values either as byte aligned Gorilla XOR of
+	# their float64 bits (lossless) or as varints of the delta of their
+	# quantization to resolution (error below resolution / 2)
+
+	__slots__ = ("count", "startTime", "endTime", "min", "max", "resolution", "times", "values")
+
+	def __init__(self, samples, resolution = None):
+		self.count = len(samples)
+		self.startTime = samples[0][0]
+		self.endTime = samples[-1][0]
+		self.min = min(sample[1] for sample in samples)
+		self.max = max(sample[1] for sample in samples)
+		self.resolution = resolution
+		self.times = EpsTlmChunk.encodeTimes([sample[0] for sample in samples])
+		if resolution is None:
+			self.values = EpsTlmChunk.encodeXor([sample[1] for sample in samples])
+		else:
+			self.values = EpsTlmChunk.encodeQuantized([sample[1] for sample in samples], resolution)
+
+	# ++++++++++++++++++++++++++
+
+	def encodeTimes(times):
+		buffer = bytearray()
+		lastTime = 0
+		lastDelta = 0
+		for time in times:
+			time = toMicroseconds(time)
+			delta = time - lastTime
+			writeVarint(buffer, zigzag(delta - lastDelta))
+			lastTime = time
+			lastDelta = delta
+		return bytes(buffer)
+
+	def decodeTimes(buffer, count):
+		times = list()
+		offset = 0
+		time = 0
+		delta = 0
+		lastSeconds = None
+		for i in range(count):
+			value, offset = readVarint(buffer, offset)
+			delta += unzigzag(value)
+			time += delta
+			seconds, microseconds = divmod(time, 1000000)
+			if seconds != lastSeconds:
+				# telemetry time stamps are mostly whole and often repeated seconds
+				lastSeconds = seconds
+				secondTime = datetime.datetime.fromtimestamp(seconds)
+			times.append(secondTime if microseconds == 0 else secondTime + datetime.timedelta(microseconds = microseconds))
+		return times
+
+	# ++++++++++++++++++++++++++
+
+	def encodeXor(values):
+		# 0 for a repeated value, else a header of (leading zero bytes * 8 +
+		# trailing zero bytes + 1) followed by the remaining bytes of the XOR
+		buffer = bytearray()
+		lastBits = 0
+		for value in values:
+			bits = floatToBits(value)
+			xor = bits ^ lastBits
+			lastBits = bits
+			if xor == 0:
+				buffer.append(0)
+				continue
+			leading = (64 - xor.bit_length()) >> 3
+			trailing = ((xor & -xor).bit_length() - 1) >> 3
+			buffer.append(leading * 8 + trailing + 1)
+			buffer += (xor >> (trailing * 8)).to_bytes(8 - leading - trailing, "little")
+		return bytes(buffer)
+
+	def decodeXor(buffer, count):
+		values = list()
+		offset = 0
+		bits = 0
+		for i in range(count):
+			header = buffer[offset]
+			offset += 1
+			if header:
+				header -= 1
+				length = 8 - (header >> 3) - (header & 7)
+				bits ^= int.from_bytes(buffer[offset:offset + length], "little") << ((header & 7) * 8)
+				offset += length
+			values.append(bitsToFloat(bits))
+		return values
+
+	# ++++++++++++++++++++++++++
+
+	def encodeQuantized(values, resolution):
+		buffer = bytearray()
+		lastValue = 0
+		for value in values:
+			value = round(value / resolution)
+			writeVarint(buffer, zigzag(value - lastValue))
+			lastValue = value
+		return bytes(buffer)
+
+	def decodeQuantized(buffer, count, resolution):
+		values = list()
+		offset = 0
+		value = 0
+		for i in range(count):
+			delta, offset = readVarint(buffer, offset)
+			value += unzigzag(delta)
+			values.append(value * resolution)
+		return values
+
+	# ++++++++++++++++++++++++++
+
+	def decode(self):
+		times = EpsTlmChunk.decodeTimes(self.times, self.count)
+		if self.resolution is None:
+			values = EpsTlmChunk.decodeXor(self.values, self.count)
+		else:
+			values = EpsTlmChunk.decodeQuantized(self.values, self.count, self.resolution)
+		return list(zip(times, values))
+
+	def nbytes(self):
+		return len(self.times) + len(self.values)
+
+# ++++++++++++++++++++++++++
+
+def toMicroseconds(time):
+	# local naive datetime (as created by fromtimestamp) to integer POSIX microseconds
+	return int(time.replace(microsecond = 0).timestamp()) * 1000000 + time.microsecond
+
+
+
+# ###############################
+# #####   Compressed Channel   ##
+# ###############################
+
+class EpsTlmCompressedChannel:
+
+	CHUNK_SIZE = 1024
+	CACHE_SIZE = 16		# decoded chunks kept per channel
+
+	def __init__(self, resolution = None, chunkSize = None):
+		# samples have to be appended in ascending time order
+		self.resolution = resolution
+		self.chunkSize = chunkSize if chunkSize is not None else EpsTlmCompressedChannel.CHUNK_SIZE
+		self.chunks = list()
+		self.chunkStartTimes = list()
+		self.pending = list()
+		self.cache = collections.OrderedDict()
+
+	# ++++++++++++++++++++++++++
+
+	def append(self, time, value):
+		self.pending.append((time, value))
+		if len(self.pending) >= self.chunkSize:
+			self.flush()
+
+	def extend(self, data):
+		for time, value in data:
+			self.append(time, value)
+		return self
+
+	def insert(self, data):
+		# data has to be sorted, but may start before the stored samples, e.g.
+		# the next of two overlapping files; only the chunks overlapping data
+		# are decoded and encoded again, merged with it
+		if len(data) == 0:
+			return self
+		lastTime = self.pending[-1][0] if self.pending else (self.chunks[-1].endTime if self.chunks else None)
+		if lastTime is None or data[0][0] >= lastTime:
+			return self.extend(data)
+		left, right = self.getChunkIndexRange(data[0][0], data[-1][0])
+		stored = list()
+		for index in range(left, right):
+			stored += self.getChunk(index)
+		self.cache.clear()
+		if right == len(self.chunks):
+			stored += self.pending
+			del self.chunks[left:]
+			del self.chunkStartTimes[left:]
+			self.pending = list()
+			return self.extend(heapq.merge(stored, data, key = lambda sample: sample[0]))
+		merged = list(heapq.merge(stored, data, key = lambda sample: sample[0]))
+		chunks = [EpsTlmChunk(merged[it:it + self.chunkSize], self.resolution) for it in range(0, len(merged), self.chunkSize)]
+		self.chunks[left:right] = chunks
+		self.chunkStartTimes[left:right] = [chunk.startTime for chunk in chunks]
+		return self
+
+	def flush(self):
+		if self.pending:
+			self.chunks.append(EpsTlmChunk(self.pending, self.resolution))
+			self.chunkStartTimes.append(self.pending[0][0])
+			self.pending = list()
+
+	def __len__(self):
+		return sum(chunk.count for chunk in self.chunks) + len(self.pending)
+
+	def nbytes(self):
+		return sum(chunk.nbytes() for chunk in self.chunks)
+
+	# ++++++++++++++++++++++++++
+
+	def getChunk(self, index):
+		samples = self.cache.get(index)
+		if samples is None:
+			samples = self.cache[index] = self.chunks[index].decode()
+			if len(self.cache) > EpsTlmCompressedChannel.CACHE_SIZE:
+				self.cache.popitem(last = False)
+		else:
+			self.cache.move_to_end(index)
+		return samples
+
+	def getChunkIndexRange(self, startTime = None, endTime = None):
+		# chunks which may contain samples within the window
+		left = 0 if startTime is None else max(0, bisect.bisect_right(self.chunkStartTimes, startTime) - 1)
+		right = len(self.chunks) if endTime is None else bisect.bisect_right(self.chunkStartTimes, endTime)
+		while left < right and startTime is not None and self.chunks[left].endTime < startTime:
+			left += 1
+		return (left, max(left, right))
+
+	def chunkIsInside(self, index, startTime = None, endTime = None):
+		chunk = self.chunks[index]
+		return (startTime is None or chunk.startTime >= startTime) and (endTime is None or chunk.endTime <= endTime)
+
+	def getChunkData(self, index, startTime = None, endTime = None):
+		samples = self.getChunk(index)
+		if self.chunkIsInside(index, startTime, endTime):
+			return samples
+		first = 0 if startTime is None else bisect.bisect_left(samples, (startTime,))
+		last = len(samples) if endTime is None else bisect.bisect_right(samples, (endTime, math.inf))
+		return samples[first:last]
+
+	def getPendingData(self, startTime = None, endTime = None):
+		return [sample for sample in self.pending if (startTime is None or sample[0] >= startTime) and (endTime is None or sample[0] <= endTime)]
+
+	# ++++++++++++++++++++++++++
+
+	def getData(self, startTime = None, endTime = None):
+		# only the chunks overlapping the window are decompressed
+		data = list()
+		left, right = self.getChunkIndexRange(startTime, endTime)
+		for index in range(left, right):
+			data += self.getChunkData(index, startTime, endTime)
+		return data + self.getPendingData(startTime, endTime)
+
+	def getValueRange(self, startTime = None, endTime = None):
+		# (min, max) within the window, chunks lying fully inside are answered from their summary
+		low = math.inf
+		high = -math.inf
+		left, right = self.getChunkIndexRange(startTime, endTime)
+		for index in range(left, right):
+			if self.chunkIsInside(index, startTime, endTime):
+				low = min(low, self.chunks[index].min)
+				high = max(high, self.chunks[index].max)
+			else:
+				for time, value in self.getChunkData(index, startTime, endTime):
+					low = min(low, value)
+					high = max(high, value)
+		for time, value in self.getPendingData(startTime, endTime):
+			low = min(low, value)
+			high = max(high, value)
+		return (low, high) if low <= high else None
+
+	def getDecimatedData(self, startTime = None, endTime = None, maxPoints = 2000):
+		# a window with more samples than maxPoints is drawn from the chunk
+		# summaries, each chunk inside it contributing its min and max without
+		# being decompressed
+		left, right = self.getChunkIndexRange(startTime, endTime)
+		if sum(self.chunks[index].count for index in range(left, right)) + len(self.pending) <= maxPoints:
+			return self.getData(startTime, endTime)
+		data = list()
+		for index in range(left, right):
+			chunk = self.chunks[index]
+			if self.chunkIsInside(index, startTime, endTime):
+				data.append((chunk.startTime, chunk.min))
+				data.append((chunk.endTime, chunk.max))
+			else:
+				data += self.getChunkData(index, startTime, endTime)
+		return data + self.getPendingData(startTime, endTime)
+
+
+
+# ###############################
+# #####   Compressed Data   #####
+# ###############################
+
+class EpsTlmCompressedData:
+
+	def __init__(self, resolutions = None, chunkSize = None):
+		# resolutions: cmd -> quantization step, channels without one are stored losslessly
+		self.resolutions = resolutions if resolutions is not None else dict()
+		self.chunkSize = chunkSize
+		self.data = dict()
+
+	# ++++++++++++++++++++++++++
+
+	def channel(self, cmd):
+		if cmd not in self.data:
+			self.data[cmd] = EpsTlmCompressedChannel(self.resolutions.get(cmd), self.chunkSize)
+		return self.data[cmd]
+
+	def addTlmData(self, eps):
+		# eps has to be sorted
+		for cmd in eps.data:
+			if eps.commandIsValid(cmd) and len(eps.data[cmd]) > 0:
+				self.channel(cmd).extend(eps.data[cmd]).flush()
+		return self
+
+	def readFileList(self, fileList, cmds = None, version = None):
+		# streams the records of the files into the chunks, one file at a time,
+		# without building the data lists of an EpsTlmData; records before
+		# EpsTlmCatalog.MINIMUM_TIME come from an unset clock and cannot be
+		# placed in time order, so they are skipped, and so are corrupt files
+		fr = EpsTlmFileReader()
+		if not fr.setSchema(version):
+			print("Unknown record format version " + str(version))
+			return False
+		minimumTime = EpsTlmCatalog.MINIMUM_TIME
+		self.corruptFiles = list()
+		for fileName in fileList:
+			samples = dict()
+			for batch in fr.iterRecordBatches([fileName], cmds = cmds):
+				for device, source, type, time, value in batch:
+					if time >= minimumTime:
+						samples.setdefault((device, source, type), list()).append((time, value))
+			if fr.corruptFiles:
+				self.corruptFiles += fr.corruptFiles
+				continue
+			for (device, source, type), data in samples.items():
+				data.sort(key = lambda sample: sample[0])
+				self.channel((EpsTlmData.DEVICE(device), EpsTlmData.SOURCE(source), EpsTlmData.TYPE(type))).insert(data)
+		for channel in self.data.values():
+			channel.flush()
+		return True
+
+	def toTlmData(self, startTime = None, endTime = None, mode = ""):
+		eps = EpsTlmData(mode)
+		for cmd, channel in self.data.items():
+			eps.data[cmd] = channel.getData(startTime, endTime)
+		return eps
+
+	def getData(self, cmd, startTime = None, endTime = None):
+		if cmd not in self.data: return list()
+		return self.data[cmd].getData(startTime, endTime)
+
+	def nbytes(self):
+		return sum(channel.nbytes() for channel in self.data.values())
+
+# ++++++++++++++++++++++++++
+
+def tlmDataSize(data):
+	# memory held by a list of (datetime, value) tuples, not counting shared objects twice
+	seen = set()
+	size = sys.getsizeof(data)
+	for item in data:
+		size += sys.getsizeof(item)
+		for member in item:
+			if id(member) not in seen:
+				seen.add(id(member))
+				size += sys.getsizeof(member)
+	return size
+
+
+
+# ###############################
+# ########     Main     #########
+# ###############################
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(prog = "EPS_TLM_Chunks", description = "Reports the memory of EPS telemetry channels in compressed chunks")
+	parser.add_argument("tlmFile", help = "EPS telemetry *.tlm file or folder containing *.tlm files")
+	parser.add_argument("-r", "--resolution", nargs = 2, action = "append", metavar = ("CHANNEL", "STEP"), help = "quantizes a channel to a step instead of storing it losslessly (repeatable)")
+	parser.add_argument("-c", "--chunk-size", dest = "chunkSize", type = int, default = None, help = "samples per chunk")
+	parser.add_argument("-v", "--verify", help = "checks that the decompressed data matches", action = "store_true")
+	parser.add_argument("-s", "--stream", help = "reads the files straight into the chunks, without the raw data lists to compare with", action = "store_true")
+
+	args = parser.parse_args()
+	resolutions = dict()
+	for channel, step in (args.resolution or list()):
+		cmd = EpsTlmData.cmdFromString(channel)
+		if cmd is None: parser.error("invalid channel " + channel)
+		resolutions[cmd] = float(step)
+
+	fr = EpsTlmFileReader()
+	if os.path.isdir(args.tlmFile):
+		fr.setFolder(args.tlmFile)
+	else:
+		fr.setFile([args.tlmFile])
+
+	if args.stream:
+		compressed = EpsTlmCompressedData(resolutions, args.chunkSize)
+		if not compressed.readFileList(sorted(fr.fileList)):
+			sys.exit(1)
+		print(" {:32s} | {:>8s} | {:>10s}".format("CHANNEL", "COUNT", "COMPRESSED"))
+		for cmd in EpsTlmData.VALID_COMMANDS:
+			if cmd in compressed.data:
+				print(" {:32s} | {:8d} | {:10d}".format(EpsTlmData.cmdToString(cmd), len(compressed.data[cmd]), compressed.data[cmd].nbytes()))
+		print("Total: {} bytes compressed".format(compressed.nbytes()))
+		if compressed.corruptFiles: print("Corrupt files:", compressed.corruptFiles)
+		sys.exit(0)
+
+	fr.readFileList()
+	fr.sortAllData()
+
+	compressed = EpsTlmCompressedData(resolutions, args.chunkSize).addTlmData(fr)
+	totalRaw = 0
+	totalCompressed = 0
+	print(" {:32s} | {:>8s} | {:>10s} | {:>10s} | {:>6s}".format("CHANNEL", "COUNT", "RAW", "COMPRESSED", "RATIO"))
+	for cmd in EpsTlmData.VALID_COMMANDS:
+		if cmd not in compressed.data: continue
+		channel = compressed.data[cmd]
+		raw = tlmDataSize(fr.data[cmd])
+		totalRaw += raw
+		totalCompressed += channel.nbytes()
+		print(" {:32s} | {:8d} | {:10d} | {:10d} | {:6.1f}".format(EpsTlmData.cmdToString(cmd), len(channel), raw, channel.nbytes(), raw / max(1, channel.nbytes())))
+		if args.verify:
+			data = channel.getData()
+			if resolutions.get(cmd) is None:
+				ok = data == fr.data[cmd]
+			else:
+				ok = len(data) == len(fr.data[cmd]) and all(a[0] == b[0] and abs(a[1] - b[1]) <= resolutions[cmd] / 2 * (1 + 1e-9) for a, b in zip(data, fr.data[cmd]))
+			if not ok: print("Verification of " + EpsTlmData.cmdToString(cmd) + " failed")
+	print("Total: {} bytes raw, {} bytes compressed ({:.1f}x)".format(totalRaw, totalCompressed, totalRaw / max(1, totalCompressed)))
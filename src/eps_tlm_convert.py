@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+from eps_tlm_parser import *
+
+import argparse
+import concurrent.futures
+import os
+import time
+
+
+
+# ###############################
+# ######   Batch Converter   ####
+# ###############################
+
+class Status:
+	CONVERTED = "converted"
+	SKIPPED = "up to date"
+	FAILED = "failed"
+
+# ++++++++++++++++++++++++++
+
+def csvFileNameFor(tlmFileName, outputDirectory = None):
+	baseName = stripTlmExtension(os.path.basename(tlmFileName))
+	if outputDirectory is None: outputDirectory = os.path.dirname(tlmFileName)
+	return os.path.join(outputDirectory, baseName + ".csv")
+
+def isUpToDate(tlmFileName, csvFileName):
+	return os.path.isfile(csvFileName) and os.path.getmtime(csvFileName) >= os.path.getmtime(tlmFileName)
+
+# ++++++++++++++++++++++++++
+
+def convertFile(tlmFileName, csvFileName, version = None, force = False):
+	# returns (tlmFileName, csvFileName, status, value count), the output is
+	# written to a temporary file first, so an interrupted run leaves no
+	# output which would be taken as up to date
+	if not force and isUpToDate(tlmFileName, csvFileName):
+		return (tlmFileName, csvFileName, Status.SKIPPED, 0)
+
+	fr = EpsTlmFileReader()
+	if not fr.setSchema(version):
+		print("Unknown record format version " + str(version))
+		return (tlmFileName, csvFileName, Status.FAILED, 0)
+	names = dict(((cmd[0].value, cmd[1].value, cmd[2].value), cmd[0].name + ";" + cmd[1].name + ";" + cmd[2].name + ";") for cmd in fr.data)
+	count = 0
+	lastTime = None
+	tmpFileName = csvFileName + ".tmp"
+	try:
+		with open(tmpFileName, "w") as of:
+			of.write("DEVICE;SOURCE;TYPE;DATE;TIME;VALUE;\n")
+			for batch in fr.iterRecordBatches([tlmFileName]):
+				lines = list()
+				for device, source, type, time, value in batch:
+					if time is not lastTime:
+						lastTime = time
+						timeText = str(time).replace(" ", ";")
+					lines.append("{}{};{:f};\n".format(names[(device, source, type)], timeText, value))
+				of.write("".join(lines))
+				count += len(batch)
+	except IOError:
+		print("Error converting telemetry file " + tlmFileName)
+		fr.corruptFiles.append(tlmFileName)
+
+	if fr.corruptFiles:
+		if os.path.exists(tmpFileName): os.remove(tmpFileName)
+		return (tlmFileName, csvFileName, Status.FAILED, count)
+	os.replace(tmpFileName, csvFileName)
+	return (tlmFileName, csvFileName, Status.CONVERTED, count)
+
+# ++++++++++++++++++++++++++
+
+def convertFiles(fileList, outputDirectory = None, jobs = None, version = None, force = False, progressCallback = do_nothing):
+	if outputDirectory is not None and not os.path.isdir(outputDirectory):
+		os.makedirs(outputDirectory)
+	# files whose *.csv files would have the same name, e.g. pass.tlm and
+	# pass.tlm.gz or two folders' pass.tlm with one output directory, fail
+	# instead of overwriting each other
+	csvFileNames = dict()
+	for file in uniqueFileList(fileList):
+		csvFileNames.setdefault(os.path.abspath(csvFileNameFor(file, outputDirectory)), list()).append(file)
+	results = list()
+	for csvFileName, files in csvFileNames.items():
+		if len(files) > 1:
+			print("Telemetry files " + ", ".join(files) + " would all be converted into " + csvFileName)
+			results += [(file, csvFileNameFor(file, outputDirectory), Status.FAILED, 0) for file in files]
+	fileList = [files[0] for files in csvFileNames.values() if len(files) == 1]
+	progressCallback(0.0)
+	with concurrent.futures.ProcessPoolExecutor(max_workers = jobs) as executor:
+		futures = [executor.submit(convertFile, file, csvFileNameFor(file, outputDirectory), version, force) for file in fileList]
+		for it, future in enumerate(concurrent.futures.as_completed(futures)):
+			results.append(future.result())
+			progressCallback(float(it + 1) / len(futures))
+	return sorted(results)
+
+
+
+# ###############################
+# ########     Main     #########
+# ###############################
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(prog = "EPS_TLM_Convert", description = "Converts EPS telemetry *.tlm files into one *.csv file each, in parallel")
+	parser.add_argument("tlmFile", nargs = "+", help = "EPS telemetry *.tlm file or folder containing *.tlm files")
+	parser.add_argument("-d", "--output-dir", dest = "outputDirectory", help = "directory for the *.csv files, next to the *.tlm files by default")
+	parser.add_argument("-j", "--jobs", type = int, default = None, help = "number of worker processes, all cores by default")
+	parser.add_argument("-f", "--force", help = "converts files even if their *.csv file is up to date", action = "store_true")
+	parser.add_argument("-p", "--print", help = "prints the result per file", action = "store_true")
+	parser.add_argument("--schema", help = "record format version, detected from the file name or content by default", choices = sorted(EpsTlmSchema.REGISTRY))
+
+	args = parser.parse_args()
+	if args.jobs is not None and args.jobs < 1:
+		parser.error("invalid number of jobs " + str(args.jobs) + ", expected at least 1")
+	fr = EpsTlmFileReader()
+	fileList = list()
+	for fileName in args.tlmFile:
+		if fr.setFolder(fileName):
+			fileList += sorted(fr.fileList)
+		elif os.path.isfile(fileName):
+			fileList.append(fileName)
+		else:
+			print("Specified telemetry file " + fileName + " does not exist")
+
+	startTime = time.time()
+	results = convertFiles(fileList, args.outputDirectory, args.jobs, args.schema, args.force)
+	elapsed = time.time() - startTime
+
+	if args.print:
+		for tlmFileName, csvFileName, status, count in results:
+			print(" {:10s} | {:9d} | {} -> {}".format(status, count, tlmFileName, csvFileName))
+	summary = dict((status, 0) for status in [Status.CONVERTED, Status.SKIPPED, Status.FAILED])
+	for result in results: summary[result[2]] += 1
+	print("{} files: {} converted, {} up to date, {} failed, {} values in {:.1f} s".format(len(results),
+		summary[Status.CONVERTED], summary[Status.SKIPPED], summary[Status.FAILED], sum(result[3] for result in results), elapsed))
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+
+from eps_tlm_parser import *
+
+import argparse
+import datetime
+import os
+
+import numpy
+
+
+
+# ###############################
+# #######   Energy Budget   #####
+# ###############################
+
+class EpsTlmEnergy:
+
+	# integrates power (voltage [V] x current [mA] = [mW]) over time windows,
+	# a power series is integrated once into its cumulative energy, so the
+	# energy of any number of windows is a vectorized lookup
+
+	class GAP_POLICY:
+		SKIP = "skip"					# no energy across a gap
+		HOLD = "hold"					# the last power is held across a gap
+		INTERPOLATE = "interpolate"		# the power is interpolated across a gap
+
+	SOURCES = [
+		("BCR1", (EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.BCR1, EpsTlmData.TYPE.VOLTAGE), (EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.BCR1, EpsTlmData.TYPE.CURRENT)),
+		("BCR2", (EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.BCR2, EpsTlmData.TYPE.VOLTAGE), (EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.BCR2, EpsTlmData.TYPE.CURRENT)),
+		("BCR3", (EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.BCR3, EpsTlmData.TYPE.VOLTAGE), (EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.BCR3, EpsTlmData.TYPE.CURRENT)),
+		("BCR3B", (EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.BCR3, EpsTlmData.TYPE.VOLTAGE), (EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.BCR3, EpsTlmData.TYPE.CURRENTB))
+	]
+
+	LOADS = [(source.name, (EpsTlmData.DEVICE.EPS, source, EpsTlmData.TYPE.VOLTAGE), (EpsTlmData.DEVICE.EPS, source, EpsTlmData.TYPE.CURRENT))
+		for source in [EpsTlmData.SOURCE.TTC, EpsTlmData.SOURCE.UHF, EpsTlmData.SOURCE.SBAND, EpsTlmData.SOURCE.CDH,
+			EpsTlmData.SOURCE.SMARD1, EpsTlmData.SOURCE.SMARD2, EpsTlmData.SOURCE.ADCS5V_1, EpsTlmData.SOURCE.ADCS5V_2,
+			EpsTlmData.SOURCE.ADCS3V3_1, EpsTlmData.SOURCE.ADCS3V3_2, EpsTlmData.SOURCE.PL, EpsTlmData.SOURCE.THM]]
+
+	BATTERY = ("BAT", (EpsTlmData.DEVICE.BAT, EpsTlmData.SOURCE.CELL, EpsTlmData.TYPE.VOLTAGE), (EpsTlmData.DEVICE.BAT, EpsTlmData.SOURCE.CELL, EpsTlmData.TYPE.CURRENT))
+
+	SUNLIGHT_POWER = 100.0		# mW of harvested power above which the satellite is taken to be in sunlight
+	MINIMUM_ORBIT = 30 * 60		# seconds between two detected sunrises
+
+	# ++++++++++++++++++++++++++
+
+	def __init__(self, eps, gapThreshold = 60.0, gapPolicy = GAP_POLICY.SKIP):
+		self.eps = eps
+		self.gapThreshold = gapThreshold
+		self.gapPolicy = gapPolicy
+		self.seriesCache = dict()
+		self.windowCache = dict()
+
+	# ++++++++++++++++++++++++++
+
+	def getPower(self, voltageCmd, currentCmd = None):
+		# (POSIX times, power in mW), a single command is taken as a power channel
+		# already, else the current is interpolated onto the voltage time stamps
+		minimumTime = EpsTlmCatalog.MINIMUM_TIME.timestamp()
+		if len(self.eps.data.get(voltageCmd, ())) == 0 or (currentCmd is not None and len(self.eps.data.get(currentCmd, ())) == 0):
+			return (numpy.zeros(0), numpy.zeros(0))
+		tv, v = self.eps.getArrays(voltageCmd)
+		valid = tv >= minimumTime
+		tv, v = tv[valid], v[valid]
+		if currentCmd is None:
+			return (tv, v)
+		ti, i = self.eps.getArrays(currentCmd)
+		valid = ti >= minimumTime
+		ti, i = ti[valid], i[valid]
+		if len(ti) == 0:
+			return (numpy.zeros(0), numpy.zeros(0))
+		inside = (tv >= ti[0]) & (tv <= ti[-1])
+		return (tv[inside], v[inside] * numpy.interp(tv[inside], ti, i))
+
+	def getSeries(self, voltageCmd, currentCmd = None, sign = 0):
+		# (times, power, cumulative energy in mWs, gap mask) of a power series,
+		# sign > 0 / < 0 keeps only its positive / negative part, cached until
+		# the data of one of the commands changes
+		arrays = tuple(self.eps.getArrays(cmd) if len(self.eps.data.get(cmd, ())) else None for cmd in (voltageCmd, currentCmd) if cmd is not None)
+		key = (voltageCmd, currentCmd, sign)
+		cached = self.seriesCache.get(key)
+		if cached is not None and all(a is b for a, b in zip(cached[0], arrays)):
+			return cached[1]
+
+		t, p = self.getPower(voltageCmd, currentCmd)
+		if sign > 0: p = numpy.maximum(p, 0.0)
+		if sign < 0: p = numpy.minimum(p, 0.0)
+		dt = numpy.diff(t)
+		gaps = dt > self.gapThreshold
+		if self.gapPolicy == EpsTlmEnergy.GAP_POLICY.SKIP:
+			segments = numpy.where(gaps, 0.0, 0.5 * (p[:-1] + p[1:]) * dt)
+		elif self.gapPolicy == EpsTlmEnergy.GAP_POLICY.HOLD:
+			segments = numpy.where(gaps, p[:-1] * dt, 0.5 * (p[:-1] + p[1:]) * dt)
+		else:
+			segments = 0.5 * (p[:-1] + p[1:]) * dt
+		series = (t, p, numpy.concatenate(([0.0], numpy.cumsum(segments))), gaps)
+		self.seriesCache[key] = (arrays, series)
+		return series
+
+	# ++++++++++++++++++++++++++
+
+	def cumulativeEnergy(self, series, times):
+		# energy in mWs from the first sample up to each of times
+		t, p, cumulative, gaps = series
+		if len(t) < 2:
+			return numpy.zeros(len(times))
+		x = numpy.clip(times, t[0], t[-1])
+		k = numpy.clip(numpy.searchsorted(t, x, side = "right") - 1, 0, len(t) - 2)
+		d = x - t[k]
+		dt = t[k + 1] - t[k]
+		slope = numpy.divide(p[k + 1] - p[k], dt, out = numpy.zeros(len(x)), where = dt > 0)
+		partial = p[k] * d + 0.5 * slope * d * d
+		if self.gapPolicy == EpsTlmEnergy.GAP_POLICY.SKIP:
+			partial = numpy.where(gaps[k], 0.0, partial)
+		elif self.gapPolicy == EpsTlmEnergy.GAP_POLICY.HOLD:
+			partial = numpy.where(gaps[k], p[k] * d, partial)
+		return cumulative[k] + partial
+
+	def integrate(self, voltageCmd, currentCmd = None, windows = None, sign = 0):
+		# energy in mWh per (startTime, endTime) window, the whole series without windows
+		series = self.getSeries(voltageCmd, currentCmd, sign)
+		if windows is None:
+			return numpy.array([series[2][-1] / 3600.0 if len(series[2]) else 0.0])
+		starts = numpy.array([window[0].timestamp() for window in windows], dtype = numpy.float64)
+		ends = numpy.array([window[1].timestamp() for window in windows], dtype = numpy.float64)
+		return (self.cumulativeEnergy(series, ends) - self.cumulativeEnergy(series, starts)) / 3600.0
+
+	def getEnergy(self, voltageCmd, currentCmd, startTime, endTime, sign = 0):
+		# energy in mWh of one window, cached until the power series changes
+		series = self.getSeries(voltageCmd, currentCmd, sign)
+		key = (voltageCmd, currentCmd, sign, startTime, endTime)
+		cached = self.windowCache.get(key)
+		if cached is None or cached[0] is not series:
+			cached = self.windowCache[key] = (series, float(self.integrate(voltageCmd, currentCmd, [(startTime, endTime)], sign)[0]))
+		return cached[1]
+
+	# ++++++++++++++++++++++++++
+
+	def getTimeRange(self):
+		ranges = [self.getSeries(voltageCmd, currentCmd)[0] for name, voltageCmd, currentCmd in EpsTlmEnergy.SOURCES + EpsTlmEnergy.LOADS + [EpsTlmEnergy.BATTERY]]
+		ranges = [t for t in ranges if len(t)]
+		if not ranges: return None
+		return (datetime.datetime.fromtimestamp(min(t[0] for t in ranges)), datetime.datetime.fromtimestamp(max(t[-1] for t in ranges)))
+
+	def getFixedWindows(self, length, startTime = None, endTime = None):
+		# consecutive windows of length seconds
+		if startTime is None or endTime is None:
+			timeRange = self.getTimeRange()
+			if timeRange is None: return list()
+			startTime = startTime or timeRange[0]
+			endTime = endTime or timeRange[1]
+		starts = numpy.arange(startTime.timestamp(), endTime.timestamp(), length)
+		return [(datetime.datetime.fromtimestamp(start), datetime.datetime.fromtimestamp(min(start + length, endTime.timestamp()))) for start in starts]
+
+	def getOrbitWindows(self, threshold = None):
+		# windows from one sunrise to the next, sunrise being the harvested power exceeding the threshold
+		if threshold is None: threshold = EpsTlmEnergy.SUNLIGHT_POWER
+		t = self.getSeries(*EpsTlmEnergy.SOURCES[0][1:])[0]
+		if len(t) == 0: return list()
+		total = numpy.zeros(len(t))
+		for name, voltageCmd, currentCmd in EpsTlmEnergy.SOURCES:
+			ts, ps = self.getSeries(voltageCmd, currentCmd)[:2]
+			if len(ts): total += numpy.interp(t, ts, ps, left = 0.0, right = 0.0)
+		sunlight = total > threshold
+		sunrises = t[1:][sunlight[1:] & ~sunlight[:-1]]
+		orbits = list()
+		for sunrise in sunrises:
+			if not orbits or sunrise - orbits[-1] >= EpsTlmEnergy.MINIMUM_ORBIT:
+				orbits.append(sunrise)
+		return [(datetime.datetime.fromtimestamp(start), datetime.datetime.fromtimestamp(end)) for start, end in zip(orbits[:-1], orbits[1:])]
+
+	# ++++++++++++++++++++++++++
+
+	def report(self, windows):
+		# per window (start, end, harvested, loads, battery charge, battery discharge) in mWh and the per source detail
+		harvested = numpy.zeros(len(windows))
+		loads = numpy.zeros(len(windows))
+		detail = dict()
+		for name, voltageCmd, currentCmd in EpsTlmEnergy.SOURCES:
+			detail[name] = self.integrate(voltageCmd, currentCmd, windows)
+			harvested += detail[name]
+		for name, voltageCmd, currentCmd in EpsTlmEnergy.LOADS:
+			detail[name] = self.integrate(voltageCmd, currentCmd, windows)
+			loads += detail[name]
+		name, voltageCmd, currentCmd = EpsTlmEnergy.BATTERY
+		charge = self.integrate(voltageCmd, currentCmd, windows, sign = 1)
+		discharge = self.integrate(voltageCmd, currentCmd, windows, sign = -1)
+		rows = [(window[0], window[1], harvested[i], loads[i], charge[i], discharge[i]) for i, window in enumerate(windows)]
+		return (rows, detail)
+
+	def reportToString(self, windows, showDetail = False):
+		rows, detail = self.report(windows)
+		lines = [" {:19s} | {:19s} | {:>10s} | {:>10s} | {:>10s} | {:>10s} | {:>10s}".format("START", "END", "HARVESTED", "LOADS", "CHARGE", "DISCHARGE", "BALANCE")]
+		for start, end, harvested, loads, charge, discharge in rows:
+			lines.append(" {:19s} | {:19s} | {:10.3f} | {:10.3f} | {:10.3f} | {:10.3f} | {:10.3f}".format(str(start), str(end),
+				harvested / 1000.0, loads / 1000.0, charge / 1000.0, discharge / 1000.0, (charge + discharge) / 1000.0))
+		lines.append(" {:41s} | {:10.3f} | {:10.3f} | {:10.3f} | {:10.3f} | {:10.3f}".format("Total [Wh]",
+			sum(row[2] for row in rows) / 1000.0, sum(row[3] for row in rows) / 1000.0, sum(row[4] for row in rows) / 1000.0,
+			sum(row[5] for row in rows) / 1000.0, sum(row[4] + row[5] for row in rows) / 1000.0))
+		if showDetail:
+			lines.append("")
+			for name, energy in detail.items():
+				lines.append(" {:10s} | {:10.3f} Wh".format(name, numpy.sum(energy) / 1000.0))
+		return "\n".join(lines)
+
+
+
+# ###############################
+# ########     Main     #########
+# ###############################
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(prog = "EPS_TLM_Energy", description = "Reports harvested, consumed and battery energy of EPS telemetry per time window or orbit")
+	parser.add_argument("tlmFile", help = "EPS telemetry *.tlm file or folder containing *.tlm files")
+	parser.add_argument("--from", dest = "startTime", help = "start of the report, e.g. 2017-05-20 13:00:00")
+	parser.add_argument("--to", dest = "endTime", help = "end of the report")
+	parser.add_argument("-w", "--window", type = float, metavar = "MINUTES", help = "reports consecutive windows of this length instead of one window")
+	parser.add_argument("--orbits", help = "reports one window per orbit, from sunrise to sunrise", action = "store_true")
+	parser.add_argument("--sunlight", type = float, default = EpsTlmEnergy.SUNLIGHT_POWER, help = "harvested power in mW above which the satellite is taken to be in sunlight")
+	parser.add_argument("-g", "--gap", type = float, default = 60.0, help = "sampling interval in seconds above which a gap is handled by the gap policy")
+	parser.add_argument("--gap-policy", dest = "gapPolicy", default = EpsTlmEnergy.GAP_POLICY.SKIP,
+		choices = [EpsTlmEnergy.GAP_POLICY.SKIP, EpsTlmEnergy.GAP_POLICY.HOLD, EpsTlmEnergy.GAP_POLICY.INTERPOLATE], help = "energy across gaps")
+	parser.add_argument("-d", "--detail", help = "prints the energy per source and load", action = "store_true")
+
+	args = parser.parse_args()
+	startTime = None if args.startTime is None else parseTime(args.startTime)
+	endTime = None if args.endTime is None else parseTime(args.endTime)
+	if (args.startTime and startTime is None) or (args.endTime and endTime is None):
+		parser.error("invalid time, expected e.g. 2017-05-20 13:00:00")
+
+	fr = EpsTlmFileReader()
+	if os.path.isdir(args.tlmFile):
+		fr.setFolder(args.tlmFile, startTime, endTime)
+	else:
+		fr.setFile([args.tlmFile])
+	fr.readFileList()
+	fr.sortAllData()
+
+	energy = EpsTlmEnergy(fr, args.gap, args.gapPolicy)
+	timeRange = energy.getTimeRange()
+	if timeRange is None:
+		print("No power telemetry")
+	else:
+		startTime = startTime or timeRange[0]
+		endTime = endTime or timeRange[1]
+		if args.orbits:
+			windows = [window for window in energy.getOrbitWindows(args.sunlight) if window[1] >= startTime and window[0] <= endTime]
+		elif args.window:
+			windows = energy.getFixedWindows(args.window * 60, startTime, endTime)
+		else:
+			windows = [(startTime, endTime)]
+		print(energy.reportToString(windows, args.detail))
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+from eps_tlm_parser import *
+
+import argparse
+import datetime
+import enum
+import os
+
+import numpy
+
+
+
+# ###############################
+# #######   Event Index   #######
+# ###############################
+
+class EpsTlmEventIndex:
+
+	class EVENT(enum.Enum):
+		GAP			= 0		# no telemetry at all for longer than the gap threshold
+		RESET		= 1		# reset counter increment
+		HEATER		= 2		# battery heater state change
+		LIMIT		= 3		# start of an excursion out of the limits
+
+	RESET_COMMANDS = [
+		(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.TTC, EpsTlmData.TYPE.MANRESET),
+		(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.TTC, EpsTlmData.TYPE.WDRESET),
+		(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.TTC, EpsTlmData.TYPE.SOFTRESET),
+		(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.TTC, EpsTlmData.TYPE.BRWNOUTRESET)
+	]
+
+	HEATER_COMMANDS = [
+		(EpsTlmData.DEVICE.BAT, EpsTlmData.SOURCE.BTTC, EpsTlmData.TYPE.HEATER_STATE1),
+		(EpsTlmData.DEVICE.BAT, EpsTlmData.SOURCE.BTTC, EpsTlmData.TYPE.HEATER_STATE2)
+	]
+
+	# ++++++++++++++++++++++++++
+
+	def __init__(self, eps, gapThreshold = 60.0, limits = None):
+		# limits: cmd -> (lower, upper), either bound may be None
+		self.gapThreshold = gapThreshold
+		self.limits = limits if limits is not None else dict()
+		self.cmds = [None] + list(EpsTlmData.VALID_COMMANDS)
+		self.__detect(eps)
+
+	# ++++++++++++++++++++++++++
+
+	def __detect(self, eps):
+		times = list()
+		kinds = list()
+		channels = list()
+		values = list()
+
+		def add(kind, channel, eventTimes, eventValues):
+			times.append(eventTimes)
+			kinds.append(numpy.full(len(eventTimes), kind.value, dtype = numpy.int8))
+			channels.append(numpy.full(len(eventTimes), channel, dtype = numpy.int16))
+			values.append(numpy.asarray(eventValues, dtype = numpy.float64))
+
+		# telemetry dropouts on the union of all sample times, value: gap duration;
+		# samples of an unset clock are left out
+		allTimes = [eps.getArrays(cmd)[0] for cmd in eps.data if cmd[0] != EpsTlmData.DEVICE.TMP and len(eps.data[cmd]) > 0]
+		if allTimes:
+			allTimes = numpy.unique(numpy.concatenate(allTimes))
+			allTimes = allTimes[allTimes >= EpsTlmCatalog.MINIMUM_TIME.timestamp()]
+			dt = numpy.diff(allTimes)
+			gaps = numpy.nonzero(dt > self.gapThreshold)[0]
+			add(EpsTlmEventIndex.EVENT.GAP, 0, allTimes[gaps], dt[gaps])
+
+		for channel, cmd in enumerate(self.cmds):
+			if cmd is None or not eps.commandIsValid(cmd) or len(eps.data[cmd]) == 0: continue
+			t, v = eps.getArrays(cmd)
+
+			# counter increments and heater state changes, value: new value
+			if cmd in EpsTlmEventIndex.RESET_COMMANDS or cmd in EpsTlmEventIndex.HEATER_COMMANDS:
+				dv = numpy.diff(v)
+				changes = numpy.nonzero(dv > 0 if cmd in EpsTlmEventIndex.RESET_COMMANDS else dv != 0)[0] + 1
+				kind = EpsTlmEventIndex.EVENT.RESET if cmd in EpsTlmEventIndex.RESET_COMMANDS else EpsTlmEventIndex.EVENT.HEATER
+				add(kind, channel, t[changes], v[changes])
+
+			# limit excursions, value: first value out of the limits
+			if cmd in self.limits:
+				lower, upper = self.limits[cmd]
+				outside = numpy.zeros(len(v), dtype = bool)
+				if lower is not None: outside |= v < lower
+				if upper is not None: outside |= v > upper
+				starts = numpy.nonzero(outside & ~numpy.concatenate(([False], outside[:-1])))[0]
+				add(EpsTlmEventIndex.EVENT.LIMIT, channel, t[starts], v[starts])
+
+		if times:
+			self.times = numpy.concatenate(times)
+			order = numpy.argsort(self.times, kind = "stable")
+			self.times = self.times[order]
+			self.kinds = numpy.concatenate(kinds)[order]
+			self.channels = numpy.concatenate(channels)[order]
+			self.values = numpy.concatenate(values)[order]
+		else:
+			self.times = numpy.zeros(0)
+			self.kinds = numpy.zeros(0, dtype = numpy.int8)
+			self.channels = numpy.zeros(0, dtype = numpy.int16)
+			self.values = numpy.zeros(0)
+
+	# ++++++++++++++++++++++++++
+
+	def __len__(self):
+		return len(self.times)
+
+	def getEvent(self, index):
+		# (time, kind, cmd, value), cmd is None for telemetry dropouts
+		return (datetime.datetime.fromtimestamp(self.times[index]),
+			EpsTlmEventIndex.EVENT(int(self.kinds[index])),
+			self.cmds[self.channels[index]],
+			float(self.values[index]))
+
+	def getEventIndexRange(self, startTime = None, endTime = None):
+		left = 0 if startTime is None else int(numpy.searchsorted(self.times, startTime.timestamp(), side = "left"))
+		right = len(self.times) if endTime is None else int(numpy.searchsorted(self.times, endTime.timestamp(), side = "right"))
+		return (left, max(left, right))
+
+	def getEvents(self, startTime = None, endTime = None, kinds = None):
+		left, right = self.getEventIndexRange(startTime, endTime)
+		indices = numpy.arange(left, right)
+		if kinds is not None:
+			indices = indices[numpy.isin(self.kinds[left:right], [kind.value for kind in kinds])]
+		return [self.getEvent(index) for index in indices]
+
+	def getNextEvent(self, time, kinds = None):
+		for index in range(int(numpy.searchsorted(self.times, time.timestamp(), side = "right")), len(self.times)):
+			if kinds is None or EpsTlmEventIndex.EVENT(int(self.kinds[index])) in kinds:
+				return self.getEvent(index)
+		return None
+
+	def eventToString(event):
+		time, kind, cmd, value = event
+		return "{} | {:6s} | {:32s} | {:10.3f}".format(str(time), kind.name, EpsTlmData.cmdToString(cmd) if cmd is not None else "-", value)
+
+# ++++++++++++++++++++++++++
+
+def getEventIndex(eps, gapThreshold = 60.0, limits = None):
+	# the index is cached on eps and rebuilt once any of its data lists is replaced or grows
+	signature = tuple((cmd, eps.data[cmd], len(eps.data[cmd])) for cmd in eps.data)
+	key = (gapThreshold, tuple(sorted((EpsTlmData.cmdToString(cmd), bounds) for cmd, bounds in (limits or dict()).items())))
+	cache = getattr(eps, "eventIndexCache", None)
+	if cache is None or len(cache[0]) != len(signature) or any(a[0] != b[0] or a[1] is not b[1] or a[2] != b[2] for a, b in zip(cache[0], signature)):
+		cache = eps.eventIndexCache = (signature, dict())
+	if key not in cache[1]:
+		cache[1][key] = EpsTlmEventIndex(eps, gapThreshold, limits)
+	return cache[1][key]
+
+
+
+# ###############################
+# ########     Main     #########
+# ###############################
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(prog = "EPS_TLM_Events", description = "Lists telemetry gaps, reset counter increments, heater state changes and limit excursions")
+	parser.add_argument("tlmFile", help = "EPS telemetry *.tlm file or folder containing *.tlm files")
+	parser.add_argument("-g", "--gap", type = float, default = 60.0, help = "telemetry gap threshold in seconds")
+	parser.add_argument("-l", "--limit", nargs = 3, action = "append", metavar = ("CHANNEL", "LOWER", "UPPER"), help = "limits of a channel, \"-\" for no bound (repeatable)")
+
+	args = parser.parse_args()
+	limits = dict()
+	for channel, lower, upper in (args.limit or list()):
+		cmd = EpsTlmData.cmdFromString(channel)
+		if cmd is None: parser.error("invalid channel " + channel)
+		limits[cmd] = (None if lower == "-" else float(lower), None if upper == "-" else float(upper))
+
+	fr = EpsTlmFileReader()
+	if os.path.isdir(args.tlmFile):
+		fr.setFolder(args.tlmFile)
+	else:
+		fr.setFile([args.tlmFile])
+	fr.readFileList()
+	fr.sortAllData()
+
+	index = getEventIndex(fr, args.gap, limits)
+	for event in index.getEvents():
+		print(EpsTlmEventIndex.eventToString(event))
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+
+from eps_tlm_parser import *
+
+
+# ##############################
+# Matplotlib Axes
+# ##############################
+
+# drawing into matplotlib axes without a GUI toolkit, shared by the Qt plot
+# canvas and the headless report
+
+def drawSamples(axes, cmd, times, values):
+	axes.cla()
+	axes.plot(times, values, "b-", markersize = 2)
+	axes.set_xlabel("Time")
+	axes.set_ylabel(str(cmd[2].name) + " [" + EpsTlmData.TYPE.physicalUnit(cmd[2]) + "]")
+	axes.legend([str(cmd[1].name)])
+
+def drawSpectrum(axes, cmd, spectrum):
+	axes.cla()
+	if len(spectrum) == 0 or len(spectrum.frequencies) == 0:
+		return False
+	axes.semilogx(spectrum.getPeriods() / 60.0, spectrum.power[0], "b-")
+	for period, power in spectrum.getDominantPeriods(1):
+		axes.axvline(period / 60.0, color = "r", linestyle = "--")
+	axes.set_xlabel("Period [min]")
+	axes.set_ylabel(str(cmd[2].name) + " Power [" + spectrum.getUnit() + "]")
+	axes.legend([str(cmd[1].name)])
+	return True
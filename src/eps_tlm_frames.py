@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+from eps_tlm_parser import *
+from eps_tlm_align import EpsTlmAlignedTable, getAlignedTable
+
+import argparse
+import datetime
+import os
+
+import numpy
+
+try:
+	import pandas
+except ImportError:
+	pandas = None
+
+
+
+# ###############################
+# ######   Array Adapters   #####
+# ###############################
+
+def toDatetime64(times):
+	# POSIX seconds -> datetime64[ns] of the local wall clock, as the naive
+	# datetimes of EpsTlmData; the UTC offset is looked up once per quarter
+	# hour present, which is where daylight saving changes happen
+	times = numpy.asarray(times, dtype = numpy.float64)
+	if len(times) == 0:
+		return numpy.zeros(0, dtype = "datetime64[ns]")
+	quarters, inverse = numpy.unique(numpy.floor(times / 900.0), return_inverse = True)
+	offsets = numpy.array([(datetime.datetime.fromtimestamp(quarter * 900.0) -
+		datetime.datetime.fromtimestamp(quarter * 900.0, datetime.timezone.utc).replace(tzinfo = None)).total_seconds() for quarter in quarters])
+	return numpy.round((times + offsets[inverse.reshape(times.shape)]) * 1e9).astype(numpy.int64).view("datetime64[ns]")
+
+def getUnits(cmds):
+	return dict((EpsTlmData.cmdToString(cmd), EpsTlmData.TYPE.physicalUnit(cmd[2])) for cmd in cmds)
+
+# ++++++++++++++++++++++++++
+
+def getChannelArrays(eps, cmd, startTime = None, endTime = None):
+	# (datetime64[ns] times, float64 values) of a sorted channel; the values
+	# are a view of the array cache of eps, the times are converted once and
+	# cached on eps alongside it, windows are views of both
+	t, v = eps.getArrays(cmd)
+	cache = getattr(eps, "datetimeCache", None)
+	if cache is None:
+		cache = eps.datetimeCache = dict()
+	cached = cache.get(cmd)
+	if cached is None or cached[0] is not t:
+		cached = cache[cmd] = (t, toDatetime64(t))
+		cached[1].flags.writeable = False
+	left = 0 if startTime is None else int(numpy.searchsorted(t, startTime.timestamp(), side = "left"))
+	right = len(t) if endTime is None else int(numpy.searchsorted(t, endTime.timestamp(), side = "right"))
+	right = max(left, right)
+	return (cached[1][left:right], v[left:right])
+
+def getChannelSetArrays(eps, cmds = None, startTime = None, endTime = None):
+	# cmd -> (times, values) as of getChannelArrays, by default of all channels with data
+	if cmds is None:
+		cmds = [cmd for cmd in EpsTlmData.VALID_COMMANDS if len(eps.data[cmd]) > 0]
+	return dict((cmd, getChannelArrays(eps, cmd, startTime, endTime)) for cmd in cmds)
+
+
+
+# ###############################
+# ######   Pandas Adapters   ####
+# ###############################
+
+def requirePandas():
+	if pandas is None:
+		raise ImportError("pandas is required for Series and DataFrame access to the telemetry data")
+
+# ++++++++++++++++++++++++++
+
+def toSeries(eps, cmd, startTime = None, endTime = None):
+	# Series of a sorted channel with a DatetimeIndex, sharing the memory of
+	# getChannelArrays; attrs hold channel name and unit
+	requirePandas()
+	times, values = getChannelArrays(eps, cmd, startTime, endTime)
+	name = EpsTlmData.cmdToString(cmd)
+	series = pandas.Series(values, index = pandas.DatetimeIndex(times, copy = False, name = "time"), name = name, copy = False)
+	series.attrs["channel"] = name
+	series.attrs["unit"] = EpsTlmData.TYPE.physicalUnit(cmd[2])
+	return series
+
+def toDataFrame(eps, cmds = None, cadence = None, method = EpsTlmAlignedTable.METHOD.ASOF, tolerance = None, startTime = None, endTime = None):
+	# one column per channel, aligned as by getAlignedTable; without a cadence
+	# and tolerance 0 a cell holds the sample at exactly that time stamp or
+	# NaN. the frame shares the value matrix of the cached aligned table,
+	# attrs["units"] maps the column names to their units
+	requirePandas()
+	if cmds is None:
+		cmds = [cmd for cmd in EpsTlmData.VALID_COMMANDS if len(eps.data[cmd]) > 0]
+	if cadence is None and tolerance is None and method == EpsTlmAlignedTable.METHOD.ASOF:
+		tolerance = 0.0
+	table = getAlignedTable(eps, cmds, cadence, method, tolerance, startTime, endTime)
+	columns = [EpsTlmData.cmdToString(cmd) for cmd in table.cmds]
+	frame = pandas.DataFrame(table.values, index = pandas.DatetimeIndex(toDatetime64(table.times), copy = False, name = "time"),
+		columns = columns, copy = False)
+	frame.attrs["units"] = getUnits(table.cmds)
+	return frame
+
+def toLongDataFrame(eps, cmds = None, startTime = None, endTime = None):
+	# (time, channel, value) rows of all samples, channel being categorical; a copy
+	requirePandas()
+	arrays = getChannelSetArrays(eps, cmds, startTime, endTime)
+	names = [EpsTlmData.cmdToString(cmd) for cmd in arrays]
+	frame = pandas.DataFrame({
+		"time": numpy.concatenate([times for times, values in arrays.values()]) if arrays else numpy.zeros(0, dtype = "datetime64[ns]"),
+		"channel": pandas.Categorical.from_codes(numpy.repeat(numpy.arange(len(names)), [len(values) for times, values in arrays.values()]), names),
+		"value": numpy.concatenate([values for times, values in arrays.values()]) if arrays else numpy.zeros(0)
+	})
+	frame.attrs["units"] = getUnits(arrays)
+	return frame
+
+
+
+# ###############################
+# ########     Main     #########
+# ###############################
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(prog = "EPS_TLM_Frames", description = "Loads EPS telemetry into a pandas DataFrame and summarises or saves it")
+	parser.add_argument("tlmFile", help = "EPS telemetry *.tlm file or folder containing *.tlm files")
+	parser.add_argument("-c", "--channel", action = "append", help = "channel to include, e.g. EPS:BCR1:VOLTAGE (repeatable), all channels with data by default")
+	parser.add_argument("--cadence", type = float, metavar = "SECONDS", help = "aligns the channels onto a fixed grid, the union of the time stamps by default")
+	parser.add_argument("--long", help = "one row per sample instead of one column per channel", action = "store_true")
+	parser.add_argument("-o", "--output", help = "output file, *.parquet, *.csv or a pickle otherwise")
+
+	args = parser.parse_args()
+	requirePandas()
+	cmds = None
+	if args.channel:
+		cmds = [EpsTlmData.cmdFromString(channel) for channel in args.channel]
+		if None in cmds:
+			parser.error("invalid channel in " + str(args.channel))
+
+	fr = EpsTlmFileReader()
+	if os.path.isdir(args.tlmFile):
+		fr.setFolder(args.tlmFile)
+		fr.readFileList()
+	else:
+		fr.setFile(args.tlmFile)
+		fr.readFile()
+	fr.sortAllData()
+
+	frame = toLongDataFrame(fr, cmds) if args.long else toDataFrame(fr, cmds, args.cadence)
+	print(frame.describe().transpose() if not args.long else frame.groupby("channel", observed = True)["value"].describe())
+	if args.output:
+		if args.output.endswith(".parquet"):
+			frame.to_parquet(args.output)
+		elif args.output.endswith(".csv"):
+			frame.to_csv(args.output)
+		else:
+			frame.to_pickle(args.output)
+		print("Output file", args.output)
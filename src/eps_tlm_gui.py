@@ -1,15 +1,15 @@
 #!/usr/bin/env python3
 
+import time
+startupTime = time.perf_counter()
+
 from eps_tlm_parser import *
-from eps_beacon_gui import *
+from eps_tlm_events import *
+from eps_beacon_parser import *
 
 import sys
 import argparse
 
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
-import matplotlib.pyplot as plt
-
 from PyQt5.QtWidgets import *
 from PyQt5.QtGui import *
 from PyQt5.QtCore import *
@@ -27,6 +27,8 @@ class Status:
 
 class EpsTlmGuiApp(QWidget):
 	DEVICE, SOURCE, TYPE = range(3)
+	EVENT_WINDOW = 600		# seconds shown around an event
+	STARTUP_BUDGET = 0.5	# seconds from launch until the window is shown
 
 	def __init__(self):
 		QWidget.__init__(self)
@@ -49,6 +51,7 @@ class EpsTlmGuiApp(QWidget):
 
 		# Data Treeview
 		self.__setupDerivedData()
+		self.snapshot = self.eps.getSnapshot()		# the data shown, updated once loading is done
 		self.dataSelectionTreeview = QTreeView()
 		self.dataSelectionTreeview.setRootIsDecorated(False)
 		self.dataSelectionTreeview.setAlternatingRowColors(True)
@@ -62,6 +65,10 @@ class EpsTlmGuiApp(QWidget):
 		self.controlsLayout = QHBoxLayout()
 		self.openFilesButton = QPushButton("Open Files")
 		self.openFilesButton.setToolTip("Loads EPS telemetry files, so their data content can be displayed.")
+		self.openFolderButton = QPushButton("Open Folder")
+		self.openFolderButton.setToolTip("Loads the EPS telemetry files of a folder which overlap a time window.")
+		self.openDatabaseButton = QPushButton("Open Database")
+		self.openDatabaseButton.setToolTip("Loads a time window of an EPS telemetry database, see eps_tlm_store.py.")
 		self.saveDataButton = QPushButton("Save Data")
 		self.saveDataButton .setToolTip("Saves the currently loaded data into a CSV file.")
 		self.convertFilesButton = QPushButton("Convert Files")
@@ -71,11 +78,28 @@ class EpsTlmGuiApp(QWidget):
 		self.showBeaconButton = QPushButton("Beacon Reader")
 		self.showBeaconButton.setToolTip("Toggle beacon reader panel.")
 		self.showBeaconButton.setCheckable(True)
+		self.showSamplesButton = QPushButton("Samples")
+		self.showSamplesButton.setToolTip("Toggle sample table panel.")
+		self.showSamplesButton.setCheckable(True)
+		self.showEventsButton = QPushButton("Events")
+		self.showEventsButton.setToolTip("Toggle event list panel.")
+		self.showEventsButton.setCheckable(True)
+		self.loadLimitsButton = QPushButton("Limits")
+		self.loadLimitsButton.setToolTip("Loads a JSON limit table, whose excursions are listed as events.")
+		self.showSpectrumButton = QPushButton("Spectrum")
+		self.showSpectrumButton.setToolTip("Toggle between the samples and the spectrum of the shown time range.")
+		self.showSpectrumButton.setCheckable(True)
 		self.controlsLayout.addWidget(self.openFilesButton)
+		self.controlsLayout.addWidget(self.openFolderButton)
+		self.controlsLayout.addWidget(self.openDatabaseButton)
 		self.controlsLayout.addWidget(self.saveDataButton)
 		self.controlsLayout.addWidget(self.convertFilesButton)
 		self.controlsLayout.addWidget(self.resetDataButton)
 		self.controlsLayout.addWidget(self.showBeaconButton)
+		self.controlsLayout.addWidget(self.showSamplesButton)
+		self.controlsLayout.addWidget(self.showEventsButton)
+		self.controlsLayout.addWidget(self.loadLimitsButton)
+		self.controlsLayout.addWidget(self.showSpectrumButton)
 		self.layout.addLayout(self.controlsLayout)
 
 		# Helper Widgets
@@ -85,8 +109,12 @@ class EpsTlmGuiApp(QWidget):
 		self.layout.addWidget(self.loadingBar)
 
 		# Plotting Widgets
-		self.plotCanvas = PlotCanvas(self)
-		self.layout.addWidget(self.plotCanvas)
+		self.selectedCmd = EpsTlmData.VALID_COMMANDS[0]		# some arbitrary init cmd
+		self.plotCanvas = None
+		self.plotPlaceholder = QLabel("No data selected")
+		self.plotPlaceholder.setAlignment(Qt.AlignCenter)
+		self.plotPlaceholder.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+		self.layout.addWidget(self.plotPlaceholder)
 		self.timeSliderStart = QSlider()
 		self.timeSliderStart.setOrientation(Qt.Horizontal)
 		self.timeSliderEnd = QSlider()
@@ -104,15 +132,21 @@ class EpsTlmGuiApp(QWidget):
 		self.timeLayout.addWidget(self.timeSliderEnd)
 		self.layout.addLayout(self.timeLayout)
 
-		# Beacon Widget
-		self.beaconWidget = EpsBeaconWidget()
-		self.beaconWidget.setMinimumWidth(190)
-		self.beaconWidget.setMaximumWidth(230)
-		self.mainLayout.addWidget(self.beaconWidget)
+		# Beacon Widget and Sample Table
+		self.beaconWidget = None
+		self.sampleWidget = None
+
+		# Event List
+		self.eventIndex = None
+		self.eventLimits = dict()
+		self.eventList = QListWidget()
+		self.eventList.setMinimumWidth(380)
+		self.eventList.setMaximumWidth(480)
+		self.mainLayout.addWidget(self.eventList)
 
 		# Initial Visibility
 		self.loadingBar.setVisible(False)
-		self.beaconWidget.setVisible(False)
+		self.eventList.setVisible(False)
 		self.show()
 
 		# Connections
@@ -125,10 +159,17 @@ class EpsTlmGuiApp(QWidget):
 
 	def __setupConnections(self):
 		self.openFilesButton.clicked.connect(self.openFilesDialog)
+		self.openFolderButton.clicked.connect(self.openFolderDialog)
+		self.openDatabaseButton.clicked.connect(self.openDatabaseDialog)
 		self.saveDataButton.clicked.connect(self.saveDataDialog)
 		self.convertFilesButton.clicked.connect(self.convertFilesDialog)
 		self.resetDataButton.clicked.connect(self.resetDataDialog)
 		self.showBeaconButton.toggled.connect(self.toggleBeaconWidget)
+		self.showSamplesButton.toggled.connect(self.toggleSampleWidget)
+		self.showEventsButton.toggled.connect(self.toggleEventList)
+		self.loadLimitsButton.clicked.connect(self.loadLimitsDialog)
+		self.showSpectrumButton.toggled.connect(self.toggleSpectrum)
+		self.eventList.currentRowChanged.connect(self.jumpToEvent)
 
 		self.dataSelectionTreeview.selectionModel().selectionChanged.connect(self.updateDataSelection)
 		self.timeSliderStart.valueChanged.connect(self.updateTimeStart)
@@ -136,14 +177,9 @@ class EpsTlmGuiApp(QWidget):
 
 
 	def __setupDerivedData(self):
-		EpsTlmData.VALID_COMMANDS.insert(2, (EpsTlmData.DEVICE.DER, EpsTlmData.SOURCE.BCR1, EpsTlmData.TYPE.POWER))
-		EpsTlmData.VALID_COMMANDS.insert(5, (EpsTlmData.DEVICE.DER, EpsTlmData.SOURCE.BCR2, EpsTlmData.TYPE.POWER))
-		EpsTlmData.VALID_COMMANDS.insert(8, (EpsTlmData.DEVICE.DER, EpsTlmData.SOURCE.BCR3, EpsTlmData.TYPE.POWER))
-		EpsTlmData.VALID_COMMANDS.insert(10, (EpsTlmData.DEVICE.DER, EpsTlmData.SOURCE.BCR3, EpsTlmData.TYPE.POWERB))
-		self.eps.data[(EpsTlmData.DEVICE.DER, EpsTlmData.SOURCE.BCR1, EpsTlmData.TYPE.POWER)] = list()
-		self.eps.data[(EpsTlmData.DEVICE.DER, EpsTlmData.SOURCE.BCR2, EpsTlmData.TYPE.POWER)] = list()
-		self.eps.data[(EpsTlmData.DEVICE.DER, EpsTlmData.SOURCE.BCR3, EpsTlmData.TYPE.POWER)] = list()
-		self.eps.data[(EpsTlmData.DEVICE.DER, EpsTlmData.SOURCE.BCR3, EpsTlmData.TYPE.POWERB)] = list()
+		EpsTlmData.addDerivedCommands()
+		for index, cmd in EpsTlmData.DERIVED_COMMANDS:
+			self.eps.data[cmd] = list()
 
 
 	def __setupDataSelection(self):
@@ -163,8 +199,78 @@ class EpsTlmGuiApp(QWidget):
 				QStandardItem(cmd[2].name)
 				])
 
+	def getPlotCanvas(self):
+		if self.plotCanvas is None:
+			from eps_tlm_plot import PlotCanvas
+			self.plotCanvas = PlotCanvas(self)
+			self.layout.replaceWidget(self.plotPlaceholder, self.plotCanvas)
+			self.plotPlaceholder.deleteLater()
+			self.plotCanvas.setSpectrumSource(self.eps if self.showSpectrumButton.isChecked() else None)
+		return self.plotCanvas
+
+	def getBeaconWidget(self):
+		if self.beaconWidget is None:
+			from eps_beacon_gui import EpsBeaconWidget
+			self.beaconWidget = EpsBeaconWidget()
+			self.beaconWidget.setMinimumWidth(190)
+			self.beaconWidget.setMaximumWidth(230)
+			self.mainLayout.insertWidget(self.mainLayout.indexOf(self.eventList), self.beaconWidget)
+		return self.beaconWidget
+
+	def getSampleWidget(self):
+		if self.sampleWidget is None:
+			self.sampleModel = EpsTlmSampleModel(self)
+			self.sampleTable = QTableView()
+			self.sampleTable.setModel(self.sampleModel)
+			self.sampleTable.setSelectionBehavior(QAbstractItemView.SelectRows)
+			self.sampleTable.setAlternatingRowColors(True)
+			self.sampleTable.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+			self.sampleTable.verticalHeader().setDefaultSectionSize(self.sampleTable.fontMetrics().height() + 4)
+			self.sampleTable.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+			self.sampleTimeEdit = QDateTimeEdit()
+			self.sampleTimeEdit.setDisplayFormat("dd/MM/yy HH:mm:ss")
+			self.sampleJumpButton = QPushButton("Go")
+			self.sampleJumpButton.setToolTip("Jumps to the sample closest to the time.")
+			self.sampleJumpButton.clicked.connect(self.jumpToSampleTime)
+			self.sampleTimeEdit.editingFinished.connect(self.jumpToSampleTime)
+
+			jumpLayout = QHBoxLayout()
+			jumpLayout.addWidget(self.sampleTimeEdit)
+			jumpLayout.addWidget(self.sampleJumpButton)
+			sampleLayout = QVBoxLayout()
+			sampleLayout.setContentsMargins(0, 0, 0, 0)
+			sampleLayout.addLayout(jumpLayout)
+			sampleLayout.addWidget(self.sampleTable)
+			self.sampleWidget = QWidget()
+			self.sampleWidget.setLayout(sampleLayout)
+			self.sampleWidget.setMinimumWidth(280)
+			self.sampleWidget.setMaximumWidth(340)
+			self.mainLayout.insertWidget(self.mainLayout.indexOf(self.eventList), self.sampleWidget)
+			self.updateSampleTable()
+		return self.sampleWidget
+
+	def reportStartupTime(self, quit = False):
+		elapsed = time.perf_counter() - startupTime
+		if quit or elapsed > EpsTlmGuiApp.STARTUP_BUDGET:
+			print("Startup took {:.3f} s (budget {:.3f} s)".format(elapsed, EpsTlmGuiApp.STARTUP_BUDGET))
+		if quit:
+			QApplication.quit()
+		return elapsed
+
 	def updateLoadingBar(self, progress):
-		self.loadingBar.setValue(progress * 100)
+		self.loadingBar.setValue(int(progress * 100))
+		QApplication.processEvents()
+
+	def setStatus(self, status):
+		# the loading bar processes events while busy, so every control which
+		# reads or changes the data is disabled until the work is done
+		self.status = status
+		widgets = [self.openFilesButton, self.openFolderButton, self.openDatabaseButton, self.saveDataButton, self.convertFilesButton, self.resetDataButton,
+			self.showSamplesButton, self.loadLimitsButton, self.showSpectrumButton, self.dataSelectionTreeview,
+			self.timeSliderStart, self.timeSliderEnd, self.eventList]
+		if self.sampleWidget is not None: widgets.append(self.sampleWidget)
+		for widget in widgets:
+			widget.setEnabled(status == Status.OK)
 
 		
 	# ++++++++++++++++++++++++++++++
@@ -173,25 +279,114 @@ class EpsTlmGuiApp(QWidget):
 
 	@pyqtSlot()
 	def openFilesDialog(self):
-		fileNames, _ = QFileDialog().getOpenFileNames(self, "Load files", self.lastDirectory, "EPS Files (*.tlm)")
+		if self.status != Status.OK:
+			return
+		fileNames, _ = QFileDialog().getOpenFileNames(self, "Load files", self.lastDirectory, "EPS Files (*.tlm *.tlm.gz *.tlm.xz *.tlm.bz2);;EPS Beacon Logs (*.txt *.log *.bcn)")
+		self.loadFiles(fileNames)
+
+	@pyqtSlot()
+	def openFolderDialog(self):
+		folderName = QFileDialog.getExistingDirectory(self, "Load folder", self.lastDirectory)
+		if folderName and self.status == Status.OK:
+			self.setStatus(Status.BUSY)
+			self.lastDirectory = folderName
+			self.loadingBar.setFormat(" Updating catalog: %p%")
+			self.loadingBar.setVisible(True)
+			catalog = EpsTlmCatalog(folderName, self.eps.schema)
+			catalog.update(self.updateLoadingBar)
+			self.loadingBar.setVisible(False)
+			self.setStatus(Status.OK)
+			timeRange = catalog.getTimeRange()
+			if timeRange is None:
+				QMessageBox.information(self, "Load folder", "The folder contains no EPS telemetry.")
+				return
+			dialog = TimeWindowDialog(self, *timeRange)
+			if dialog.exec_() == QDialog.Accepted:
+				self.loadFiles(catalog.getFiles(*dialog.getTimeWindow()))
+
+	@pyqtSlot()
+	def openDatabaseDialog(self):
+		if self.status != Status.OK:
+			return
+		fileName, _ = QFileDialog.getOpenFileName(self, "Load database", self.lastDirectory, "SQLite databases (*.db *.sqlite *.sqlite3);;All files (*)")
+		if not fileName:
+			return
+		self.lastDirectory = os.path.dirname(fileName)
+		from eps_tlm_store import EpsTlmStore
+		with EpsTlmStore(fileName) as store:
+			timeRange = store.getTimeRange(startTime = EpsTlmCatalog.MINIMUM_TIME)
+			if timeRange is None:
+				QMessageBox.information(self, "Load database", "The database contains no EPS telemetry.")
+				return
+			dialog = TimeWindowDialog(self, *timeRange)
+			if dialog.exec_() == QDialog.Accepted:
+				self.loadDatabase(store, *dialog.getTimeWindow())
+
+	def loadDatabase(self, store, startTime = None, endTime = None):
+		# the samples of the window are added to the loaded data, as files are
+		if self.status == Status.OK:
+			self.setStatus(Status.BUSY)
+			self.loadingBar.setFormat(" Loading database: %p%")
+			self.loadingBar.setVisible(True)
+			store.setProgressCallback(self.updateLoadingBar)
+			self.eps += store.toTlmData(startTime, endTime)
+			store.resetProgressCallback()
+			self.updateLoadedData()
+
+	@pyqtSlot()
+	def loadLimitsDialog(self):
+		if self.status != Status.OK:
+			return
+		fileName, _ = QFileDialog.getOpenFileName(self, "Load limit table", self.lastDirectory, "Limit tables (*.json);;All files (*)")
+		if fileName and not self.loadLimits(fileName):
+			QMessageBox.warning(self, "Load limit table", "The limit table " + fileName + " could not be read.")
+
+	def loadLimits(self, fileName):
+		# the red limits of the table are listed as LIMIT events
+		from eps_tlm_limits import EpsTlmLimit
+		limits = EpsTlmLimit.readFile(fileName)
+		if limits is None:
+			return False
+		self.eventLimits = EpsTlmLimit.getEventLimits(limits)
+		self.updateEvents()
+		return True
+
+	def loadFiles(self, fileNames):
 		if fileNames and self.status == Status.OK:
-			self.status = Status.BUSY
+			self.setStatus(Status.BUSY)
 			self.lastDirectory = os.path.dirname(fileNames[0])
 			self.loadingBar.setFormat(" Loading files: %p%")
 			self.loadingBar.setVisible(True)
-			self.eps.setFile(fileNames)
-			self.eps.readFileList()
-			self.eps.sortAllData()
-			self.loadingBar.setFormat(" Calculating derived data: %p%")
-			self.calculateDerivedData()
-			self.loadingBar.setVisible(False)
-			self.status = Status.OK
+			beaconLogs = [file for file in fileNames if file.endswith(EpsBeaconLogReader.FILE_EXTENSIONS)]
+			tlmFiles = [file for file in fileNames if file not in beaconLogs]
+			if tlmFiles:
+				self.eps.setFile(tlmFiles)
+				self.eps.readFileList()
+			if beaconLogs:
+				self.loadingBar.setFormat(" Loading beacon logs: %p%")
+				beaconReader = EpsBeaconLogReader()
+				beaconReader.setProgressCallback(self.updateLoadingBar)
+				beaconReader.setFile(beaconLogs)
+				beaconReader.readFileList()
+				self.eps += beaconReader
+			self.updateLoadedData()
+
+	def updateLoadedData(self):
+		# sorts and derives newly loaded data and shows it, ends the busy state of loading
+		self.eps.sortAllData()
+		self.loadingBar.setFormat(" Calculating derived data: %p%")
+		self.calculateDerivedData()
+		self.snapshot = self.eps.getSnapshot()
+		self.updateEvents()
+		self.updateSampleTable()
+		self.loadingBar.setVisible(False)
+		self.setStatus(Status.OK)
 
 	@pyqtSlot()
 	def convertFilesDialog(self):
-		fileNames, _ = QFileDialog().getOpenFileNames(self, "Convert files", self.lastDirectory, "EPS Files (*.tlm)")
+		fileNames, _ = QFileDialog().getOpenFileNames(self, "Convert files", self.lastDirectory, "EPS Files (*.tlm *.tlm.gz *.tlm.xz *.tlm.bz2)")
 		if fileNames and self.status == Status.OK:
-			self.status = Status.BUSY
+			self.setStatus(Status.BUSY)
 			self.lastDirectory = os.path.dirname(fileNames[0])
 			self.loadingBar.setFormat(" Converting files: %p%")
 			self.loadingBar.setVisible(True)
@@ -200,33 +395,57 @@ class EpsTlmGuiApp(QWidget):
 			tmpEps.setFile(fileNames)
 			tmpEps.readFileList()
 			self.loadingBar.setVisible(False)
-			self.status = Status.OK
+			self.setStatus(Status.OK)
 
 	@pyqtSlot()
 	def saveDataDialog(self):
 		fileName, _ = QFileDialog.getSaveFileName(self, "Save data", self.lastDirectory, "Comma Separated Value Files (*.csv)")
 		if fileName and self.status == Status.OK:
-			self.status = Status.BUSY
+			self.setStatus(Status.BUSY)
 			self.lastDirectory = os.path.dirname(fileName)
 			self.loadingBar.setFormat("Saving data: %p%")
 			self.loadingBar.setVisible(True)
 			self.eps.writeAllDataToFile(fileName)
 			self.loadingBar.setVisible(False)
-			self.status = Status.OK
+			self.setStatus(Status.OK)
 
 	@pyqtSlot()
 	def resetDataDialog(self):
+		if self.status != Status.OK:
+			return
 		reply = QMessageBox.question(self, "Reset Data", "Are you sure you want to reset the data?", QMessageBox.Yes, QMessageBox.No)
 		if reply == QMessageBox.Yes:
 			self.eps.deleteAllData()
+			self.snapshot = self.eps.getSnapshot()
 			self.resetTimeSliders()
+			self.updateEvents()
+			self.updateSampleTable()
 
 	@pyqtSlot(bool)
 	def toggleBeaconWidget(self, isChecked):
 		if isChecked:
-			self.beaconWidget.setVisible(True)
-		else:
+			self.getBeaconWidget().setVisible(True)
+		elif self.beaconWidget is not None:
 			self.beaconWidget.setVisible(False)
+
+	@pyqtSlot(bool)
+	def toggleSampleWidget(self, isChecked):
+		if isChecked:
+			self.getSampleWidget().setVisible(True)
+		elif self.sampleWidget is not None:
+			self.sampleWidget.setVisible(False)
+
+	@pyqtSlot(bool)
+	def toggleEventList(self, isChecked):
+		self.eventList.setVisible(isChecked)
+
+	@pyqtSlot(bool)
+	def toggleSpectrum(self, isChecked):
+		if self.plotCanvas is None or self.status != Status.OK:
+			return
+		self.plotCanvas.setSpectrumSource(self.eps if isChecked else None)
+		if self.snapshot.getLength(self.getSelectedCmd()) > 0:
+			self.plotCanvas.plot(leftIndex = self.timeSliderStart.value(), rightIndex = self.timeSliderEnd.value())
 			
 
 	# ++++++++++++++++++++++++++++++
@@ -234,90 +453,7 @@ class EpsTlmGuiApp(QWidget):
 	# ++++++++++++++++++++++++++++++
 
 	def calculateDerivedData(self):
-		progressSteps = 4 + 3 + 4	# 4x BCR, (2+1)x BATV, (3+1)x 5V
-		progress = 0.0
-		self.updateLoadingBar(progress / progressSteps)
-
-		# BCR
-		self.eps.deleteData((EpsTlmData.DEVICE.DER, EpsTlmData.SOURCE.BCR1, EpsTlmData.TYPE.POWER))
-		self.eps.calculateDerivedData(operator.mul,
-					(EpsTlmData.DEVICE.DER, EpsTlmData.SOURCE.BCR1, EpsTlmData.TYPE.POWER),
-					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.BCR1, EpsTlmData.TYPE.VOLTAGE),
-					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.BCR1, EpsTlmData.TYPE.CURRENT))
-		progress += 1
-		self.updateLoadingBar(progress / progressSteps)
-		self.eps.deleteData((EpsTlmData.DEVICE.DER, EpsTlmData.SOURCE.BCR2, EpsTlmData.TYPE.POWER))
-		self.eps.calculateDerivedData(operator.mul,
-					(EpsTlmData.DEVICE.DER, EpsTlmData.SOURCE.BCR2, EpsTlmData.TYPE.POWER),
-					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.BCR2, EpsTlmData.TYPE.VOLTAGE),
-					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.BCR2, EpsTlmData.TYPE.CURRENT))
-		progress += 1
-		self.updateLoadingBar(progress / progressSteps)
-		self.eps.deleteData((EpsTlmData.DEVICE.DER, EpsTlmData.SOURCE.BCR3, EpsTlmData.TYPE.POWER))
-		self.eps.calculateDerivedData(operator.mul,
-					(EpsTlmData.DEVICE.DER, EpsTlmData.SOURCE.BCR3, EpsTlmData.TYPE.POWER),
-					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.BCR3, EpsTlmData.TYPE.VOLTAGE),
-					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.BCR3, EpsTlmData.TYPE.CURRENT))
-		progress += 1
-		self.updateLoadingBar(progress / progressSteps)
-		self.eps.deleteData((EpsTlmData.DEVICE.DER, EpsTlmData.SOURCE.BCR3, EpsTlmData.TYPE.POWERB))
-		self.eps.calculateDerivedData(operator.mul,
-					(EpsTlmData.DEVICE.DER, EpsTlmData.SOURCE.BCR3, EpsTlmData.TYPE.POWERB),
-					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.BCR3, EpsTlmData.TYPE.VOLTAGE),
-					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.BCR3, EpsTlmData.TYPE.CURRENTB))
-		progress += 1
-		self.updateLoadingBar(progress / progressSteps)
-
-		# BATV
-		self.eps.deleteData((EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.UHF, EpsTlmData.TYPE.VOLTAGE))
-		self.eps.data[(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.UHF, EpsTlmData.TYPE.VOLTAGE)] = self.eps.data[(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.PCMBATV, EpsTlmData.TYPE.VOLTAGE)]
-		progress += 1
-		self.updateLoadingBar(progress / progressSteps)
-		self.eps.deleteTmpData()
-		self.eps.calculateDerivedData(operator.add,
-					(EpsTlmData.DEVICE.TMP, EpsTlmData.SOURCE.TMP, EpsTlmData.TYPE.TMP),
-					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.SMARD1, EpsTlmData.TYPE.CURRENT),
-					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.SMARD2, EpsTlmData.TYPE.CURRENT),
-					checkValidity = False)
-		progress += 1
-		self.updateLoadingBar(progress / progressSteps)
-		self.eps.deleteData((EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.UHF, EpsTlmData.TYPE.CURRENT))
-		self.eps.calculateDerivedData(operator.sub,
-					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.UHF, EpsTlmData.TYPE.CURRENT),
-					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.PCMBATV, EpsTlmData.TYPE.CURRENT),
-					(EpsTlmData.DEVICE.TMP, EpsTlmData.SOURCE.TMP, EpsTlmData.TYPE.TMP),
-					checkValidity = False)
-		progress += 1
-		self.updateLoadingBar(progress / progressSteps)
-
-		# 5V
-		self.eps.deleteData((EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.CDH, EpsTlmData.TYPE.VOLTAGE))
-		self.eps.data[(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.CDH, EpsTlmData.TYPE.VOLTAGE)] = self.eps.data[(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.PCM5V, EpsTlmData.TYPE.VOLTAGE)]
-		progress += 1
-		self.updateLoadingBar(progress / progressSteps)
-		self.eps.deleteTmpData()
-		self.eps.calculateDerivedData(operator.add,
-					(EpsTlmData.DEVICE.TMP, EpsTlmData.SOURCE.TMP, EpsTlmData.TYPE.TMP),
-					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.ADCS5V_1, EpsTlmData.TYPE.CURRENT),
-					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.ADCS5V_2, EpsTlmData.TYPE.CURRENT),
-					checkValidity = False)
-		progress += 1
-		self.updateLoadingBar(progress / progressSteps)
-		self.eps.calculateDerivedData(operator.add,
-					(EpsTlmData.DEVICE.TMP, EpsTlmData.SOURCE.TMP, EpsTlmData.TYPE.TMP_2),
-					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.THM, EpsTlmData.TYPE.CURRENT),
-					(EpsTlmData.DEVICE.TMP, EpsTlmData.SOURCE.TMP, EpsTlmData.TYPE.TMP),
-					checkValidity = False)
-		progress += 1
-		self.updateLoadingBar(progress / progressSteps)
-		self.eps.deleteData((EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.CDH, EpsTlmData.TYPE.CURRENT))
-		self.eps.calculateDerivedData(operator.sub,
-					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.CDH, EpsTlmData.TYPE.CURRENT),
-					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.PCM5V, EpsTlmData.TYPE.CURRENT),
-					(EpsTlmData.DEVICE.TMP, EpsTlmData.SOURCE.TMP, EpsTlmData.TYPE.TMP_2),
-					checkValidity = False)
-		progress += 1
-		self.updateLoadingBar(progress / progressSteps)
+		self.eps.calculateDerivedChannels(self.updateLoadingBar)
 
 
 	# ++++++++++++++++++++++++++++++
@@ -325,48 +461,111 @@ class EpsTlmGuiApp(QWidget):
 	# ++++++++++++++++++++++++++++++
 
 	def getSelectedCmd(self):
-		return self.plotCanvas.cmd
+		return self.selectedCmd
+
+	def getChannel(self, cmd):
+		# (data list, length) of cmd in the shown snapshot, samples past length are still being loaded
+		return self.snapshot.channels.get(cmd, ((), 0))
 
 
 	@pyqtSlot(QItemSelection, QItemSelection)
 	def updateDataSelection(self, selected, deselected):
+		if self.status != Status.OK:
+			return
 		index = selected.indexes()[0].row()
 		cmd = EpsTlmData.VALID_COMMANDS[index]
+		dataList, length = self.getChannel(cmd)
 		
-		if self.plotCanvas.setData(cmd, self.eps.data[cmd]):
-			if len(self.eps.data[cmd]) > 0:
-				self.timeSliderStart.setRange(0, len(self.eps.data[cmd]) - 1)
-				self.timeSliderEnd.setRange(0, len(self.eps.data[cmd]) - 1)
+		if length > 0 and self.getPlotCanvas().setData(cmd, dataList[:length]):
+			self.selectedCmd = cmd
+			self.updateSampleTable()
+			if length > 0:
+				self.timeSliderStart.setRange(0, length - 1)
+				self.timeSliderEnd.setRange(0, length - 1)
 				self.timeSliderStart.setValue(0)
-				self.timeSliderEnd.setValue(len(self.eps.data[cmd]) - 1)
-				self.timeTextStart.setText(self.eps.data[self.getSelectedCmd()][0][0].strftime("%d/%m/%y\n%H:%M:%S"))
-				self.timeTextEnd.setText(self.eps.data[self.getSelectedCmd()][len(self.eps.data[cmd]) - 1][0].strftime("%d/%m/%y\n%H:%M:%S"))
+				self.timeSliderEnd.setValue(length - 1)
+				self.timeTextStart.setText(dataList[0][0].strftime("%d/%m/%y\n%H:%M:%S"))
+				self.timeTextEnd.setText(dataList[length - 1][0].strftime("%d/%m/%y\n%H:%M:%S"))
 				self.plotCanvas.plot()
 
 			
+	# ++++++++++++++++++++++++++++++
+	# Sample Table
+	# ++++++++++++++++++++++++++++++
+
+	def updateSampleTable(self):
+		if self.sampleWidget is None:
+			return
+		self.sampleModel.setChannel(self.selectedCmd, *self.getChannel(self.selectedCmd))
+		timeRange = self.snapshot.getTimeRange(self.selectedCmd)
+		if timeRange is not None:
+			self.sampleTimeEdit.setDateTimeRange(QDateTime(timeRange[0]), QDateTime(timeRange[1]))
+
+
+	@pyqtSlot()
+	def jumpToSampleTime(self):
+		index = self.snapshot.getNearestIndex(self.selectedCmd, self.sampleTimeEdit.dateTime().toPyDateTime())
+		if index is not None:
+			self.sampleTable.selectRow(index)
+			self.sampleTable.scrollTo(self.sampleModel.index(index, 0), QAbstractItemView.PositionAtCenter)
+
+
+	# ++++++++++++++++++++++++++++++
+	# Events
+	# ++++++++++++++++++++++++++++++
+
+	def updateEvents(self):
+		self.eventIndex = getEventIndex(self.eps, limits = self.eventLimits)
+		self.eventList.clear()
+		self.eventList.addItems([EpsTlmEventIndex.eventToString(self.eventIndex.getEvent(i)) for i in range(len(self.eventIndex))])
+
+
+	@pyqtSlot(int)
+	def jumpToEvent(self, row):
+		if self.eventIndex is None or row < 0 or row >= len(self.eventIndex):
+			return
+		time, kind, cmd, value = self.eventIndex.getEvent(row)
+		if cmd is not None and cmd != self.getSelectedCmd():
+			self.dataSelectionTreeview.setCurrentIndex(self.dataSelectionTreeview.model().index(EpsTlmData.VALID_COMMANDS.index(cmd), 0))
+		cmd = self.getSelectedCmd()
+		length = self.snapshot.getLength(cmd)
+		if length == 0:
+			return
+		window = datetime.timedelta(seconds = EpsTlmGuiApp.EVENT_WINDOW)
+		left, right = self.snapshot.getDataIndexRange(cmd, time - window, time + window)
+		right = min(max(right - 1, left), length - 1)
+		left = min(left, right)
+		self.timeSliderStart.setMaximum(length - 1)
+		self.timeSliderEnd.setMinimum(0)
+		self.timeSliderStart.setValue(left)
+		self.timeSliderEnd.setValue(right)
+
+
 	# ++++++++++++++++++++++++++++++
 	# Timeline
 	# ++++++++++++++++++++++++++++++
 
 	@pyqtSlot(int)
 	def updateTimeStart(self, newIndex):
-		if len(self.eps.data[self.getSelectedCmd()]) == 0:
+		dataList, length = self.getChannel(self.getSelectedCmd())
+		if length == 0:
 			self.timeTextStart.setText("No data\navailable")
 			self.timeSliderEnd.setRange(0, 0)
 		else:
-			self.timeTextStart.setText(self.eps.data[self.getSelectedCmd()][newIndex][0].strftime("%d/%m/%y\n%H:%M:%S"))
+			self.timeTextStart.setText(dataList[newIndex][0].strftime("%d/%m/%y\n%H:%M:%S"))
 			self.timeSliderEnd.setMinimum(newIndex)
-			self.plotCanvas.plot(leftIndex = self.timeSliderStart.value(), rightIndex = self.timeSliderEnd.value())
+			self.getPlotCanvas().plot(leftIndex = self.timeSliderStart.value(), rightIndex = self.timeSliderEnd.value())
 		
 	@pyqtSlot(int)
 	def updateTimeEnd(self, newIndex):
-		if len(self.eps.data[self.getSelectedCmd()]) == 0:
+		dataList, length = self.getChannel(self.getSelectedCmd())
+		if length == 0:
 			self.timeTextStart.setText("No data\navailable")
 			self.timeSliderStart.setRange(0, 0)
 		else:
-			self.timeTextEnd.setText(self.eps.data[self.getSelectedCmd()][newIndex][0].strftime("%d/%m/%y\n%H:%M:%S"))
+			self.timeTextEnd.setText(dataList[newIndex][0].strftime("%d/%m/%y\n%H:%M:%S"))
 			self.timeSliderStart.setMaximum(newIndex)
-			self.plotCanvas.plot(leftIndex = self.timeSliderStart.value(), rightIndex = self.timeSliderEnd.value())
+			self.getPlotCanvas().plot(leftIndex = self.timeSliderStart.value(), rightIndex = self.timeSliderEnd.value())
 
 	def resetTimeSliders(self):
 		self.timeSliderStart.setRange(0, 0)
@@ -376,41 +575,85 @@ class EpsTlmGuiApp(QWidget):
 
 
 # ##############################
-# Matplotlib Canvas
+# Sample Table Model
 # ##############################
 
-class PlotCanvas(FigureCanvas):
+class EpsTlmSampleModel(QAbstractTableModel):
 
-	def __init__(self, parent = None):
-		fig = Figure(facecolor = "None", edgecolor = "None")
-		FigureCanvas.__init__(self, fig)
-		FigureCanvas.setSizePolicy(self, QSizePolicy.Expanding, QSizePolicy.Expanding)
-		FigureCanvas.updateGeometry(self)
+	# reads the samples of one channel straight from its data list, up to its
+	# length in the shown snapshot; the view only asks for the rows it shows,
+	# so the memory does not grow with the channel length
 
-		self.cmd = EpsTlmData.VALID_COMMANDS[0]		# some arbitrary init cmd
-		self.data = list()
-		self.axes = self.figure.add_subplot(111)
-		self.axes.axis("off")
-		#self.axes.set_facecolor("None")
+	TIME, VALUE = range(2)
 
-	def setData(self, cmd, data):
-		if len(data) == 0:
-			return False
+	def __init__(self, parent = None):
+		QAbstractTableModel.__init__(self, parent)
+		self.cmd = None
+		self.samples = list()
+		self.length = 0
+		self.headers = ["Time", "Value"]
+
+	def setChannel(self, cmd, data, length):
+		self.beginResetModel()
 		self.cmd = cmd
-		self.data = data
-		return True
+		self.samples = data
+		self.length = length
+		self.headers = ["Time", "Value [" + EpsTlmData.TYPE.physicalUnit(cmd[2]) + "]"]
+		self.endResetModel()
+
+	def rowCount(self, parent = QModelIndex()):
+		return 0 if parent.isValid() else self.length
+
+	def columnCount(self, parent = QModelIndex()):
+		return 0 if parent.isValid() else 2
+
+	def data(self, index, role = Qt.DisplayRole):
+		if not index.isValid() or index.row() >= self.length:
+			return None
+		if role == Qt.DisplayRole:
+			time, value = self.samples[index.row()]
+			if index.column() == EpsTlmSampleModel.TIME:
+				return time.strftime("%d/%m/%y %H:%M:%S")
+			return "{:.6g}".format(value)
+		if role == Qt.TextAlignmentRole and index.column() == EpsTlmSampleModel.VALUE:
+			return Qt.AlignRight | Qt.AlignVCenter
+		return None
+
+	def headerData(self, section, orientation, role = Qt.DisplayRole):
+		if role != Qt.DisplayRole:
+			return None
+		if orientation == Qt.Horizontal:
+			return self.headers[section]
+		return str(section)
 
-	def plot(self, leftIndex = None, rightIndex = None):
-		self.pltdata = list(zip(*(self.data[leftIndex:rightIndex])))
-		if len(self.pltdata) == 0:
-			return
 
-		self.axes.cla()
-		self.axes.plot(self.pltdata[0], self.pltdata[1], "b-", markersize = 2)
-		self.axes.set_xlabel("Time")
-		self.axes.set_ylabel(str(self.cmd[2].name) + " [" + EpsTlmData.TYPE.physicalUnit(self.cmd[2]) + "]")
-		self.axes.legend([str(self.cmd[1].name)])
-		self.draw()
+# ##############################
+# Time Window Dialog
+# ##############################
+
+class TimeWindowDialog(QDialog):
+
+	def __init__(self, parent, startTime, endTime):
+		QDialog.__init__(self, parent)
+		self.setWindowTitle("Time Window")
+		self.startEdit = QDateTimeEdit(startTime)
+		self.endEdit = QDateTimeEdit(endTime)
+		for edit in (self.startEdit, self.endEdit):
+			edit.setDisplayFormat("dd/MM/yy HH:mm:ss")
+			edit.setCalendarPopup(True)
+			edit.setDateTimeRange(QDateTime(startTime), QDateTime(endTime))
+		self.buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+		self.buttons.accepted.connect(self.accept)
+		self.buttons.rejected.connect(self.reject)
+
+		self.layout = QFormLayout()
+		self.layout.addRow("From", self.startEdit)
+		self.layout.addRow("To", self.endEdit)
+		self.layout.addRow(self.buttons)
+		self.setLayout(self.layout)
+
+	def getTimeWindow(self):
+		return (self.startEdit.dateTime().toPyDateTime(), self.endEdit.dateTime().toPyDateTime())
 
 
 # ##############################
@@ -421,17 +664,23 @@ if __name__ == "__main__":
 	print("EPS Telemetry Reader GUI Application")
 	parser = argparse.ArgumentParser()
 	parser.add_argument("file", nargs = "?")
+	parser.add_argument("-l", "--limits", help = "JSON limit table, whose excursions are listed as events")
+	parser.add_argument("--startup-time", dest = "startupTime", help = "prints the time until the window is shown and quits", action = "store_true")
 	args = parser.parse_args()
 	filename = args.file
 	
 	app = QApplication(sys.argv)
 	wnd = EpsTlmGuiApp()
-
-	if filename:
-		wnd.eps.setFile(filename)
-		if not wnd.eps.readFile():
+	if args.limits and not wnd.loadLimits(args.limits):
+		print("Limit table " + args.limits + " could not be read")
+
+	# Matplotlib and the beacon panel are loaded on first use and the file
+	# is loaded from the event loop, so the window is shown right away
+	QTimer.singleShot(0, lambda: wnd.reportStartupTime(quit = args.startupTime))
+	if filename and not args.startupTime:
+		if not os.path.isfile(filename):
 			print("File " + filename + " could not be read")
 		else:
-			wnd.calculateDerivedData()
+			QTimer.singleShot(0, lambda: wnd.loadFiles([filename]))
 
 	sys.exit(app.exec_())
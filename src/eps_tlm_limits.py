@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+
+from eps_tlm_parser import *
+
+import argparse
+import datetime
+import enum
+import os
+
+import numpy
+
+
+
+# ###############################
+# ########     Limits     #######
+# ###############################
+
+class EpsTlmLimit:
+
+	class LEVEL(enum.IntEnum):
+		OK		= 0
+		YELLOW	= 1
+		RED		= 2
+
+	# ++++++++++++++++++++++++++
+
+	def __init__(self, yellow = None, red = None, rate = None, persistence = 1):
+		# yellow, red: (lower, upper) bounds, rate: (yellow, red) bounds of the
+		# absolute change per second; any bound may be None. an alarm is raised
+		# once persistence consecutive samples violate a bound
+		self.yellow = yellow if yellow is not None else (None, None)
+		self.red = red if red is not None else (None, None)
+		self.rate = rate if rate is not None else (None, None)
+		self.persistence = max(1, int(persistence))
+
+	# ++++++++++++++++++++++++++
+
+	def levels(self, values):
+		levels = numpy.zeros(len(values), dtype = numpy.int8)
+		for level, (lower, upper) in ((EpsTlmLimit.LEVEL.YELLOW, self.yellow), (EpsTlmLimit.LEVEL.RED, self.red)):
+			if lower is not None: levels[values < lower] = level
+			if upper is not None: levels[values > upper] = level
+		return levels
+
+	def rateLevels(self, rates):
+		levels = numpy.zeros(len(rates), dtype = numpy.int8)
+		for level, bound in zip((EpsTlmLimit.LEVEL.YELLOW, EpsTlmLimit.LEVEL.RED), self.rate):
+			if bound is not None: levels[rates > bound] = level
+		return levels
+
+	def hasRate(self):
+		return self.rate != (None, None)
+
+	# ++++++++++++++++++++++++++
+
+	def toDict(self):
+		return {"yellow": list(self.yellow), "red": list(self.red), "rate": list(self.rate), "persistence": self.persistence}
+
+	def fromDict(entry):
+		return EpsTlmLimit(tuple(entry.get("yellow", (None, None))), tuple(entry.get("red", (None, None))),
+			tuple(entry.get("rate", (None, None))), entry.get("persistence", 1))
+
+	def readFile(fileName):
+		# limit table of a JSON file, e.g. {"BAT:CELL:VOLTAGE": {"yellow": [7.0, 8.3],
+		# "red": [6.6, 8.4], "rate": [0.2, 0.5], "persistence": 3}}; None on failure,
+		# channels have to be telemetry channels, which are the ones checked
+		try:
+			with open(fileName, "r") as file:
+				table = json.load(file)
+			limits = dict()
+			for channel, entry in table.items():
+				cmd = EpsTlmData.cmdFromString(channel)
+				if cmd not in EpsTlmData.VALID_COMMANDS:
+					print("Unknown channel " + channel + " in limit table " + fileName)
+					return None
+				limits[cmd] = EpsTlmLimit.fromDict(entry)
+			return limits
+		except (IOError, ValueError, AttributeError, TypeError) as error:
+			print("Limit table " + fileName + " could not be read: " + str(error))
+			return None
+
+	def writeFile(fileName, limits):
+		with open(fileName, "w") as file:
+			json.dump(dict((EpsTlmData.cmdToString(cmd), limit.toDict()) for cmd, limit in limits.items()), file, indent = 1, sort_keys = True)
+
+	def getEventLimits(limits, level = LEVEL.RED):
+		# cmd -> (lower, upper) of one level, as taken by EpsTlmEventIndex
+		return dict((cmd, limit.yellow if level == EpsTlmLimit.LEVEL.YELLOW else limit.red) for cmd, limit in limits.items()
+			if (limit.yellow if level == EpsTlmLimit.LEVEL.YELLOW else limit.red) != (None, None))
+
+
+
+# ###############################
+# #######   Limit Checker   #####
+# ###############################
+
+class EpsTlmLimitChecker:
+
+	# checks the samples of every batch once as they arrive, keeping the state
+	# of each channel (last sample, alarm levels, the levels of the last
+	# persistence - 1 samples) across batches; an alarm event is emitted
+	# whenever the alarm level of a channel changes, i.e. when it is raised
+	# after persistence violating samples, escalated, or cleared by the first
+	# sample back inside the bounds
+
+	class EVENT(enum.Enum):
+		LIMIT	= 0		# value out of the yellow or red bounds, value: the sample value
+		RATE	= 1		# change per second out of the rate bounds, value: the rate
+
+	# ++++++++++++++++++++++++++
+
+	def __init__(self, limits, callback = None):
+		# callback(event) is called for every alarm event, an event being a
+		# (time, cmd, kind, level, value) tuple
+		self.limits = limits
+		self.callback = callback if callback is not None else do_nothing
+		self.events = list()
+		self.states = dict((cmd, EpsTlmLimitChecker.ChannelState(limit)) for cmd, limit in limits.items())
+
+	class ChannelState:
+
+		def __init__(self, limit):
+			self.lastTime = None
+			self.lastValue = None
+			self.levels = dict((kind, EpsTlmLimit.LEVEL.OK) for kind in EpsTlmLimitChecker.EVENT)
+			self.history = dict((kind, numpy.zeros(limit.persistence - 1, dtype = numpy.int8)) for kind in EpsTlmLimitChecker.EVENT)
+			self.dataList = None
+			self.length = 0
+
+	# ++++++++++++++++++++++++++
+
+	def check(self, cmd, times, values):
+		# times: POSIX seconds, both in arrival order; returns the new events
+		if cmd not in self.limits or len(times) == 0: return list()
+		limit = self.limits[cmd]
+		state = self.states[cmd]
+		times = numpy.asarray(times, dtype = numpy.float64)
+		values = numpy.asarray(values, dtype = numpy.float64)
+
+		events = self.__transitions(cmd, state, EpsTlmLimitChecker.EVENT.LIMIT, limit, limit.levels(values), times, values)
+		if limit.hasRate():
+			previousTimes = numpy.concatenate(([times[0] if state.lastTime is None else state.lastTime], times[:-1]))
+			previousValues = numpy.concatenate(([values[0] if state.lastValue is None else state.lastValue], values[:-1]))
+			dt = times - previousTimes
+			# samples of the same second carry no rate
+			rates = numpy.divide(numpy.abs(values - previousValues), dt, out = numpy.zeros(len(times)), where = dt > 0)
+			events += self.__transitions(cmd, state, EpsTlmLimitChecker.EVENT.RATE, limit, limit.rateLevels(rates), times, rates)
+		state.lastTime = times[-1]
+		state.lastValue = values[-1]
+
+		events.sort(key = lambda event: event[0])
+		for event in events:
+			self.events.append(event)
+			self.callback(event)
+		return events
+
+	def __transitions(self, cmd, state, kind, limit, levels, times, values):
+		# the alarm level of a sample is the lowest level of the last persistence samples
+		levels = numpy.concatenate((state.history[kind], levels))
+		if limit.persistence > 1:
+			alarmLevels = numpy.lib.stride_tricks.sliding_window_view(levels, limit.persistence).min(axis = 1)
+			state.history[kind] = levels[-(limit.persistence - 1):]
+		else:
+			alarmLevels = levels
+		changes = numpy.flatnonzero(alarmLevels != numpy.concatenate(([state.levels[kind]], alarmLevels[:-1])))
+		state.levels[kind] = EpsTlmLimit.LEVEL(int(alarmLevels[-1]))
+		return [(datetime.datetime.fromtimestamp(times[index]), cmd, kind, EpsTlmLimit.LEVEL(int(alarmLevels[index])), float(values[index]))
+			for index in changes]
+
+	# ++++++++++++++++++++++++++
+
+	def addBatch(self, batch):
+		# batch of raw (device, source, type, time, value) tuples as yielded by
+		# EpsTlmFileReader.iterRecordBatches or EpsTlmStreamDecoder.iterRecordBatches
+		channels = dict()
+		for device, source, type, time, value in batch:
+			channels.setdefault((device, source, type), list()).append((time.timestamp(), value))
+		events = list()
+		for (device, source, type), samples in channels.items():
+			cmd = (EpsTlmData.DEVICE(device), EpsTlmData.SOURCE(source), EpsTlmData.TYPE(type))
+			if cmd in self.limits:
+				samples = numpy.array(samples, dtype = numpy.float64)
+				events += self.check(cmd, samples[:, 0], samples[:, 1])
+		return events
+
+	def attach(self, eps):
+		# checks the samples eps publishes, once per decoded block or stream batch
+		eps.addPublishCallback(self.checkSnapshot)
+
+	def detach(self, eps):
+		eps.removePublishCallback(self.checkSnapshot)
+
+	def checkSnapshot(self, snapshot):
+		events = list()
+		for cmd, state in self.states.items():
+			dataList, length = snapshot.channels.get(cmd, ((), 0))
+			if dataList is not state.dataList:
+				# a list replaced by one of the same length, e.g. sorted, has been checked already
+				state.length = length if length == state.length else 0
+				state.dataList = dataList
+			if length > state.length:
+				samples = dataList[state.length:length]
+				events += self.check(cmd, [item[0].timestamp() for item in samples], [item[1] for item in samples])
+				state.length = length
+		return events
+
+	# ++++++++++++++++++++++++++
+
+	def eventToString(event):
+		time, cmd, kind, level, value = event
+		return "{} | {:5s} | {:6s} | {:32s} | {:10.3f}".format(str(time), kind.name, level.name, EpsTlmData.cmdToString(cmd), value)
+
+	def __str__(self):
+		# alarm count per channel, kind and level, and the alarm levels after the last sample
+		lines = [" {:32s} | {:>6s} | {:>6s} | {:>6s} | {:>6s} | {:6s} | {:6s}".format(
+			"CHANNEL", "YELLOW", "RED", "RATE Y", "RATE R", "LIMIT", "RATE")]
+		counts = dict()
+		for time, cmd, kind, level, value in self.events:
+			counts[(cmd, kind, level)] = counts.get((cmd, kind, level), 0) + 1
+		for cmd in EpsTlmData.VALID_COMMANDS:
+			if cmd not in self.states: continue
+			state = self.states[cmd]
+			lines.append(" {:32s} | {:6d} | {:6d} | {:6d} | {:6d} | {:6s} | {:6s}".format(EpsTlmData.cmdToString(cmd),
+				counts.get((cmd, EpsTlmLimitChecker.EVENT.LIMIT, EpsTlmLimit.LEVEL.YELLOW), 0),
+				counts.get((cmd, EpsTlmLimitChecker.EVENT.LIMIT, EpsTlmLimit.LEVEL.RED), 0),
+				counts.get((cmd, EpsTlmLimitChecker.EVENT.RATE, EpsTlmLimit.LEVEL.YELLOW), 0),
+				counts.get((cmd, EpsTlmLimitChecker.EVENT.RATE, EpsTlmLimit.LEVEL.RED), 0),
+				state.levels[EpsTlmLimitChecker.EVENT.LIMIT].name, state.levels[EpsTlmLimitChecker.EVENT.RATE].name))
+		return "\n".join(lines)
+
+
+
+# ###############################
+# ########     Main     #########
+# ###############################
+
+def parseBound(text):
+	return None if text == "-" else float(text)
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(prog = "EPS_TLM_Limits", description = "Checks EPS telemetry against yellow and red limits while it is read and reports the alarms")
+	parser.add_argument("tlmFile", help = "EPS telemetry *.tlm file or folder containing *.tlm files")
+	parser.add_argument("-c", "--config", help = "JSON limit table, see EpsTlmLimit.readFile")
+	parser.add_argument("-l", "--limit", nargs = 5, action = "append", metavar = ("CHANNEL", "YELLOW_LOW", "YELLOW_HIGH", "RED_LOW", "RED_HIGH"),
+		help = "bounds of a channel, \"-\" for no bound (repeatable)")
+	parser.add_argument("-r", "--rate", nargs = 3, action = "append", metavar = ("CHANNEL", "YELLOW", "RED"), help = "bounds of the change per second of a channel (repeatable)")
+	parser.add_argument("-n", "--persistence", type = int, default = 1, help = "consecutive violating samples raising an alarm, for the limits given on the command line")
+	parser.add_argument("-w", "--write-config", metavar = "FILE", help = "writes the limit table used to a JSON file")
+	parser.add_argument("-q", "--quiet", help = "only prints the summary, not every alarm", action = "store_true")
+
+	args = parser.parse_args()
+	limits = dict()
+	if args.config:
+		limits = EpsTlmLimit.readFile(args.config)
+		if limits is None: sys.exit(1)
+	for options, isRate in [(args.limit or list(), False), (args.rate or list(), True)]:
+		for option in options:
+			cmd = EpsTlmData.cmdFromString(option[0])
+			if cmd not in EpsTlmData.VALID_COMMANDS: parser.error("invalid channel " + option[0])
+			try:
+				bounds = [parseBound(text) for text in option[1:]]
+			except ValueError:
+				parser.error("invalid bound in " + str(option))
+			limit = limits.setdefault(cmd, EpsTlmLimit(persistence = args.persistence))
+			if isRate:
+				limit.rate = tuple(bounds)
+			else:
+				limit.yellow, limit.red = tuple(bounds[0:2]), tuple(bounds[2:4])
+	if not limits:
+		parser.error("no limits given")
+	if args.write_config:
+		EpsTlmLimit.writeFile(args.write_config, limits)
+
+	checker = EpsTlmLimitChecker(limits, None if args.quiet else lambda event: print(EpsTlmLimitChecker.eventToString(event)))
+	fr = EpsTlmFileReader()
+	checker.attach(fr)
+	if os.path.isdir(args.tlmFile):
+		# in time order, so the rates and persistence run across the files
+		catalog = EpsTlmCatalog(args.tlmFile, fr.schema)
+		catalog.update()
+		fr.setFile(catalog.getFiles())
+		fr.readFileList()
+	else:
+		fr.setFile(args.tlmFile)
+		fr.readFile()
+	print(checker)
@@ -6,6 +6,23 @@ import enum
 import datetime
 import os
 import operator
+import bisect
+import math
+import re
+import json
+import sys
+import zlib
+import heapq
+import gzip
+import lzma
+import bz2
+import queue
+import concurrent.futures
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
 
 
 
@@ -22,6 +39,7 @@ class EpsTlmData:
 		CE			= 3
 		SOFT		= 4
 		DER			= 128		# derived data
+		BCN			= 129		# beacon data
 		TMP			= 254		# temporary data
 		BLOCK_INIT	= 255
 
@@ -127,25 +145,8 @@ class EpsTlmData:
 		TYPE = uint8
 
 		def VALUE(type):
-			type = EpsTlmData.TYPE(type)
-			if type == EpsTlmData.TYPE.VOLTAGE:			return EpsTlmData.DATATYPE.float32
-			elif type == EpsTlmData.TYPE.CURRENT:		return EpsTlmData.DATATYPE.float32
-			elif type == EpsTlmData.TYPE.CURRENTB:		return EpsTlmData.DATATYPE.float32
-			elif type == EpsTlmData.TYPE.TEMPERATURE:	return EpsTlmData.DATATYPE.float32
-			elif type == EpsTlmData.TYPE.MANRESET:		return EpsTlmData.DATATYPE.float32
-			elif type == EpsTlmData.TYPE.SOFTRESET:		return EpsTlmData.DATATYPE.float32
-			elif type == EpsTlmData.TYPE.WDRESET:		return EpsTlmData.DATATYPE.float32
-			elif type == EpsTlmData.TYPE.BRWNOUTRESET:	return EpsTlmData.DATATYPE.float32
-			elif type == EpsTlmData.TYPE.WDTIME:		return EpsTlmData.DATATYPE.float32
-			elif type == EpsTlmData.TYPE.CHARGE_LVL:	return EpsTlmData.DATATYPE.float32
-			elif type == EpsTlmData.TYPE.HEATER_STATE1:	return EpsTlmData.DATATYPE.float32
-			elif type == EpsTlmData.TYPE.HEATER_STATE2:	return EpsTlmData.DATATYPE.float32
-			elif type == EpsTlmData.TYPE.TEMPERATURE2:	return EpsTlmData.DATATYPE.float32
-			elif type == EpsTlmData.TYPE.TEMPERATURE3:	return EpsTlmData.DATATYPE.float32
-			elif type == EpsTlmData.TYPE.CURRENT3V3:	return EpsTlmData.DATATYPE.float32
-			elif type == EpsTlmData.TYPE.CURRENT5V:		return EpsTlmData.DATATYPE.float32
-			elif type == EpsTlmData.TYPE.BLOCK_INIT:	return EpsTlmData.DATATYPE.float32
-			else:										return EpsTlmData.DATATYPE.float32
+			return EpsTlmSchema.get(EpsTlmSchema.DEFAULT_VERSION).valueType(EpsTlmData.TYPE(type))
+
 
 	# ++++++++++++++++++++++++++
 
@@ -217,37 +218,96 @@ class EpsTlmData:
 		(DEVICE.BAT, SOURCE.BTTC, TYPE.HEATER_STATE2),
 		(DEVICE.BAT, SOURCE.BTTC, TYPE.TEMPERATURE),
 		(DEVICE.BAT, SOURCE.BTTC, TYPE.TEMPERATURE2),
-		(DEVICE.BAT, SOURCE.BTTC, TYPE.TEMPERATURE3)
+		(DEVICE.BAT, SOURCE.BTTC, TYPE.TEMPERATURE3),
+
+		# Beacon
+		(DEVICE.BCN, SOURCE.BCR1,      TYPE.VOLTAGE),
+		(DEVICE.BCN, SOURCE.BCR1,      TYPE.CURRENT),
+		(DEVICE.BCN, SOURCE.BCR2,      TYPE.VOLTAGE),
+		(DEVICE.BCN, SOURCE.BCR2,      TYPE.CURRENT),
+		(DEVICE.BCN, SOURCE.BCR3,      TYPE.VOLTAGE),
+		(DEVICE.BCN, SOURCE.BCR3,      TYPE.CURRENT),
+		(DEVICE.BCN, SOURCE.BCR3,      TYPE.CURRENTB),
+		(DEVICE.BCN, SOURCE.TTC,       TYPE.MANRESET),
+		(DEVICE.BCN, SOURCE.TTC,       TYPE.SOFTRESET),
+		(DEVICE.BCN, SOURCE.TTC,       TYPE.BRWNOUTRESET),
+		(DEVICE.BCN, SOURCE.UHF,       TYPE.CURRENT),
+		(DEVICE.BCN, SOURCE.SBAND,     TYPE.CURRENT),
+		(DEVICE.BCN, SOURCE.CDH,       TYPE.CURRENT),
+		(DEVICE.BCN, SOURCE.SMARD1,    TYPE.CURRENT),
+		(DEVICE.BCN, SOURCE.SMARD2,    TYPE.CURRENT),
+		(DEVICE.BCN, SOURCE.ADCS5V_1,  TYPE.CURRENT),
+		(DEVICE.BCN, SOURCE.ADCS5V_2,  TYPE.CURRENT),
+		(DEVICE.BCN, SOURCE.ADCS3V3_1, TYPE.CURRENT),
+		(DEVICE.BCN, SOURCE.ADCS3V3_2, TYPE.CURRENT),
+		(DEVICE.BCN, SOURCE.PL,        TYPE.CURRENT),
+		(DEVICE.BCN, SOURCE.THM,       TYPE.CURRENT),
+		(DEVICE.BCN, SOURCE.CELL,      TYPE.VOLTAGE),
+		(DEVICE.BCN, SOURCE.CELL,      TYPE.CURRENT)
 	]
 	
 	# ++++++++++++++++++++++++++
 
 	def __init__(self, mode = ""):
+		# the data lists are only ever appended to or replaced as a whole, never
+		# changed in place, which published snapshots rely on
 		self.setMode(mode)
+		self.arrayCache = dict()
 		self.data = dict()
 		for cmd in EpsTlmData.VALID_COMMANDS:
 			self.data[cmd] = list()
+		self.version = 0
+		self.publishCallbacks = list()
+		self.publish(sorted = True)
 
 	# ++++++++++++++++++++++++++
 
 	def __add__(self, other):
 		for cmd in EpsTlmData.VALID_COMMANDS:
 			self.data[cmd] += other.data[cmd]
+		self.publish()
 		return self
 
 	# ++++++++++++++++++++++++++
 
+	def publish(self, sorted = False):
+		# to be called by the writer whenever the data is consistent; sorted
+		# tells whether every channel is in time order, as after sortAllData,
+		# only such snapshots become visible to readers of getSnapshot
+		self.version += 1
+		self.lastSnapshot = EpsTlmSnapshot(self.version, self.data, sorted)
+		if sorted:
+			self.snapshot = self.lastSnapshot
+		for callback in self.publishCallbacks:
+			callback(self.lastSnapshot)
+		return self.lastSnapshot
+
+	def getSnapshot(self, sorted = True):
+		# the last published sorted snapshot, safe to query from any thread
+		# while the data is written, data being read in shows up once sorted;
+		# with sorted False the last published one, for readers not relying
+		# on the time order
+		return self.snapshot if sorted else self.lastSnapshot
+
+	def addPublishCallback(self, callback):
+		# callback(snapshot) is called by the writer on every publish, i.e. once
+		# per decoded block, stream batch or other consistent change, sorted or not
+		self.publishCallbacks.append(callback)
+
+	def removePublishCallback(self, callback):
+		if callback in self.publishCallbacks:
+			self.publishCallbacks.remove(callback)
+
+	# ++++++++++++++++++++++++++
+
 	def __str__(self):
-		ret = ""
+		ret = list()
 		for cmd in EpsTlmData.VALID_COMMANDS:
-			ret += "\n> "
 			tmp = cmd[0].name + " | " + cmd[1].name + " | " + cmd[2].name
-			ret += tmp + "\n  "
-			for i in range(len(tmp)): ret += "="
-			ret += "\n"
+			ret.append("\n> " + tmp + "\n  " + "=" * len(tmp) + "\n")
 			for item in self.data[cmd]:
-				ret += ("  " + str(item[0]) + "   | {:10.3f}\n").format(item[1])
-		return ret
+				ret.append(("  " + str(item[0]) + "   | {:10.3f}\n").format(item[1]))
+		return "".join(ret)
 
 	# ++++++++++++++++++++++++++
 
@@ -268,6 +328,18 @@ class EpsTlmData:
 		return cmd in self.data
 
 	# ++++++++++++++++++++++++++
+
+	def cmdToString(cmd):
+		return cmd[0].name + ":" + cmd[1].name + ":" + cmd[2].name
+
+	def cmdFromString(text):
+		try:
+			device, source, type = text.upper().split(":")
+			return (EpsTlmData.DEVICE[device], EpsTlmData.SOURCE[source], EpsTlmData.TYPE[type])
+		except (ValueError, KeyError):
+			return None
+
+	# ++++++++++++++++++++++++++
 	
 	def addData(self, device, source, type, time, value):
 		ret = self.commandIsValid(self.CMD(device, source, type))
@@ -294,6 +366,7 @@ class EpsTlmData:
 	def sortAllData(self):
 		for cmd in EpsTlmData.VALID_COMMANDS:
 			self.sortData(cmd)
+		self.publish(sorted = True)
 
 	# ++++++++++++++++++++++++++
 
@@ -305,6 +378,7 @@ class EpsTlmData:
 	def deleteAllData(self):
 		for cmd in EpsTlmData.VALID_COMMANDS:
 			self.deleteData(cmd)
+		self.publish(sorted = True)
 
 	# ++++++++++++++++++++++++++
 
@@ -345,6 +419,57 @@ class EpsTlmData:
 
 	# ++++++++++++++++++++++++++
 
+	# the query methods below expect the data of cmd to be sorted
+
+	def getDataIndexRange(self, cmd, startTime = None, endTime = None):
+		data = self.data[cmd]
+		left = 0 if startTime is None else bisect.bisect_left(data, (startTime,))
+		right = len(data) if endTime is None else bisect.bisect_right(data, (endTime, math.inf))
+		return (left, max(left, right))
+
+	def getNearestIndex(self, cmd, time):
+		# index of the sample closest in time, None without data
+		data = self.data[cmd]
+		if len(data) == 0: return None
+		index = bisect.bisect_left(data, (time,))
+		if index == len(data) or (index > 0 and time - data[index - 1][0] <= data[index][0] - time):
+			index -= 1
+		return index
+
+	def getData(self, cmd, startTime = None, endTime = None):
+		if not self.commandIsValid(cmd): return list()
+		left, right = self.getDataIndexRange(cmd, startTime, endTime)
+		return self.data[cmd][left:right]
+
+	def getDataCount(self, cmd, startTime = None, endTime = None):
+		if not self.commandIsValid(cmd): return 0
+		left, right = self.getDataIndexRange(cmd, startTime, endTime)
+		return right - left
+
+	def getTimeRange(self, cmd):
+		if not self.commandIsValid(cmd) or len(self.data[cmd]) == 0: return None
+		return (self.data[cmd][0][0], self.data[cmd][-1][0])
+
+	# ++++++++++++++++++++++++++
+
+	def getArrays(self, cmd):
+		# float64 arrays of the POSIX times and values of cmd, cached until
+		# the data list of cmd is replaced or grows
+		if numpy is None:
+			raise ImportError("NumPy is required for array access to the telemetry data")
+		data = self.data[cmd]
+		cached = self.arrayCache.get(cmd)
+		if cached is not None and cached[0] is data and cached[1] == len(data):
+			return cached[2]
+		arrays = (numpy.array([item[0].timestamp() for item in data], dtype = numpy.float64),
+			numpy.array([item[1] for item in data], dtype = numpy.float64))
+		# shared with every caller and the pandas adapters, so read only
+		for array in arrays: array.flags.writeable = False
+		self.arrayCache[cmd] = (data, len(data), arrays)
+		return arrays
+
+	# ++++++++++++++++++++++++++
+
 	def calculateDerivedData(self, operator, targetCmd, primarySourceCmd, secondarySourceCmd, checkValidity = True):
 		# preparations
 		if checkValidity:
@@ -410,8 +535,606 @@ class EpsTlmData:
 				t.append((s1[indexS1][0] - dt / 2, operator(s1[indexS1][1], s2[-1][1])))
 				indexS1 += 1
 
+		# derived from time ordered channels, the result is in time order as well
+		self.publish(self.lastSnapshot.sorted)
 		return True
 
+	# ++++++++++++++++++++++++++
+
+	DERIVED_COMMANDS = [
+		# (position in VALID_COMMANDS, cmd) of the derived channels listed with the telemetry
+		(2,  (DEVICE.DER, SOURCE.BCR1, TYPE.POWER)),
+		(5,  (DEVICE.DER, SOURCE.BCR2, TYPE.POWER)),
+		(8,  (DEVICE.DER, SOURCE.BCR3, TYPE.POWER)),
+		(10, (DEVICE.DER, SOURCE.BCR3, TYPE.POWERB))
+	]
+
+	def addDerivedCommands():
+		for index, cmd in EpsTlmData.DERIVED_COMMANDS:
+			if cmd not in EpsTlmData.VALID_COMMANDS:
+				EpsTlmData.VALID_COMMANDS.insert(index, cmd)
+
+	def calculateDerivedChannels(self, progressCallback = None):
+		# the BCR powers and the UHF and CDH voltages and currents, which are
+		# the battery and 5 V bus minus their other consumers
+		if progressCallback is None: progressCallback = do_nothing
+		EpsTlmData.addDerivedCommands()
+		for index, cmd in EpsTlmData.DERIVED_COMMANDS:
+			if cmd not in self.data: self.data[cmd] = list()
+		progressSteps = 4 + 3 + 4	# 4x BCR, (2+1)x BATV, (3+1)x 5V
+		progress = 0.0
+		progressCallback(progress / progressSteps)
+
+		# BCR
+		self.deleteData((EpsTlmData.DEVICE.DER, EpsTlmData.SOURCE.BCR1, EpsTlmData.TYPE.POWER))
+		self.calculateDerivedData(operator.mul,
+					(EpsTlmData.DEVICE.DER, EpsTlmData.SOURCE.BCR1, EpsTlmData.TYPE.POWER),
+					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.BCR1, EpsTlmData.TYPE.VOLTAGE),
+					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.BCR1, EpsTlmData.TYPE.CURRENT))
+		progress += 1
+		progressCallback(progress / progressSteps)
+		self.deleteData((EpsTlmData.DEVICE.DER, EpsTlmData.SOURCE.BCR2, EpsTlmData.TYPE.POWER))
+		self.calculateDerivedData(operator.mul,
+					(EpsTlmData.DEVICE.DER, EpsTlmData.SOURCE.BCR2, EpsTlmData.TYPE.POWER),
+					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.BCR2, EpsTlmData.TYPE.VOLTAGE),
+					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.BCR2, EpsTlmData.TYPE.CURRENT))
+		progress += 1
+		progressCallback(progress / progressSteps)
+		self.deleteData((EpsTlmData.DEVICE.DER, EpsTlmData.SOURCE.BCR3, EpsTlmData.TYPE.POWER))
+		self.calculateDerivedData(operator.mul,
+					(EpsTlmData.DEVICE.DER, EpsTlmData.SOURCE.BCR3, EpsTlmData.TYPE.POWER),
+					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.BCR3, EpsTlmData.TYPE.VOLTAGE),
+					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.BCR3, EpsTlmData.TYPE.CURRENT))
+		progress += 1
+		progressCallback(progress / progressSteps)
+		self.deleteData((EpsTlmData.DEVICE.DER, EpsTlmData.SOURCE.BCR3, EpsTlmData.TYPE.POWERB))
+		self.calculateDerivedData(operator.mul,
+					(EpsTlmData.DEVICE.DER, EpsTlmData.SOURCE.BCR3, EpsTlmData.TYPE.POWERB),
+					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.BCR3, EpsTlmData.TYPE.VOLTAGE),
+					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.BCR3, EpsTlmData.TYPE.CURRENTB))
+		progress += 1
+		progressCallback(progress / progressSteps)
+
+		# BATV
+		self.deleteData((EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.UHF, EpsTlmData.TYPE.VOLTAGE))
+		self.data[(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.UHF, EpsTlmData.TYPE.VOLTAGE)] = self.data[(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.PCMBATV, EpsTlmData.TYPE.VOLTAGE)]
+		progress += 1
+		progressCallback(progress / progressSteps)
+		self.deleteTmpData()
+		self.calculateDerivedData(operator.add,
+					(EpsTlmData.DEVICE.TMP, EpsTlmData.SOURCE.TMP, EpsTlmData.TYPE.TMP),
+					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.SMARD1, EpsTlmData.TYPE.CURRENT),
+					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.SMARD2, EpsTlmData.TYPE.CURRENT),
+					checkValidity = False)
+		progress += 1
+		progressCallback(progress / progressSteps)
+		self.deleteData((EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.UHF, EpsTlmData.TYPE.CURRENT))
+		self.calculateDerivedData(operator.sub,
+					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.UHF, EpsTlmData.TYPE.CURRENT),
+					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.PCMBATV, EpsTlmData.TYPE.CURRENT),
+					(EpsTlmData.DEVICE.TMP, EpsTlmData.SOURCE.TMP, EpsTlmData.TYPE.TMP),
+					checkValidity = False)
+		progress += 1
+		progressCallback(progress / progressSteps)
+
+		# 5V
+		self.deleteData((EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.CDH, EpsTlmData.TYPE.VOLTAGE))
+		self.data[(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.CDH, EpsTlmData.TYPE.VOLTAGE)] = self.data[(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.PCM5V, EpsTlmData.TYPE.VOLTAGE)]
+		progress += 1
+		progressCallback(progress / progressSteps)
+		self.deleteTmpData()
+		self.calculateDerivedData(operator.add,
+					(EpsTlmData.DEVICE.TMP, EpsTlmData.SOURCE.TMP, EpsTlmData.TYPE.TMP),
+					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.ADCS5V_1, EpsTlmData.TYPE.CURRENT),
+					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.ADCS5V_2, EpsTlmData.TYPE.CURRENT),
+					checkValidity = False)
+		progress += 1
+		progressCallback(progress / progressSteps)
+		self.calculateDerivedData(operator.add,
+					(EpsTlmData.DEVICE.TMP, EpsTlmData.SOURCE.TMP, EpsTlmData.TYPE.TMP_2),
+					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.THM, EpsTlmData.TYPE.CURRENT),
+					(EpsTlmData.DEVICE.TMP, EpsTlmData.SOURCE.TMP, EpsTlmData.TYPE.TMP),
+					checkValidity = False)
+		progress += 1
+		progressCallback(progress / progressSteps)
+		self.deleteData((EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.CDH, EpsTlmData.TYPE.CURRENT))
+		self.calculateDerivedData(operator.sub,
+					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.CDH, EpsTlmData.TYPE.CURRENT),
+					(EpsTlmData.DEVICE.EPS, EpsTlmData.SOURCE.PCM5V, EpsTlmData.TYPE.CURRENT),
+					(EpsTlmData.DEVICE.TMP, EpsTlmData.SOURCE.TMP, EpsTlmData.TYPE.TMP_2),
+					checkValidity = False)
+		progress += 1
+		progressCallback(progress / progressSteps)
+		self.publish(self.lastSnapshot.sorted)
+
+	# ++++++++++++++++++++++++++
+
+	WRITE_SLICE_SIZE = 1 << 16
+	DERIVED_DEVICES = (DEVICE.DER, DEVICE.BCN, DEVICE.TMP)
+
+	def writeTlmFile(self, fileName, cmds = None, startTime = None, endTime = None, version = None):
+		# writes the data of cmds, by default of all telemetry channels, as one
+		# time sorted *.tlm file and returns the record count, None on failure;
+		# the channels are merged in slices of at most WRITE_SLICE_SIZE samples
+		# per channel, so the encoded output is never held in memory as a whole
+		schema = EpsTlmSchema.get(EpsTlmSchema.DEFAULT_VERSION if version is None else version)
+		if schema is None:
+			print("Unknown record format version " + str(version))
+			return None
+		encoder = schema.compileEncoder()
+		if cmds is None:
+			cmds = [cmd for cmd in EpsTlmData.VALID_COMMANDS if cmd[0] not in EpsTlmData.DERIVED_DEVICES]
+		cmds = [cmd for cmd in cmds if self.commandIsValid(cmd) and len(self.data[cmd]) > 0]
+
+		tmpFileName = fileName + ".tmp"
+		try:
+			with open(tmpFileName, "wb") as of:
+				if numpy is None:
+					count = self.__writeRecords(of, encoder, cmds, startTime, endTime)
+				else:
+					count = self.__writeArrays(of, encoder, cmds, startTime, endTime)
+			os.replace(tmpFileName, fileName)
+		except IOError:
+			print("Error writing telemetry file " + fileName)
+			if os.path.exists(tmpFileName): os.remove(tmpFileName)
+			return None
+		return count
+
+	def __writeArrays(self, of, encoder, cmds, startTime, endTime):
+		channels = list()
+		for cmd in cmds:
+			t, v = self.getArrays(cmd)
+			if numpy.any(t[1:] < t[:-1]):
+				order = numpy.argsort(t, kind = "stable")
+				t, v = t[order], v[order]
+			left = 0 if startTime is None else int(numpy.searchsorted(t, startTime.timestamp(), side = "left"))
+			right = len(t) if endTime is None else int(numpy.searchsorted(t, endTime.timestamp(), side = "right"))
+			if right > left:
+				channels.append([cmd, t[left:right], v[left:right], 0])
+
+		count = 0
+		while True:
+			channels = [channel for channel in channels if channel[3] < len(channel[1])]
+			if not channels: break
+			# every channel contributes its samples up to the earliest time any
+			# channel reaches within the slice size
+			boundary = min(t[min(index + EpsTlmData.WRITE_SLICE_SIZE, len(t)) - 1] for cmd, t, v, index in channels)
+			times, values, keys = list(), list(), list()
+			for channel in channels:
+				cmd, t, v, index = channel
+				end = int(numpy.searchsorted(t, boundary, side = "right"))
+				times.append(t[index:end])
+				values.append(v[index:end])
+				keys.append(numpy.full(end - index, EpsTlmFilter.rawKey(cmd[0].value, cmd[1].value, cmd[2].value), dtype = numpy.uint32))
+				channel[3] = end
+			times = numpy.concatenate(times)
+			order = numpy.argsort(times, kind = "stable")
+			keys = numpy.concatenate(keys)[order]
+			ns = numpy.round(numpy.maximum(times[order], 0)).astype(numpy.uint64) * numpy.uint64(1000000000)
+			of.write(encoder.encode(ns, keys >> 16, (keys >> 8) & 0xff, keys & 0xff, numpy.concatenate(values)[order]))
+			count += len(order)
+		return count
+
+	def __writeRecords(self, of, encoder, cmds, startTime, endTime):
+		# without NumPy, a heap merge of the sorted channels
+		def records(cmd):
+			for time, value in sorted(self.data[cmd], key = operator.itemgetter(0)):
+				if (startTime is not None and time < startTime) or (endTime is not None and time > endTime): continue
+				yield (cmd[0].value, cmd[1].value, cmd[2].value, max(0, round(time.timestamp())) * 1000000000, value)
+
+		count = 0
+		batch = list()
+		for record in heapq.merge(*[records(cmd) for cmd in cmds], key = operator.itemgetter(3)):
+			batch.append(record)
+			if len(batch) >= EpsTlmData.WRITE_SLICE_SIZE:
+				of.write(encoder.encodeRecords(batch))
+				count += len(batch)
+				batch = list()
+		of.write(encoder.encodeRecords(batch))
+		return count + len(batch)
+
+
+
+# ###############################
+# #########   Snapshot   ########
+# ###############################
+
+class EpsTlmSnapshot:
+
+	# immutable view of the channels at one version, as the data lists are
+	# append only, a list and its length at publishing keep their content
+	# without being copied
+
+	def __init__(self, version, data, sorted = True):
+		self.version = version
+		self.sorted = sorted
+		self.channels = dict((cmd, (dataList, len(dataList))) for cmd, dataList in list(data.items()))
+
+	# ++++++++++++++++++++++++++
+
+	def getCommands(self):
+		return [cmd for cmd, (dataList, length) in self.channels.items() if length > 0]
+
+	def getLength(self, cmd):
+		return self.channels[cmd][1] if cmd in self.channels else 0
+
+	# the query methods below expect the data of cmd to be sorted, see self.sorted
+
+	def getDataIndexRange(self, cmd, startTime = None, endTime = None):
+		dataList, length = self.channels.get(cmd, ((), 0))
+		left = 0 if startTime is None else bisect.bisect_left(dataList, (startTime,), 0, length)
+		right = length if endTime is None else bisect.bisect_right(dataList, (endTime, math.inf), 0, length)
+		return (left, max(left, right))
+
+	def getData(self, cmd, startTime = None, endTime = None):
+		if cmd not in self.channels: return list()
+		left, right = self.getDataIndexRange(cmd, startTime, endTime)
+		return self.channels[cmd][0][left:right]
+
+	def getDataCount(self, cmd, startTime = None, endTime = None):
+		left, right = self.getDataIndexRange(cmd, startTime, endTime)
+		return right - left
+
+	def getTimeRange(self, cmd):
+		dataList, length = self.channels.get(cmd, ((), 0))
+		if length == 0: return None
+		return (dataList[0][0], dataList[length - 1][0])
+
+	def getNearestIndex(self, cmd, time):
+		dataList, length = self.channels.get(cmd, ((), 0))
+		if length == 0: return None
+		index = bisect.bisect_left(dataList, (time,), 0, length)
+		if index == length or (index > 0 and time - dataList[index - 1][0] <= dataList[index][0] - time):
+			index -= 1
+		return index
+
+	# ++++++++++++++++++++++++++
+
+	def toTlmData(self, mode = ""):
+		eps = EpsTlmData(mode)
+		for cmd, (dataList, length) in self.channels.items():
+			eps.data[cmd] = dataList[:length]
+		eps.publish(self.sorted)
+		return eps
+
+
+
+# ###############################
+# ######   Record Schema   ######
+# ###############################
+
+class EpsTlmSchema:
+
+	# record: width | time | device | source | type | value
+	# the width byte gives the byte count of the time stamp, so records of
+	# an unknown width can be skipped without losing the record alignment
+
+	REGISTRY = dict()
+	DEFAULT_VERSION = "1.0"
+	SNIFF_SIZE = 4096
+
+	# ++++++++++++++++++++++++++
+
+	def __init__(self, version, timeTypes = None, valueTypes = None, defaultValueType = None):
+		self.version = version
+		self.timeTypes = timeTypes if timeTypes is not None else {8: EpsTlmData.DATATYPE.uint64}
+		self.valueTypes = valueTypes if valueTypes is not None else dict()
+		self.defaultValueType = defaultValueType if defaultValueType is not None else EpsTlmData.DATATYPE.float32
+		self.decoder = None
+		self.encoder = None
+
+	def valueType(self, type):
+		return self.valueTypes.get(type, self.defaultValueType)
+
+	def compile(self):
+		if self.decoder is None:
+			self.decoder = EpsTlmRecordDecoder(self)
+		return self.decoder
+
+	def compileEncoder(self):
+		if self.encoder is None:
+			self.encoder = EpsTlmRecordEncoder(self)
+		return self.encoder
+
+	# ++++++++++++++++++++++++++
+
+	def register(schema):
+		EpsTlmSchema.REGISTRY[schema.version] = schema
+		return schema
+
+	def get(version):
+		return EpsTlmSchema.REGISTRY.get(version)
+
+	def fromFileName(fileName):
+		match = re.search(r"\.v(\d+(?:\.\d+)*)\.tlm", os.path.basename(fileName))
+		if match is None: return None
+		return EpsTlmSchema.get(match.group(1))
+
+	def sniff(head):
+		# picks the schema which decodes the most valid records from the head of a file
+		validCmds = set((cmd[0].value, cmd[1].value, cmd[2].value) for cmd in EpsTlmData.VALID_COMMANDS)
+		bestSchema = EpsTlmSchema.get(EpsTlmSchema.DEFAULT_VERSION)
+		bestCount = -1
+		for schema in EpsTlmSchema.REGISTRY.values():
+			records, consumed, skipped = schema.compile().decode(head)
+			count = sum(1 for record in records if (record[2], record[3], record[4]) in validCmds) - skipped
+			if count > bestCount:
+				bestSchema, bestCount = schema, count
+		return bestSchema
+
+	def detect(fileName):
+		schema = EpsTlmSchema.fromFileName(fileName)
+		if schema is None:
+			try:
+				with openTlmFile(fileName) as file:
+					schema = EpsTlmSchema.sniff(file.read(EpsTlmSchema.SNIFF_SIZE))
+			except COMPRESSION_ERRORS as error:
+				raise IOError("Damaged archive " + fileName + ": " + str(error))
+		return schema
+
+# ++++++++++++++++++++++++++
+
+class EpsTlmRecordDecoder:
+
+	def __init__(self, schema):
+		self.schema = schema
+		self.headers = dict((width, struct.Struct("<" + timeType.value + "BBB")) for width, timeType in schema.timeTypes.items())
+		self.values = dict((type.value, struct.Struct("<" + datatype.value)) for type, datatype in schema.valueTypes.items())
+		self.defaultValue = struct.Struct("<" + schema.defaultValueType.value)
+
+		# a single width and value datatype compile into one fixed record
+		self.record = None
+		self.dtype = None
+		valueTypes = set(schema.valueTypes.values()) | set([schema.defaultValueType])
+		if len(schema.timeTypes) == 1 and len(valueTypes) == 1:
+			self.width, timeType = list(schema.timeTypes.items())[0]
+			self.record = struct.Struct("<B" + timeType.value + "BBB" + schema.defaultValueType.value)
+			if numpy is not None:
+				self.dtype = numpy.dtype([("width", "u1"), ("time", "<" + timeType.value), ("device", "u1"), ("source", "u1"),
+					("type", "u1"), ("value", "<" + schema.defaultValueType.value)])
+
+	# ++++++++++++++++++++++++++
+
+	def decode(self, buffer):
+		# returns (records, consumed byte count, skipped record count), records
+		# being (width, time, device, source, type, value) tuples
+		if self.record is not None:
+			end = len(buffer) - len(buffer) % self.record.size
+			if buffer[0:end:self.record.size].count(self.width) == end // self.record.size:
+				return (self.record.iter_unpack(memoryview(buffer)[:end]), end, 0)
+		return self.decodeVariable(buffer)
+
+	def decodeVariable(self, buffer):
+		records = list()
+		skipped = 0
+		pos = 0
+		size = len(buffer)
+		while pos < size:
+			width = buffer[pos]
+			header = self.headers.get(width)
+			if header is None:
+				end = pos + 1 + width + 3 + self.defaultValue.size
+				if end > size: break
+				skipped += 1
+				pos = end
+				continue
+			if pos + 1 + header.size > size: break
+			time, device, source, type = header.unpack_from(buffer, pos + 1)
+			value = self.values.get(type, self.defaultValue)
+			end = pos + 1 + header.size + value.size
+			if end > size: break
+			records.append((width, time, device, source, type, value.unpack_from(buffer, end - value.size)[0]))
+			pos = end
+		return (records, pos, skipped)
+
+	# ++++++++++++++++++++++++++
+
+	def decodeFiltered(self, buffer, filter, validKeys):
+		# returns (valid records passing the filter, consumed byte count, record
+		# count, invalid record count); fixed records are filtered on their raw
+		# fields with NumPy, so rejected records never become Python objects
+		if self.dtype is not None:
+			end = len(buffer) - len(buffer) % self.record.size
+			array = numpy.frombuffer(buffer, dtype = self.dtype, count = end // self.record.size)
+			if numpy.all(array["width"] == self.width):
+				keys = filter.rawKeys(array)
+				valid = numpy.isin(keys, validKeys.array)
+				mask = valid & filter.mask(array, keys)
+				if not mask.any():
+					return ([], end, len(array), len(array) - int(numpy.count_nonzero(valid)))
+				return (self.record.iter_unpack(array[mask].tobytes()), end, len(array), len(array) - int(numpy.count_nonzero(valid)))
+		records, consumed, skipped = self.decode(buffer)
+		selected = list()
+		count = skipped
+		invalid = skipped
+		for record in records:
+			count += 1
+			if (record[2], record[3], record[4]) not in validKeys.keys:
+				invalid += 1
+			elif filter.matches(record[2], record[3], record[4], record[1]):
+				selected.append(record)
+		return (selected, consumed, count, invalid)
+
+# ++++++++++++++++++++++++++
+
+class EpsTlmRecordEncoder:
+
+	# writes records in the fixed layout of a schema, the inverse of
+	# EpsTlmRecordDecoder.decode; times are given in ns as stored in the file
+
+	def __init__(self, schema):
+		decoder = schema.compile()
+		if decoder.record is None:
+			raise ValueError("Records of schema " + schema.version + " have no fixed layout and cannot be written")
+		self.schema = schema
+		self.width = decoder.width
+		self.record = decoder.record
+		self.dtype = decoder.dtype
+
+	# ++++++++++++++++++++++++++
+
+	def encode(self, times, devices, sources, types, values):
+		# NumPy arrays of equal length (or scalars) -> bytes
+		array = numpy.empty(len(times), dtype = self.dtype)
+		array["width"] = self.width
+		array["time"] = times
+		array["device"] = devices
+		array["source"] = sources
+		array["type"] = types
+		array["value"] = values
+		return array.tobytes()
+
+	def encodeRecords(self, records):
+		# (device, source, type, time, value) tuples -> bytes
+		pack = self.record.pack
+		width = self.width
+		return b"".join(pack(width, time, device, source, type, value) for device, source, type, time, value in records)
+
+# ++++++++++++++++++++++++++
+
+EpsTlmSchema.register(EpsTlmSchema("1.0"))
+
+
+
+# ###############################
+# ##########   Filter   #########
+# ###############################
+
+class EpsTlmFilter:
+
+	# selects records by channel, device and time window on their raw fields,
+	# i.e. before any enum or datetime is created for them
+
+	def __init__(self, cmds = None, devices = None, startTime = None, endTime = None):
+		self.cmds = None if cmds is None else list(cmds)
+		self.devices = None if devices is None else list(devices)
+		self.startTime = startTime
+		self.endTime = endTime
+		self.keys = None if cmds is None else set((cmd[0].value, cmd[1].value, cmd[2].value) for cmd in cmds)
+		self.deviceValues = None if devices is None else set(device.value for device in devices)
+		# records are stored per whole second of their nanosecond time stamp
+		self.startNs = None if startTime is None else int(math.ceil(startTime.timestamp())) * 1000000000
+		self.endNs = None if endTime is None else (int(math.floor(endTime.timestamp())) + 1) * 1000000000
+		self.keyArray = None
+		self.deviceArray = None
+		if numpy is not None:
+			self.keyArray = None if self.keys is None else numpy.array(sorted(EpsTlmFilter.rawKey(*key) for key in self.keys), dtype = numpy.uint32)
+			self.deviceArray = None if self.deviceValues is None else numpy.array(sorted(self.deviceValues), dtype = numpy.uint8)
+
+	# ++++++++++++++++++++++++++
+
+	def rawKey(device, source, type):
+		return (device << 16) | (source << 8) | type
+
+	def rawKeys(self, array):
+		return (array["device"].astype(numpy.uint32) << 16) | (array["source"].astype(numpy.uint32) << 8) | array["type"]
+
+	def matches(self, device, source, type, time):
+		return ((self.keys is None or (device, source, type) in self.keys)
+			and (self.deviceValues is None or device in self.deviceValues)
+			and (self.startNs is None or time >= self.startNs)
+			and (self.endNs is None or time < self.endNs))
+
+	def mask(self, array, keys):
+		mask = numpy.ones(len(array), dtype = bool)
+		if self.keyArray is not None: mask &= numpy.isin(keys, self.keyArray)
+		if self.deviceArray is not None: mask &= numpy.isin(array["device"], self.deviceArray)
+		if self.startNs is not None: mask &= array["time"] >= self.startNs
+		if self.endNs is not None: mask &= array["time"] < self.endNs
+		return mask
+
+	def matchesEntry(self, entry):
+		# whether a file with this catalog entry may contain matching records,
+		# the channels of sampled entries are incomplete and not used
+		if self.startNs is not None or self.endNs is not None:
+			if entry["start"] is None: return False
+			if self.endNs is not None and entry["start"] * 1000000000 >= self.endNs: return False
+			if self.startNs is not None and (entry["end"] + 1) * 1000000000 <= self.startNs: return False
+		if not entry["sampled"]:
+			channels = [EpsTlmData.cmdFromString(channel) for channel in entry["channels"]]
+			if self.cmds is not None and not any(cmd in self.cmds for cmd in channels): return False
+			if self.devices is not None and not any(cmd is not None and cmd[0] in self.devices for cmd in channels): return False
+		return True
+
+# ++++++++++++++++++++++++++
+
+class EpsTlmValidKeys:
+
+	# raw (device, source, type) keys of the valid commands, as a set and as a sorted array
+
+	def __init__(self, cmds):
+		self.keys = set((cmd[0].value, cmd[1].value, cmd[2].value) for cmd in cmds)
+		self.array = None if numpy is None else numpy.array(sorted(EpsTlmFilter.rawKey(*key) for key in self.keys), dtype = numpy.uint32)
+
+
+
+# ###############################
+# ######   Decompression   ######
+# ###############################
+
+class EpsTlmPrefetcher:
+
+	# decompresses the compressed files of a file list in worker threads
+	# ahead of their decoding, zlib, lzma and bz2 release the GIL while
+	# decompressing; every file is queued in at most QUEUE_BLOCKS blocks, so
+	# memory stays bounded however large the archives are
+
+	QUEUE_BLOCKS = 4
+
+	# ++++++++++++++++++++++++++
+
+	def __init__(self, fileList, workers = None):
+		self.queues = dict()
+		self.abandoned = set()
+		self.closed = False
+		compressed = list(dict.fromkeys(fileName for fileName in fileList if isCompressedTlmFile(fileName)))
+		self.executor = None
+		if len(compressed) > 1:
+			self.executor = concurrent.futures.ThreadPoolExecutor(max_workers = workers if workers is not None else os.cpu_count())
+			for fileName in compressed:
+				self.queues[fileName] = queue.Queue(EpsTlmPrefetcher.QUEUE_BLOCKS)
+				self.executor.submit(self.__fill, fileName, self.queues[fileName])
+
+	def __fill(self, fileName, blockQueue):
+		def put(item):
+			while not self.closed and fileName not in self.abandoned:
+				try:
+					blockQueue.put(item, timeout = 0.1)
+					return True
+				except queue.Full:
+					pass
+			return False
+
+		try:
+			for buffer in iterTlmBlocks(fileName):
+				if not put(buffer): return
+			put(None)
+		except IOError as error:
+			put(error)
+
+	# ++++++++++++++++++++++++++
+
+	def iterBlocks(self, fileName):
+		# blocks of the decompressed content; files not prefetched, and files
+		# read a second time, whose queue is used up, are read directly
+		blockQueue = self.queues.pop(fileName, None)
+		if blockQueue is None:
+			yield from iterTlmBlocks(fileName)
+			return
+		try:
+			while True:
+				buffer = blockQueue.get()
+				if buffer is None: break
+				if isinstance(buffer, IOError): raise buffer
+				yield buffer
+		finally:
+			self.abandoned.add(fileName)
+
+	def close(self):
+		self.closed = True
+		if self.executor is not None:
+			self.executor.shutdown(wait = True)
+
 
 
 # ###############################
@@ -420,8 +1143,10 @@ class EpsTlmData:
 
 class EpsTlmFileReader(EpsTlmData):
 	
+	FILE_EXTENSIONS = (".tlm", ".tlm.gz", ".tlm.xz", ".tlm.bz2")
 	INVALID_VALUE_RATE_LIMIT = 0.025		# expected (init block): 1/51 = 0.019
 	MINIMUM_COUNT = 500
+	BLOCK_SIZE = 1 << 20
 	
 	# ++++++++++++++++++++++++++
 
@@ -431,7 +1156,10 @@ class EpsTlmFileReader(EpsTlmData):
 		itemCount = 0
 		self.setFolder("")
 		self.setFile(fileName)
+		self.setSchema(None)
+		self.setFilter(None)
 		self.setProgressCallback(do_nothing)
+		self.prefetcher = EpsTlmPrefetcher([])
 
 
 	# ++++++++++++++++++++++++++
@@ -439,28 +1167,57 @@ class EpsTlmFileReader(EpsTlmData):
 	def setFile(self, fileName):
 		if type(fileName) == list:
 			self.fileList = list()
-			for file in fileName:
+			for file in uniqueFileList(fileName):
 				if os.path.isfile(file): self.fileList.append(file)
 
 		else:
 			self.tlmFileName = fileName
-			if fileName[-4:] == ".tlm":
-				self.csvFileName = fileName[:-4] + ".csv"
-			else:
-				self.csvFileName = fileName + ".csv"
+			self.csvFileName = stripTlmExtension(fileName) + ".csv"
 			if os.path.exists(self.csvFileName):
+				directory = os.path.dirname(self.csvFileName)
+				existing = set(os.listdir(directory if directory else "."))
+				baseName = os.path.basename(self.csvFileName)[:-4]
 				i = 1
-				while os.path.exists(self.csvFileName[:-4] + "(" + str(i) + ").csv"):
+				while baseName + "(" + str(i) + ").csv" in existing:
 					i += 1
 				self.csvFileName = self.csvFileName[:-4] + "(" + str(i) + ").csv"
 
 	# ++++++++++++++++++++++++++
 
-	def setFolder(self, folderName):
+	def setSchema(self, version):
+		# None selects the schema per file by its name or its content
+		self.schema = None if version is None else EpsTlmSchema.get(version)
+		return version is None or self.schema is not None
+
+	# ++++++++++++++++++++++++++
+
+	def setFilter(self, filter):
+		# an EpsTlmFilter applied while decoding, None reads all records
+		self.filter = filter
+
+	def fileMayMatch(self, fileName):
+		# False if the catalog of the file's folder shows that no record passes the filter
+		if self.filter is None: return True
+		entry = EpsTlmCatalog.lookup(fileName)
+		return entry is None or self.filter.matchesEntry(entry)
+
+	# ++++++++++++++++++++++++++
+
+	def setFolder(self, folderName, startTime = None, endTime = None):
+		# with a time window only the files overlapping it are listed, as
+		# planned from the folder's catalog
 		self.fileList = list()
 		if folderName and os.path.isdir(folderName):
+			if startTime is not None or endTime is not None:
+				if self.FILE_EXTENSIONS != EpsTlmFileReader.FILE_EXTENSIONS:
+					print("Time windows are only supported for folders of *.tlm files")
+					return False
+				catalog = EpsTlmCatalog(folderName, self.schema)
+				catalog.update()
+				self.fileList = catalog.getFiles(startTime, endTime)
+				return True
 			for file in os.listdir(folderName):
-				if file.endswith(".tlm"):
+				if file.endswith(self.FILE_EXTENSIONS):
 					self.fileList.append(os.path.join(folderName, file))
 			return True
 		else:
@@ -468,6 +1225,36 @@ class EpsTlmFileReader(EpsTlmData):
 
 	# ++++++++++++++++++++++++++
 
+	def iterFileBlocks(self, fileName):
+		# yields (records, skipped record count) per block, an incomplete
+		# record at the end of a block is completed by the next block
+		schema = self.schema if self.schema is not None else EpsTlmSchema.detect(fileName)
+		decoder = schema.compile()
+		rest = b""
+		for buffer in self.prefetcher.iterBlocks(fileName):
+			if rest: buffer = rest + buffer
+			records, consumed, skipped = decoder.decode(buffer)
+			yield (records, skipped)
+			rest = buffer[consumed:]
+
+	def iterFilteredBlocks(self, fileName, validKeys):
+		# yields (valid records passing self.filter, record count, invalid record count) per block
+		schema = self.schema if self.schema is not None else EpsTlmSchema.detect(fileName)
+		decoder = schema.compile()
+		rest = b""
+		for buffer in self.prefetcher.iterBlocks(fileName):
+			if rest: buffer = rest + buffer
+			records, consumed, count, invalid = decoder.decodeFiltered(buffer, self.filter, validKeys)
+			yield (records, count, invalid)
+			rest = buffer[consumed:]
+
+	def iterFileRecords(self, fileName):
+		for records, skipped in self.iterFileBlocks(fileName):
+			for width, time, device, source, type, value in records:
+				yield (device, source, type, time, value)
+
+	# ++++++++++++++++++++++++++
+
 	def readFile(self):
 		errorCount = 0
 		itemCount = 0
@@ -480,38 +1267,32 @@ class EpsTlmFileReader(EpsTlmData):
 			of = open(self.csvFileName, "a")
 			of.write("DEVICE;SOURCE;TYPE;DATE;TIME;VALUE;\n")
 
+		# raw (device, source, type) -> data list, anything else is invalid
+		dataLists = dict(((cmd[0].value, cmd[1].value, cmd[2].value), self.data[cmd]) for cmd in self.data)
+		csvNames = dict(((cmd[0].value, cmd[1].value, cmd[2].value), cmd[0].name + ";" + cmd[1].name + ";" + cmd[2].name) for cmd in self.data)
+		lastSecond = None
+
 		try:
-			with open(self.tlmFileName, "rb") as file:
-				while True:
-					buffer = file.read(EpsTlmData.DATATYPE.byteCount(EpsTlmData.DATATYPE.WIDTH))
-					if not buffer: break
-					width = struct.unpack(EpsTlmData.DATATYPE.uint8.value, buffer)[0]
-
-					buffer = file.read(EpsTlmData.DATATYPE.byteCount(EpsTlmData.DATATYPE.TIME))
-					if not buffer: break
-					time = datetime.datetime.fromtimestamp(int(struct.unpack(EpsTlmData.DATATYPE.TIME.value, buffer)[0] / 1e9))
-				
-					buffer = file.read(EpsTlmData.DATATYPE.byteCount(EpsTlmData.DATATYPE.DEVICE))
-					if not buffer: break
-					device = struct.unpack(EpsTlmData.DATATYPE.DEVICE.value, buffer)[0]
-				
-					buffer = file.read(EpsTlmData.DATATYPE.byteCount(EpsTlmData.DATATYPE.SOURCE))
-					if not buffer: break
-					source = struct.unpack(EpsTlmData.DATATYPE.SOURCE.value, buffer)[0]
-				
-					buffer = file.read(EpsTlmData.DATATYPE.byteCount(EpsTlmData.DATATYPE.TYPE))
-					if not buffer: break
-					type = struct.unpack(EpsTlmData.DATATYPE.TYPE.value, buffer)[0]
-				
-					try:
-						buffer = file.read(EpsTlmData.DATATYPE.byteCount(EpsTlmData.DATATYPE.VALUE(type)))
-						if not buffer: break
-						value = struct.unpack(EpsTlmData.DATATYPE.VALUE(type).value, buffer)[0]
-
-						ret = self.addData(device, source, type, time, value)
-
-					except ValueError:
-						ret = False
+			if self.filter is not None:
+				return self.readFilteredFile(dataLists, csvNames, of if self.modeWrite else None)
+
+			for records, skipped in self.iterFileBlocks(self.tlmFileName):
+				for width, time, device, source, type, value in records:
+					second = int(time / 1e9)
+					if second != lastSecond:
+						lastSecond = second
+						lastTime = datetime.datetime.fromtimestamp(second)
+					time = lastTime
+
+					dataList = dataLists.get((device, source, type))
+					if dataList is not None and not self.modePrint:
+						dataList.append((time, value))
+						ret = True
+					else:
+						try:
+							ret = self.addData(device, source, type, time, value)
+						except ValueError:
+							ret = False
 
 					itemCount += 1
 					if not ret:
@@ -521,11 +1302,18 @@ class EpsTlmFileReader(EpsTlmData):
 							return False
 					elif self.modeWrite:
 						tmp = str(time).split(" ")
-						of.write((EpsTlmData.DEVICE(device).name + ";" + 
-							EpsTlmData.SOURCE(source).name + ";" +
-							EpsTlmData.TYPE(type).name + ";" +
+						of.write((csvNames[(device, source, type)] + ";" +
 							tmp[0] + ";" + tmp[1] +
 							";{:f};\n").format(value))
+
+				self.publish()
+
+				# records of unknown width
+				itemCount += skipped
+				errorCount += skipped
+				if skipped and itemCount > EpsTlmFileReader.MINIMUM_COUNT and float(errorCount) / itemCount > EpsTlmFileReader.INVALID_VALUE_RATE_LIMIT:
+					print("EPS telemetry file", self.tlmFileName, "is corrupt:", errorCount, "/", itemCount)
+					return False
 		except IOError:
 			print("Error reading telemetry file " + self.tlmFileName + ", error rate: " + str(errorCount) + "/" + str(itemCount))
 			return False
@@ -534,18 +1322,136 @@ class EpsTlmFileReader(EpsTlmData):
 
 		return True
 
+	def readFilteredFile(self, dataLists, csvNames, of = None):
+		# readFile with self.filter applied while decoding
+		errorCount = 0
+		itemCount = 0
+		lastSecond = None
+		validKeys = EpsTlmValidKeys(self.data)
+		for records, count, invalid in self.iterFilteredBlocks(self.tlmFileName, validKeys):
+			for width, time, device, source, type, value in records:
+				second = int(time / 1e9)
+				if second != lastSecond:
+					lastSecond = second
+					lastTime = datetime.datetime.fromtimestamp(second)
+				if self.modePrint:
+					self.addData(device, source, type, lastTime, value)
+				else:
+					dataLists[(device, source, type)].append((lastTime, value))
+				if of is not None:
+					tmp = str(lastTime).split(" ")
+					of.write((csvNames[(device, source, type)] + ";" +
+						tmp[0] + ";" + tmp[1] +
+						";{:f};\n").format(value))
+
+			self.publish()
+			itemCount += count
+			errorCount += invalid
+			if invalid and itemCount > EpsTlmFileReader.MINIMUM_COUNT and float(errorCount) / itemCount > EpsTlmFileReader.INVALID_VALUE_RATE_LIMIT:
+				print("EPS telemetry file", self.tlmFileName, "is corrupt:", errorCount, "/", itemCount)
+				return False
+
+		if of is not None: of.close()
+		return True
+
+	# ++++++++++++++++++++++++++
+
+	def iterRecordBatches(self, fileList = None, batchSize = 10000, cmds = None, validate = True):
+		# yields lists of at most batchSize (device, source, type, time, value) tuples;
+		# files exceeding the invalid value rate are listed in self.corruptFiles
+		if fileList is None: fileList = self.fileList
+		validCmds = set((cmd[0].value, cmd[1].value, cmd[2].value) for cmd in self.data)
+		if cmds is not None:
+			selectedCmds = set((cmd[0].value, cmd[1].value, cmd[2].value) for cmd in cmds)
+		else:
+			selectedCmds = validCmds if validate else None
+		self.corruptFiles = list()
+
+		batch = list()
+		lastSecond = None
+		self.prefetcher = EpsTlmPrefetcher([fileName for fileName in fileList if self.fileMayMatch(fileName)])
+		try:
+			for fileName in fileList:
+				errorCount = 0
+				itemCount = 0
+				if not self.fileMayMatch(fileName):
+					continue
+				try:
+					if self.filter is not None:
+						validKeys = EpsTlmValidKeys(self.data)
+						for records, count, invalid in self.iterFilteredBlocks(fileName, validKeys):
+							itemCount += count
+							errorCount += invalid
+							if validate and invalid and itemCount > EpsTlmFileReader.MINIMUM_COUNT and float(errorCount) / itemCount > EpsTlmFileReader.INVALID_VALUE_RATE_LIMIT:
+								print("EPS telemetry file", fileName, "is corrupt:", errorCount, "/", itemCount)
+								self.corruptFiles.append(fileName)
+								break
+							for width, time, device, source, type, value in records:
+								if selectedCmds is not None and (device, source, type) not in selectedCmds:
+									continue
+								second = int(time / 1e9)
+								if second != lastSecond:
+									lastSecond = second
+									lastTime = datetime.datetime.fromtimestamp(second)
+								batch.append((device, source, type, lastTime, value))
+								if len(batch) >= batchSize:
+									yield batch
+									batch = list()
+						continue
+
+					for device, source, type, time, value in self.iterFileRecords(fileName):
+						itemCount += 1
+						if validate and (device, source, type) not in validCmds:
+							errorCount += 1
+							if itemCount > EpsTlmFileReader.MINIMUM_COUNT and float(errorCount) / itemCount > EpsTlmFileReader.INVALID_VALUE_RATE_LIMIT:
+								print("EPS telemetry file", fileName, "is corrupt:", errorCount, "/", itemCount)
+								self.corruptFiles.append(fileName)
+								break
+							continue
+						if selectedCmds is not None and (device, source, type) not in selectedCmds:
+							continue
+
+						second = int(time / 1e9)
+						if second != lastSecond:
+							lastSecond = second
+							lastTime = datetime.datetime.fromtimestamp(second)
+						batch.append((device, source, type, lastTime, value))
+						if len(batch) >= batchSize:
+							yield batch
+							batch = list()
+				except IOError:
+					print("Error reading telemetry file " + fileName + ", error rate: " + str(errorCount) + "/" + str(itemCount))
+					self.corruptFiles.append(fileName)
+
+			if batch:
+				yield batch
+		finally:
+			self.prefetcher.close()
+			self.prefetcher = EpsTlmPrefetcher([])
+
 	# ++++++++++++++++++++++++++
 
 	def readFileList(self):
+		if not self.fileList:
+			print("No telemetry files to read")
+			return False
 		ret = True
 		it = 0
 		self.progressCallback(float(it) / len(self.fileList))
-		for file in self.fileList:
-			self.setFile(file)
-			ret &= self.readFile()
-			it += 1
-			self.progressCallback(float(it) / len(self.fileList))
+		fileList = [file for file in self.fileList if self.fileMayMatch(file)]
+		self.prefetcher = EpsTlmPrefetcher(fileList)
+		try:
+			for file in self.fileList:
+				if file in fileList:
+					self.setFile(file)
+					ret &= self.readFile()
+				it += 1
+				self.progressCallback(float(it) / len(self.fileList))
+		finally:
+			self.prefetcher.close()
+			self.prefetcher = EpsTlmPrefetcher([])
 
+		self.publish()
 		return ret
 
 	# ++++++++++++++++++++++++++
@@ -562,7 +1468,8 @@ class EpsTlmFileReader(EpsTlmData):
 		of = open(filename, "a")
 		if not fileExists: of.write("DEVICE;SOURCE;TYPE;DATE;TIME;VALUE;\n")
 
-		for item in self.data[cmd]:
+		dataList, length = self.getSnapshot(sorted = False).channels.get(cmd, ((), 0))
+		for item in dataList[:length]:
 			tmp = str(item[0]).split(" ")
 			of.write((cmd[0].name + ";" + 
 				cmd[1].name + ";" +
@@ -591,11 +1498,304 @@ class EpsTlmFileReader(EpsTlmData):
 
 
 
+# ###############################
+# #########   Catalog   #########
+# ###############################
+
+class EpsTlmCatalog:
+
+	# per file time range, record count, channels and checksum of a folder of
+	# *.tlm files, kept in a manifest inside the folder and only rescanned for
+	# new or changed files; files of a fixed record size are summarised from a
+	# sample of their head and tail, then count and checksum are estimates
+
+	MANIFEST_NAME = "eps_tlm_catalog.json"
+	MANIFEST_VERSION = 1
+	SAMPLE_SIZE = 64 * 1024
+	SAMPLE_VALID_RATE = 0.9
+	MINIMUM_TIME = datetime.datetime(2000, 1, 1)	# earlier time stamps come from an unset clock
+
+	# ++++++++++++++++++++++++++
+
+	def __init__(self, folderName, schema = None, sample = True):
+		self.folderName = folderName
+		self.manifestName = os.path.join(folderName, EpsTlmCatalog.MANIFEST_NAME)
+		self.schema = schema
+		self.sample = sample
+		self.entries = dict()
+		self.load()
+
+	# ++++++++++++++++++++++++++
+
+	def load(self):
+		self.entries = dict()
+		try:
+			with open(self.manifestName, "r") as file:
+				manifest = json.load(file)
+			if manifest.get("version") == EpsTlmCatalog.MANIFEST_VERSION:
+				self.entries = manifest["files"]
+		except (IOError, ValueError, KeyError):
+			pass
+
+	def save(self):
+		tmpName = self.manifestName + ".tmp"
+		try:
+			with open(tmpName, "w") as file:
+				json.dump({"version": EpsTlmCatalog.MANIFEST_VERSION, "files": self.entries}, file, indent = 1, sort_keys = True)
+			os.replace(tmpName, self.manifestName)
+		except IOError:
+			print("Catalog " + self.manifestName + " could not be written")
+			return False
+		return True
+
+	# ++++++++++++++++++++++++++
+
+	def update(self, progressCallback = None):
+		# returns the number of rescanned files
+		if progressCallback is None: progressCallback = do_nothing
+		files = dict()
+		for entry in os.scandir(self.folderName):
+			if entry.name.endswith(EpsTlmFileReader.FILE_EXTENSIONS) and entry.is_file():
+				files[entry.name] = entry.stat()
+
+		changed = [name for name, stat in files.items() if name not in self.entries
+			or self.entries[name]["size"] != stat.st_size or self.entries[name]["mtime"] != stat.st_mtime_ns]
+		removed = [name for name in self.entries if name not in files]
+		for name in removed:
+			del self.entries[name]
+		prefetcher = EpsTlmPrefetcher([os.path.join(self.folderName, name) for name in sorted(changed)])
+		try:
+			for it, name in enumerate(sorted(changed)):
+				progressCallback(float(it) / len(changed))
+				entry = self.scanFile(os.path.join(self.folderName, name), prefetcher)
+				if entry is not None:
+					entry["size"] = files[name].st_size
+					entry["mtime"] = files[name].st_mtime_ns
+					self.entries[name] = entry
+		finally:
+			prefetcher.close()
+		if changed or removed:
+			self.save()
+		progressCallback(1.0)
+		return len(changed)
+
+	# ++++++++++++++++++++++++++
+
+	def scanFile(self, fileName, prefetcher = None):
+		# archives cannot be sampled without decompressing them up to the tail, they are always scanned in full
+		validCmds = set((cmd[0].value, cmd[1].value, cmd[2].value) for cmd in EpsTlmData.VALID_COMMANDS)
+		try:
+			schema = self.schema if self.schema is not None else EpsTlmSchema.detect(fileName)
+			decoder = schema.compile()
+			entry = None
+			if self.sample and decoder.record is not None and not isCompressedTlmFile(fileName):
+				entry = self.__scanSample(fileName, decoder, validCmds)
+			if entry is None:
+				blocks = iterTlmBlocks(fileName) if prefetcher is None else prefetcher.iterBlocks(fileName)
+				entry = self.__scanFull(blocks, decoder, validCmds)
+		except IOError:
+			print("Error reading telemetry file " + fileName)
+			return None
+		entry["schema"] = schema.version
+		return entry
+
+	def __scanSample(self, fileName, decoder, validCmds):
+		# None if the file is too short or its samples are not record aligned
+		size = os.path.getsize(fileName)
+		recordSize = decoder.record.size
+		if size <= 2 * EpsTlmCatalog.SAMPLE_SIZE:
+			return None
+		with open(fileName, "rb") as file:
+			head = file.read(EpsTlmCatalog.SAMPLE_SIZE)
+			file.seek((size - EpsTlmCatalog.SAMPLE_SIZE) // recordSize * recordSize)
+			tail = file.read()
+		summary = EpsTlmCatalog.Summary(validCmds)
+		for sample in (head, tail):
+			records, consumed, skipped = decoder.decode(sample)
+			itemCount = summary.itemCount
+			validCount = summary.add(records)
+			if validCount < EpsTlmCatalog.SAMPLE_VALID_RATE * (summary.itemCount - itemCount + skipped):
+				return None
+		checksum = zlib.crc32(tail, zlib.crc32(head, size))
+		return summary.toEntry(size // recordSize, checksum, True)
+
+	def __scanFull(self, blocks, decoder, validCmds):
+		summary = EpsTlmCatalog.Summary(validCmds)
+		checksum = 0
+		count = 0
+		rest = b""
+		for buffer in blocks:
+			checksum = zlib.crc32(buffer, checksum)
+			if rest: buffer = rest + buffer
+			records, consumed, skipped = decoder.decode(buffer)
+			summary.add(records)
+			count += skipped
+			rest = buffer[consumed:]
+		return summary.toEntry(count + summary.itemCount, checksum, False)
+
+	# ++++++++++++++++++++++++++
+
+	class Summary:
+
+		def __init__(self, validCmds):
+			self.validCmds = validCmds
+			self.minimumTime = int(EpsTlmCatalog.MINIMUM_TIME.timestamp() * 1e9)
+			self.channels = set()
+			self.startTime = None
+			self.endTime = None
+			self.itemCount = 0
+
+		def add(self, records):
+			# returns the number of valid records
+			validCount = 0
+			for width, time, device, source, type, value in records:
+				self.itemCount += 1
+				key = (device, source, type)
+				if key not in self.validCmds: continue
+				validCount += 1
+				self.channels.add(key)
+				if time < self.minimumTime: continue
+				if self.startTime is None or time < self.startTime: self.startTime = time
+				if self.endTime is None or time > self.endTime: self.endTime = time
+			return validCount
+
+		def toEntry(self, count, checksum, sampled):
+			return {
+				"start": None if self.startTime is None else int(self.startTime / 1e9),
+				"end": None if self.endTime is None else int(self.endTime / 1e9),
+				"count": count,
+				"channels": sorted(EpsTlmData.cmdToString((EpsTlmData.DEVICE(key[0]), EpsTlmData.SOURCE(key[1]), EpsTlmData.TYPE(key[2]))) for key in self.channels),
+				"checksum": "{:08x}".format(checksum),
+				"sampled": sampled
+			}
+
+	# ++++++++++++++++++++++++++
+
+	MANIFESTS = dict()		# folder -> (manifest mtime, entries) of the catalogs used by lookup
+
+	def lookup(fileName):
+		# the up to date catalog entry of a file, None if its folder has no
+		# catalog or the file changed since it was catalogued
+		folderName = os.path.dirname(os.path.abspath(fileName))
+		try:
+			manifestTime = os.stat(os.path.join(folderName, EpsTlmCatalog.MANIFEST_NAME)).st_mtime_ns
+			stat = os.stat(fileName)
+		except OSError:
+			return None
+		cached = EpsTlmCatalog.MANIFESTS.get(folderName)
+		if cached is None or cached[0] != manifestTime:
+			cached = EpsTlmCatalog.MANIFESTS[folderName] = (manifestTime, EpsTlmCatalog(folderName).entries)
+		entry = cached[1].get(os.path.basename(fileName))
+		if entry is None or entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime_ns:
+			return None
+		return entry
+
+	# ++++++++++++++++++++++++++
+
+	def getFiles(self, startTime = None, endTime = None):
+		# files overlapping the window in the order of their start time, files
+		# without a valid time stamp are only listed without a window
+		start = None if startTime is None else startTime.timestamp()
+		end = None if endTime is None else endTime.timestamp()
+		files = list()
+		for name, entry in self.entries.items():
+			if entry["start"] is None:
+				if start is None and end is None: files.append((math.inf, name))
+				continue
+			if (end is None or entry["start"] <= end) and (start is None or entry["end"] + 1 > start):
+				files.append((entry["start"], name))
+		return [os.path.join(self.folderName, name) for start, name in sorted(files)]
+
+	def getTimeRange(self):
+		starts = [entry["start"] for entry in self.entries.values() if entry["start"] is not None]
+		ends = [entry["end"] for entry in self.entries.values() if entry["end"] is not None]
+		if not starts: return None
+		return (datetime.datetime.fromtimestamp(min(starts)), datetime.datetime.fromtimestamp(max(ends)))
+
+	def __str__(self):
+		lines = [" {:40s} | {:19s} | {:19s} | {:>9s} | {:>8s} | {:8s}".format("FILE", "START", "END", "COUNT", "CHANNELS", "CHECKSUM")]
+		for name in sorted(self.entries, key = lambda name: (self.entries[name]["start"] or 0, name)):
+			entry = self.entries[name]
+			start = "-" if entry["start"] is None else str(datetime.datetime.fromtimestamp(entry["start"]))
+			end = "-" if entry["end"] is None else str(datetime.datetime.fromtimestamp(entry["end"]))
+			lines.append(" {:40s} | {:19s} | {:19s} | {:9d}{} | {:8d} | {}".format(name, start, end, entry["count"],
+				"~" if entry["sampled"] else " ", len(entry["channels"]), entry["checksum"]))
+		return "\n".join(lines)
+
+
+
 # ###############################
 
 def do_nothing(var = 0):
 	pass
 
+COMPRESSION_MODULES = {".gz": gzip, ".xz": lzma, ".bz2": bz2}
+COMPRESSION_ERRORS = (EOFError, lzma.LZMAError, zlib.error)
+
+def isCompressedTlmFile(fileName):
+	return os.path.splitext(fileName)[1] in COMPRESSION_MODULES
+
+def stripTlmExtension(fileName):
+	for extension in EpsTlmFileReader.FILE_EXTENSIONS:
+		if fileName.endswith(extension):
+			return fileName[:-len(extension)]
+	return fileName
+
+def uniqueFileList(fileList):
+	# the file list without repeated files, in the order of their first occurrence
+	seen = set()
+	unique = list()
+	for fileName in fileList:
+		path = os.path.abspath(fileName)
+		if path not in seen:
+			seen.add(path)
+			unique.append(fileName)
+	return unique
+
+def openTlmFile(fileName):
+	# *.tlm files and their gzip, xz and bzip2 archives, decompressed while read
+	module = COMPRESSION_MODULES.get(os.path.splitext(fileName)[1])
+	return open(fileName, "rb") if module is None else module.open(fileName, "rb")
+
+def iterTlmBlocks(fileName):
+	# blocks of EpsTlmFileReader.BLOCK_SIZE bytes of the (decompressed) content,
+	# a damaged archive raises IOError like a failing read
+	try:
+		with openTlmFile(fileName) as file:
+			while True:
+				buffer = file.read(EpsTlmFileReader.BLOCK_SIZE)
+				if not buffer: break
+				yield buffer
+	except COMPRESSION_ERRORS as error:
+		raise IOError("Damaged archive " + fileName + ": " + str(error))
+
+def decimateArrays(t, v, points):
+	# sorted samples of more than points reduced to the minimum and maximum of
+	# points / 2 equally long time buckets, in time order; needs numpy
+	if len(t) <= points:
+		return (t, v)
+	bucketCount = max(1, points // 2)
+	buckets = numpy.minimum(((t - t[0]) * (bucketCount / max(t[-1] - t[0], 1e-9))).astype(numpy.int64), bucketCount - 1)
+	order = numpy.lexsort((v, buckets))
+	starts = numpy.flatnonzero(numpy.concatenate(([True], buckets[order][1:] != buckets[order][:-1])))
+	ends = numpy.concatenate((starts[1:], [len(order)])) - 1
+	indices = numpy.unique(numpy.concatenate((order[starts], order[ends])))
+	return (t[indices], v[indices])
+
+TIME_FORMATS = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"]
+
+def parseTime(text):
+	try:
+		return datetime.datetime.fromisoformat(text)
+	except (ValueError, AttributeError):
+		pass
+	for format in TIME_FORMATS:
+		try:
+			return datetime.datetime.strptime(text, format)
+		except ValueError:
+			pass
+	return None
+
 
 # ###############################
 # ########     Main     #########
@@ -607,6 +1807,14 @@ if __name__ == "__main__":
 	parser.add_argument("-o", "--output", help = "outputs a human readable *.csv file", action = "store_true")
 	parser.add_argument("-p", "--print", help = "prints the values read from the *.tlm file", action = "store_true")
 	parser.add_argument("-s", "--sorted", help = "prints the values sorted according to the data type", action = "store_true")
+	parser.add_argument("--schema", help = "record format version, detected from the file name or content by default", choices = sorted(EpsTlmSchema.REGISTRY))
+	parser.add_argument("--from", dest = "startTime", help = "only reads records from this time on, of a folder only the files overlapping the window")
+	parser.add_argument("--to", dest = "endTime", help = "only reads records up to this time, of a folder only the files overlapping the window")
+	parser.add_argument("--last", type = float, metavar = "HOURS", help = "only reads the files of a folder overlapping the last HOURS hours of its telemetry")
+	parser.add_argument("-c", "--catalog", help = "prints the catalog of a folder instead of reading it", action = "store_true")
+	parser.add_argument("--channel", action = "append", help = "only reads this channel, e.g. EPS:BCR1:VOLTAGE (repeatable)")
+	parser.add_argument("--device", action = "append", help = "only reads the channels of this device, e.g. BAT (repeatable)", choices = [device.name for device in EpsTlmData.DEVICE])
+	parser.add_argument("-t", "--tlm-output", metavar = "FILE", help = "writes the records read as one time sorted *.tlm file")
 
 	mode = ""
 	isFolder = False
@@ -614,11 +1822,35 @@ if __name__ == "__main__":
 	fileName = args.tlmFile
 	if args.output: mode += "o"
 	if args.print: mode += "p"
+	startTime = None if args.startTime is None else parseTime(args.startTime)
+	endTime = None if args.endTime is None else parseTime(args.endTime)
+	if (args.startTime and startTime is None) or (args.endTime and endTime is None):
+		parser.error("invalid time, expected e.g. 2017-05-20 13:00:00")
+	
+	cmds = None
+	if args.channel:
+		cmds = [EpsTlmData.cmdFromString(channel) for channel in args.channel]
+		if None in cmds:
+			parser.error("invalid channel in " + str(args.channel))
+	devices = None if not args.device else [EpsTlmData.DEVICE[device] for device in args.device]
 	
 	fr = EpsTlmFileReader(mode = mode)
+	fr.setSchema(args.schema)
 	if os.path.isdir(fileName):
 		isFolder = True
-		fr.setFolder(fileName)
+		if args.catalog or args.last is not None:
+			catalog = EpsTlmCatalog(fileName, fr.schema)
+			catalog.update()
+			if args.catalog:
+				print(catalog)
+				sys.exit(0)
+			if args.last is not None and catalog.getTimeRange() is not None:
+				endTime = catalog.getTimeRange()[1]
+				startTime = endTime - datetime.timedelta(hours = args.last)
+		fr.setFolder(fileName, startTime, endTime)
+	if cmds is not None or devices is not None or startTime is not None or endTime is not None:
+		fr.setFilter(EpsTlmFilter(cmds, devices, startTime, endTime))
+	if isFolder:
 		print("Parsing files", fr.fileList)
 		ret = fr.readFileList()
 	else:
@@ -632,5 +1864,9 @@ if __name__ == "__main__":
 	else:
 		print("Parsing failed")
 
+	if ret and args.tlm_output:
+		count = fr.writeTlmFile(args.tlm_output)
+		if count is not None: print("Wrote", count, "records to", args.tlm_output)
+
 	if args.sorted: print(fr)
 	
\ No newline at end of file
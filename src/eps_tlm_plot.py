@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+from eps_tlm_parser import *
+from eps_tlm_figure import drawSamples, drawSpectrum
+
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.figure import Figure
+
+from PyQt5.QtWidgets import QSizePolicy
+
+
+# ##############################
+# Matplotlib Canvas
+# ##############################
+
+class PlotCanvas(FigureCanvas):
+
+	def __init__(self, parent = None):
+		fig = Figure(facecolor = "None", edgecolor = "None")
+		FigureCanvas.__init__(self, fig)
+		FigureCanvas.setSizePolicy(self, QSizePolicy.Expanding, QSizePolicy.Expanding)
+		FigureCanvas.updateGeometry(self)
+
+		self.cmd = EpsTlmData.VALID_COMMANDS[0]		# some arbitrary init cmd
+		self.data = list()
+		self.spectrumSource = None
+		self.axes = self.figure.add_subplot(111)
+		self.axes.axis("off")
+		#self.axes.set_facecolor("None")
+
+	def setData(self, cmd, data):
+		if len(data) == 0:
+			return False
+		self.cmd = cmd
+		self.data = data
+		return True
+
+	def setSpectrumSource(self, eps):
+		# with a reader, the spectrum of the shown time range of its channel is plotted instead of the samples
+		self.spectrumSource = eps
+
+	def plot(self, leftIndex = None, rightIndex = None):
+		self.pltdata = list(zip(*(self.data[leftIndex:rightIndex])))
+		if len(self.pltdata) == 0:
+			return
+		if self.spectrumSource is not None:
+			return self.plotSpectrum(self.pltdata[0][0], self.pltdata[0][-1])
+
+		drawSamples(self.axes, self.cmd, self.pltdata[0], self.pltdata[1])
+		self.draw()
+
+	def plotSpectrum(self, startTime, endTime):
+		from eps_tlm_spectrum import getSpectrum
+		drawSpectrum(self.axes, self.cmd, getSpectrum(self.spectrumSource, self.cmd, startTime = startTime, endTime = endTime))
+		self.draw()
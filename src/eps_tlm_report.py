@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+from eps_tlm_parser import *
+from eps_tlm_figure import drawSamples, drawSpectrum
+
+import argparse
+import concurrent.futures
+import datetime
+import json
+import os
+import time
+
+import numpy
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+
+
+# ###############################
+# ########   Plot Report   ######
+# ###############################
+
+class EpsTlmReport:
+
+	FORMATS = ("png", "svg", "pdf")
+	POINTS = 4000				# samples drawn per plot at most, longer channels are decimated
+	FIGURE_SIZE = (10.0, 5.0)	# inches
+	DPI = 100
+
+	# ++++++++++++++++++++++++++
+
+	def readConfig(fileName):
+		# plot list of a JSON file, {"plots": [...]} or the list itself; a plot
+		# is a channel name or {"channel": name, "spectrum": true / false};
+		# None if the file cannot be read
+		try:
+			with open(fileName, "r") as f:
+				config = json.load(f)
+		except (IOError, ValueError) as error:
+			print("Error reading report configuration " + fileName + ": " + str(error))
+			return None
+		plots = config.get("plots", []) if isinstance(config, dict) else config
+		result = list()
+		for plot in plots:
+			if not isinstance(plot, dict): plot = {"channel": plot}
+			cmd = EpsTlmData.cmdFromString(str(plot.get("channel", "")))
+			if cmd is None:
+				print("Invalid channel " + str(plot.get("channel")) + " in report configuration " + fileName)
+				return None
+			result.append((cmd, bool(plot.get("spectrum", False))))
+		return result
+
+	# ++++++++++++++++++++++++++
+
+	def getJobs(eps, plots, outputFolder, format = "png", points = POINTS, startTime = None, endTime = None):
+		# one job per (cmd, spectrum) plot with data, carrying the decimated
+		# samples or the spectrum, so the rendering processes get only what they
+		# draw; file names are numbered in plot order
+		jobs = list()
+		for it, (cmd, spectrum) in enumerate(plots):
+			if len(eps.data.get(cmd, ())) == 0:
+				print("No data for channel " + EpsTlmData.cmdToString(cmd))
+				continue
+			t, v = eps.getArrays(cmd)
+			left = 0 if startTime is None else int(numpy.searchsorted(t, startTime.timestamp(), side = "left"))
+			right = len(t) if endTime is None else int(numpy.searchsorted(t, endTime.timestamp(), side = "right"))
+			if right <= left:
+				print("No data for channel " + EpsTlmData.cmdToString(cmd) + " in the time range")
+				continue
+			name = "{:02d}_".format(it) + EpsTlmData.cmdToString(cmd).replace(":", "_") + ("_spectrum" if spectrum else "")
+			title = EpsTlmData.cmdToString(cmd) + "   " + str(datetime.datetime.fromtimestamp(t[left])) + " - " + str(datetime.datetime.fromtimestamp(t[right - 1]))
+			if spectrum:
+				from eps_tlm_spectrum import getSpectrum
+				payload = getSpectrum(eps, cmd, startTime = startTime, endTime = endTime)
+			else:
+				payload = decimateArrays(t[left:right], v[left:right], points)
+			jobs.append((os.path.join(outputFolder, name + "." + format), format, cmd, title, spectrum, payload))
+		return jobs
+
+	def renderJob(job):
+		# draws one plot with the Agg backend and writes it; returns the file name
+		fileName, format, cmd, title, spectrum, payload = job
+		fig = Figure(figsize = EpsTlmReport.FIGURE_SIZE, dpi = EpsTlmReport.DPI)
+		FigureCanvasAgg(fig)
+		axes = fig.add_subplot(111)
+		if spectrum:
+			drawSpectrum(axes, cmd, payload)
+		else:
+			t, v = payload
+			drawSamples(axes, cmd, [datetime.datetime.fromtimestamp(stamp) for stamp in t.tolist()], v)
+		axes.set_title(title, fontsize = "medium")
+		fig.savefig(fileName, format = format)
+		return fileName
+
+	def render(jobs, workers = None):
+		# renders the jobs in parallel processes, in this process for a single
+		# worker; returns the written file names in job order
+		if workers is None: workers = os.cpu_count() or 1
+		workers = max(1, min(workers, len(jobs)))
+		if workers == 1:
+			return [EpsTlmReport.renderJob(job) for job in jobs]
+		with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+			return list(executor.map(EpsTlmReport.renderJob, jobs, chunksize = max(1, len(jobs) // (4 * workers))))
+
+
+
+# ###############################
+# ########     Main     #########
+# ###############################
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(prog = "EPS_TLM_Report", description = "Renders plots of EPS telemetry channels, derived ones included, into image files without a GUI")
+	parser.add_argument("tlmFile", help = "EPS telemetry *.tlm file or folder containing *.tlm files")
+	parser.add_argument("-c", "--channel", action = "append", help = "channel to plot, e.g. DER:BCR1:POWER (repeatable), all channels with data by default")
+	parser.add_argument("--config", help = "JSON file listing the plots, plotted ahead of the --channel ones")
+	parser.add_argument("-o", "--output", default = "report", help = "output folder, created if missing")
+	parser.add_argument("-f", "--format", default = EpsTlmReport.FORMATS[0], choices = EpsTlmReport.FORMATS, help = "image format")
+	parser.add_argument("--points", type = int, default = EpsTlmReport.POINTS, help = "samples drawn per plot at most")
+	parser.add_argument("-j", "--workers", type = int, help = "rendering processes, the CPU count by default")
+	parser.add_argument("--from", dest = "startTime", help = "start of the plotted range, e.g. 2017-05-20 13:00:00")
+	parser.add_argument("--to", dest = "endTime", help = "end of the plotted range")
+	parser.add_argument("--last", type = float, metavar = "HOURS", help = "plots the last HOURS hours of the telemetry of a folder")
+
+	args = parser.parse_args()
+	startTime = None if args.startTime is None else parseTime(args.startTime)
+	endTime = None if args.endTime is None else parseTime(args.endTime)
+	if (args.startTime and startTime is None) or (args.endTime and endTime is None):
+		parser.error("invalid time, expected e.g. 2017-05-20 13:00:00")
+	plots = list()
+	if args.config:
+		plots = EpsTlmReport.readConfig(args.config)
+		if plots is None:
+			sys.exit(1)
+	if args.channel:
+		cmds = [EpsTlmData.cmdFromString(channel) for channel in args.channel]
+		if None in cmds:
+			parser.error("invalid channel in " + str(args.channel))
+		plots += [(cmd, False) for cmd in cmds]
+
+	begin = time.perf_counter()
+	fr = EpsTlmFileReader()
+	if os.path.isdir(args.tlmFile):
+		if args.last is not None:
+			catalog = EpsTlmCatalog(args.tlmFile, fr.schema)
+			catalog.update()
+			if catalog.getTimeRange() is not None:
+				endTime = catalog.getTimeRange()[1]
+				startTime = endTime - datetime.timedelta(hours = args.last)
+		fr.setFolder(args.tlmFile, startTime, endTime)
+	else:
+		fr.setFile([args.tlmFile])
+	if startTime is not None or endTime is not None:
+		fr.setFilter(EpsTlmFilter(None, None, startTime, endTime))
+	if not fr.readFileList():
+		print("Parsing failed")
+		sys.exit(1)
+	fr.sortAllData()
+	fr.calculateDerivedChannels()
+	if not plots:
+		plots = [(cmd, False) for cmd in EpsTlmData.VALID_COMMANDS if cmd[0] != EpsTlmData.DEVICE.TMP and len(fr.data[cmd]) > 0]
+
+	os.makedirs(args.output, exist_ok = True)
+	jobs = EpsTlmReport.getJobs(fr, plots, args.output, args.format, args.points, startTime, endTime)
+	fileNames = EpsTlmReport.render(jobs, args.workers)
+	print("Rendered", len(fileNames), "plots into", args.output, "in {:.2f} s".format(time.perf_counter() - begin))
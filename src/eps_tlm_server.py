@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+
+from eps_tlm_parser import *
+
+import argparse
+import collections
+import http.server
+import threading
+import urllib.parse
+
+import numpy
+
+
+
+# ###############################
+# ######   Query Service   ######
+# ###############################
+
+class EpsTlmQueryError(Exception):
+
+	def __init__(self, status, message):
+		Exception.__init__(self, message)
+		self.status = status
+
+# ++++++++++++++++++++++++++
+
+class EpsTlmQueryService:
+
+	# answers queries on the last published snapshot of eps, so it may be
+	# read from any number of request threads while eps is still written;
+	# responses are cached per query and snapshot version
+
+	CACHE_SIZE = 256
+	DEFAULT_POINTS = 2000
+	MINIMUM_INTERVAL = 0.001	# seconds, shorter aggregation intervals overflow the bucket numbers
+
+	class FORMAT:
+		JSON = "json"
+		BINARY = "binary"		# little endian float64 rows, columns as in the X-Columns header
+
+	# ++++++++++++++++++++++++++
+
+	def __init__(self, eps, cacheSize = CACHE_SIZE):
+		self.eps = eps
+		self.cacheSize = cacheSize
+		self.cache = collections.OrderedDict()
+		self.lock = threading.Lock()
+		self.arrays = dict()
+		self.hits = 0
+		self.misses = 0
+
+	# ++++++++++++++++++++++++++
+
+	def query(self, path, params):
+		# returns (version, content type, columns, body), columns being None
+		# for JSON; raises EpsTlmQueryError for unknown paths and invalid parameters
+		snapshot = self.eps.getSnapshot()
+		key = (path, tuple(sorted(params.items())))
+		with self.lock:
+			cached = self.cache.get(key)
+			if cached is not None and cached[0] == snapshot.version:
+				self.cache.move_to_end(key)
+				self.hits += 1
+				return cached
+			self.misses += 1
+
+		handler = {
+			"/channels": self.getChannels,
+			"/data": self.getData,
+			"/decimated": self.getDecimatedData,
+			"/aggregate": self.getAggregate
+		}.get(path)
+		if handler is None:
+			raise EpsTlmQueryError(404, "Unknown query " + path)
+		format = params.get("format", EpsTlmQueryService.FORMAT.JSON)
+		if format not in (EpsTlmQueryService.FORMAT.JSON, EpsTlmQueryService.FORMAT.BINARY):
+			raise EpsTlmQueryError(400, "Unknown format " + format)
+
+		result = handler(snapshot, params)
+		if format == EpsTlmQueryService.FORMAT.BINARY and "columns" in result:
+			columns = list(result["columns"])
+			body = numpy.column_stack([numpy.asarray(result[column], dtype = "<f8") for column in columns]).tobytes() if columns else b""
+			response = (snapshot.version, "application/octet-stream", columns, body)
+		else:
+			result["version"] = snapshot.version
+			response = (snapshot.version, "application/json", None, json.dumps(result, default = EpsTlmQueryService.toJson, allow_nan = False).encode())
+
+		with self.lock:
+			self.cache[key] = response
+			self.cache.move_to_end(key)
+			while len(self.cache) > self.cacheSize:
+				self.cache.popitem(last = False)
+		return response
+
+	def toJson(value):
+		# arrays as lists, NaN and infinite values as null, which JSON has no number for
+		if isinstance(value, numpy.ndarray):
+			if value.dtype.kind == "f" and not numpy.all(numpy.isfinite(value)):
+				return numpy.where(numpy.isfinite(value), value, None).tolist()
+			return value.tolist()
+		raise TypeError(str(type(value)) + " is not JSON serializable")
+
+	# ++++++++++++++++++++++++++
+
+	def getArrays(self, snapshot, cmd):
+		# float64 POSIX times and values of the published part of a channel,
+		# cached until the channel is replaced or published with more samples
+		dataList, length = snapshot.channels[cmd]
+		cached = self.arrays.get(cmd)
+		if cached is not None and cached[0] is dataList and cached[1] == length:
+			return cached[2]
+		arrays = (numpy.array([item[0].timestamp() for item in dataList[:length]], dtype = numpy.float64),
+			numpy.array([item[1] for item in dataList[:length]], dtype = numpy.float64))
+		self.arrays[cmd] = (dataList, length, arrays)
+		return arrays
+
+	def getWindow(self, snapshot, params):
+		# (cmd, times, values) of the channel and time window given by the parameters
+		if "channel" not in params:
+			raise EpsTlmQueryError(400, "Missing parameter channel")
+		cmd = EpsTlmData.cmdFromString(params["channel"])
+		if cmd is None or cmd not in snapshot.channels:
+			raise EpsTlmQueryError(404, "Unknown channel " + params["channel"])
+		bounds = list()
+		for name in ("from", "to"):
+			time = None
+			if name in params:
+				time = parseTime(params[name])
+				if time is None:
+					raise EpsTlmQueryError(400, "Invalid time " + params[name] + ", expected e.g. 2017-05-20 13:00:00")
+			bounds.append(time)
+		t, v = self.getArrays(snapshot, cmd)
+		left = 0 if bounds[0] is None else int(numpy.searchsorted(t, bounds[0].timestamp(), side = "left"))
+		right = len(t) if bounds[1] is None else int(numpy.searchsorted(t, bounds[1].timestamp(), side = "right"))
+		return (cmd, t[left:max(left, right)], v[left:max(left, right)])
+
+	def getNumber(params, name, default, type = float):
+		if name not in params: return default
+		try:
+			value = type(params[name])
+		except ValueError:
+			raise EpsTlmQueryError(400, "Invalid number " + params[name])
+		if not math.isfinite(value):
+			raise EpsTlmQueryError(400, "Invalid number " + params[name])
+		if value <= 0:
+			raise EpsTlmQueryError(400, "Parameter " + name + " has to be positive")
+		return value
+
+	# ++++++++++++++++++++++++++
+
+	def getChannels(self, snapshot, params):
+		channels = list()
+		for cmd in EpsTlmData.VALID_COMMANDS:
+			length = snapshot.getLength(cmd)
+			if length == 0: continue
+			start, end = snapshot.getTimeRange(cmd)
+			channels.append({
+				"channel": EpsTlmData.cmdToString(cmd),
+				"unit": EpsTlmData.TYPE.physicalUnit(cmd[2]),
+				"count": length,
+				"start": start.timestamp(),
+				"end": end.timestamp()
+			})
+		return {"channels": channels}
+
+	def getData(self, snapshot, params):
+		cmd, t, v = self.getWindow(snapshot, params)
+		return {"channel": EpsTlmData.cmdToString(cmd), "unit": EpsTlmData.TYPE.physicalUnit(cmd[2]),
+			"columns": ["time", "value"], "time": t, "value": v}
+
+	def getDecimatedData(self, snapshot, params):
+		# windows with more samples than points are reduced as by decimateArrays
+		cmd, t, v = self.getWindow(snapshot, params)
+		points = EpsTlmQueryService.getNumber(params, "points", EpsTlmQueryService.DEFAULT_POINTS, int)
+		decimated = len(t) > points
+		t, v = decimateArrays(t, v, points)
+		return {"channel": EpsTlmData.cmdToString(cmd), "unit": EpsTlmData.TYPE.physicalUnit(cmd[2]), "decimated": decimated,
+			"columns": ["time", "value"], "time": t, "value": v}
+
+	def getAggregate(self, snapshot, params):
+		# count, min, max and mean per interval, intervals being aligned to
+		# multiples of interval seconds since the epoch; without an interval
+		# one aggregate of the whole window, stamped with its first sample
+		cmd, t, v = self.getWindow(snapshot, params)
+		interval = EpsTlmQueryService.getNumber(params, "interval", None)
+		if interval is not None and interval < EpsTlmQueryService.MINIMUM_INTERVAL:
+			raise EpsTlmQueryError(400, "Parameter interval has to be at least " + str(EpsTlmQueryService.MINIMUM_INTERVAL))
+		result = {"channel": EpsTlmData.cmdToString(cmd), "unit": EpsTlmData.TYPE.physicalUnit(cmd[2]), "interval": interval,
+			"columns": ["time", "count", "min", "max", "mean"]}
+		if len(t) == 0:
+			for column in result["columns"]: result[column] = numpy.zeros(0)
+			return result
+		buckets = numpy.zeros(len(t), dtype = numpy.int64) if interval is None else numpy.floor(t / interval).astype(numpy.int64)
+		starts = numpy.flatnonzero(numpy.concatenate(([True], buckets[1:] != buckets[:-1])))
+		count = numpy.diff(numpy.concatenate((starts, [len(t)])))
+		result["time"] = t[starts[:1]] if interval is None else buckets[starts] * interval
+		result["count"] = count
+		result["min"] = numpy.minimum.reduceat(v, starts)
+		result["max"] = numpy.maximum.reduceat(v, starts)
+		result["mean"] = numpy.add.reduceat(v, starts) / count
+		return result
+
+
+
+# ###############################
+# #######   HTTP Server   #######
+# ###############################
+
+class EpsTlmRequestHandler(http.server.BaseHTTPRequestHandler):
+
+	# HTTP/1.1 keeps connections alive, every response carries its length
+	protocol_version = "HTTP/1.1"
+
+	def do_GET(self):
+		url = urllib.parse.urlsplit(self.path)
+		params = dict(urllib.parse.parse_qsl(url.query))
+		try:
+			version, contentType, columns, body = self.server.service.query(url.path, params)
+		except EpsTlmQueryError as error:
+			self.sendBody(error.status, "application/json", json.dumps({"error": str(error)}).encode())
+			return
+		etag = "\"{}-{:08x}\"".format(version, zlib.crc32(self.path.encode()))
+		if self.headers.get("If-None-Match") == etag:
+			self.sendBody(304, None, b"", {"ETag": etag})
+			return
+		headers = {"ETag": etag, "X-Snapshot-Version": str(version)}
+		if columns is not None: headers["X-Columns"] = ",".join(columns)
+		self.sendBody(200, contentType, body, headers)
+
+	def sendBody(self, status, contentType, body, headers = None):
+		self.send_response(status)
+		if contentType is not None: self.send_header("Content-Type", contentType)
+		self.send_header("Content-Length", str(len(body)))
+		for name, value in (headers or dict()).items():
+			self.send_header(name, value)
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format, *args):
+		if self.server.verbose:
+			http.server.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+# ++++++++++++++++++++++++++
+
+def startServer(eps, host = "127.0.0.1", port = 0, verbose = False):
+	# returns the server, serving eps in a background thread; the bound port
+	# is server.server_address[1], server.shutdown() stops it
+	server = http.server.ThreadingHTTPServer((host, port), EpsTlmRequestHandler)
+	server.daemon_threads = True
+	server.service = EpsTlmQueryService(eps)
+	server.verbose = verbose
+	thread = threading.Thread(target = server.serve_forever, daemon = True)
+	thread.start()
+	return server
+
+
+
+# ###############################
+# ########     Main     #########
+# ###############################
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(prog = "EPS_TLM_Server", description = "Serves EPS telemetry over HTTP on the local host, parsed once and queried many times")
+	parser.add_argument("tlmFile", nargs = "+", help = "EPS telemetry *.tlm file or folder containing *.tlm files")
+	parser.add_argument("--host", default = "127.0.0.1", help = "address to listen on")
+	parser.add_argument("-p", "--port", type = int, default = 8086, help = "port to listen on, 0 for any free port")
+	parser.add_argument("--from", dest = "startTime", help = "only loads records from this time on, e.g. 2017-05-20 13:00:00")
+	parser.add_argument("--to", dest = "endTime", help = "only loads records up to this time")
+	parser.add_argument("--channel", action = "append", help = "only loads this channel, e.g. EPS:BCR1:VOLTAGE (repeatable)")
+	parser.add_argument("-v", "--verbose", help = "logs every request", action = "store_true")
+
+	args = parser.parse_args()
+	startTime = None if args.startTime is None else parseTime(args.startTime)
+	endTime = None if args.endTime is None else parseTime(args.endTime)
+	if (args.startTime and startTime is None) or (args.endTime and endTime is None):
+		parser.error("invalid time, expected e.g. 2017-05-20 13:00:00")
+	cmds = None
+	if args.channel:
+		cmds = [EpsTlmData.cmdFromString(channel) for channel in args.channel]
+		if None in cmds:
+			parser.error("invalid channel in " + str(args.channel))
+
+	fr = EpsTlmFileReader()
+	fileList = list()
+	for fileName in args.tlmFile:
+		if fr.setFolder(fileName, startTime, endTime):
+			fileList += fr.fileList
+		elif os.path.isfile(fileName):
+			fileList.append(fileName)
+		else:
+			print("Specified telemetry file " + fileName + " does not exist")
+	if cmds is not None or startTime is not None or endTime is not None:
+		fr.setFilter(EpsTlmFilter(cmds, None, startTime, endTime))
+	fr.setFile(uniqueFileList(fileList))
+	fr.readFileList()
+	fr.sortAllData()
+
+	server = startServer(fr, args.host, args.port, args.verbose)
+	print("Serving", sum(fr.getSnapshot().getLength(cmd) for cmd in fr.data), "samples on http://{}:{}/".format(*server.server_address[:2]))
+	print("Queries: /channels, /data, /decimated, /aggregate ? channel, from, to, points, interval, format = json | binary")
+	try:
+		threading.Event().wait()
+	except KeyboardInterrupt:
+		server.shutdown()
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+
+from eps_tlm_parser import *
+from eps_tlm_align import EpsTlmAlignedTable
+
+import argparse
+import collections
+import datetime
+import os
+
+import numpy
+
+
+
+# ###############################
+# ########   Spectrum   #########
+# ###############################
+
+class EpsTlmSpectrum:
+
+	class METHOD:
+		FFT = "fft"					# linearly resampled onto the grid, Hann window, power spectral density
+		LOMBSCARGLE = "lombscargle"	# samples binned onto the grid, gaps left out, normalized power (0..1)
+
+	GAP_FACTOR = 4				# grid times further than this many sample intervals from the samples are gaps
+	OVERSAMPLING = 4			# frequency grid density relative to the window length
+	MINIMUM_COVERAGE = 0.25		# fraction of a window with samples below which its spectrum is NaN
+	MINIMUM_SAMPLES = 8
+	MAXIMUM_GRID = 1 << 22		# grid points, the cadence is coarsened beyond
+	MAXIMUM_POINTS = 1 << 23	# transform points held at once
+
+	# ++++++++++++++++++++++++++
+
+	def __init__(self, eps, cmd, method = METHOD.FFT, cadence = None, minPeriod = None, maxPeriod = None, window = None, step = None, startTime = None, endTime = None):
+		# spectra of a channel on a uniform grid of the given cadence in seconds,
+		# the median sample interval by default; without a window one spectrum of
+		# the whole range, otherwise one per window of that many seconds every
+		# step seconds (the window by default). periods from minPeriod to
+		# maxPeriod seconds, two grid intervals to half the window by default.
+		# self.power holds one row per window and one column per frequency
+		self.cmd = cmd
+		self.method = method
+		minimumTime = EpsTlmCatalog.MINIMUM_TIME.timestamp()
+		t, v = (numpy.zeros(0), numpy.zeros(0)) if len(eps.data.get(cmd, ())) == 0 else eps.getArrays(cmd)
+		left = int(numpy.searchsorted(t, minimumTime if startTime is None else max(minimumTime, startTime.timestamp()), side = "left"))
+		right = len(t) if endTime is None else int(numpy.searchsorted(t, endTime.timestamp(), side = "right"))
+		t = t[left:max(left, right)]
+		v = v[left:max(left, right)]
+
+		intervals = numpy.diff(t)
+		intervals = intervals[intervals > 0]
+		spacing = float(numpy.median(intervals)) if len(intervals) else 1.0
+		span = float(t[-1] - t[0]) if len(t) > 1 else 0.0
+		if cadence is None: cadence = max(1.0, spacing)
+		self.cadence = max(cadence, span / EpsTlmSpectrum.MAXIMUM_GRID)
+		self.start = float(t[0]) if len(t) else 0.0
+		values, mask = EpsTlmSpectrum.toGrid(t, v, self.start, self.cadence, method, EpsTlmSpectrum.GAP_FACTOR * max(self.cadence, spacing))
+
+		length = len(values) if window is None else max(2, int(round(window / self.cadence)))
+		stride = length if step is None else max(1, int(round(step / self.cadence)))
+		self.window = length * self.cadence
+		if len(values) < length or len(values) < 2:
+			rows = numpy.zeros(0, dtype = numpy.int64)
+		else:
+			rows = numpy.arange(0, len(values) - length + 1, stride)
+		self.times = self.start + (rows + 0.5 * (length - 1)) * self.cadence
+
+		if minPeriod is None: minPeriod = 2.0 * self.cadence
+		if maxPeriod is None: maxPeriod = 0.5 * self.window
+		self.frequencies, self.power = EpsTlmSpectrum.computePower(values, mask, rows, length, self.cadence, method,
+			1.0 / maxPeriod if maxPeriod > 0 else 0.0, 1.0 / minPeriod if minPeriod > 0 else math.inf)
+
+	# ++++++++++++++++++++++++++
+
+	def toGrid(t, v, start, cadence, method = METHOD.FFT, tolerance = None):
+		# (values, mask) on the grid start + k * cadence over the samples; the
+		# mask marks the grid times with a value
+		count = int(math.floor((t[-1] - start) / cadence)) + 1 if len(t) else 0
+		if method == EpsTlmSpectrum.METHOD.FFT:
+			values = EpsTlmAlignedTable.align(t, v, start + cadence * numpy.arange(count), EpsTlmAlignedTable.METHOD.LINEAR, tolerance)
+			mask = ~numpy.isnan(values)
+		elif method == EpsTlmSpectrum.METHOD.LOMBSCARGLE:
+			# mean of the samples closest to each grid time
+			index = numpy.clip(numpy.floor((t - start) / cadence + 0.5).astype(numpy.int64), 0, max(0, count - 1))
+			counts = numpy.bincount(index, minlength = count)
+			mask = counts > 0
+			values = numpy.divide(numpy.bincount(index, v, minlength = count), counts, out = numpy.full(count, numpy.nan), where = mask)
+		else:
+			raise ValueError("Unknown spectrum method " + str(method))
+		return (values, mask)
+
+	def computePower(values, mask, rows, length, cadence, method, minFrequency, maxFrequency):
+		# (frequencies, power) of the windows starting at the grid indices rows,
+		# vectorized over the windows in chunks of MAXIMUM_POINTS
+		if len(rows) == 0:
+			return (numpy.zeros(0), numpy.zeros((0, 0)))
+		points = max(length, min(EpsTlmSpectrum.OVERSAMPLING * length, EpsTlmSpectrum.MAXIMUM_POINTS))
+		frequencies = numpy.fft.rfftfreq(points, cadence)
+		band = (frequencies > 0) & (frequencies >= minFrequency) & (frequencies <= maxFrequency)
+		power = numpy.full((len(rows), int(numpy.count_nonzero(band))), numpy.nan)
+		if not numpy.any(band):
+			return (frequencies[band], power)
+
+		windowValues = numpy.lib.stride_tricks.sliding_window_view(values, length)
+		windowMask = numpy.lib.stride_tricks.sliding_window_view(mask, length)
+		chunk = max(1, EpsTlmSpectrum.MAXIMUM_POINTS // points)
+		for first in range(0, len(rows), chunk):
+			selected = rows[first:first + chunk]
+			m = windowMask[selected]
+			n = m.sum(axis = 1)
+			mean = numpy.divide(numpy.where(m, windowValues[selected], 0.0).sum(axis = 1), n, out = numpy.zeros(len(n)), where = n > 0)
+			y = numpy.where(m, windowValues[selected] - mean[:, None], 0.0)
+			if method == EpsTlmSpectrum.METHOD.FFT:
+				taper = numpy.hanning(length)
+				spectrum = numpy.fft.rfft(y * taper, points, axis = 1)
+				chunkPower = 2.0 * cadence * numpy.abs(spectrum) ** 2 / numpy.sum(taper ** 2)
+			else:
+				chunkPower = EpsTlmSpectrum.lombScargle(y, m, n, points)
+			valid = (n >= max(EpsTlmSpectrum.MINIMUM_SAMPLES, EpsTlmSpectrum.MINIMUM_COVERAGE * length))
+			power[first:first + chunk] = numpy.where(valid[:, None], chunkPower[:, band], numpy.nan)
+		return (frequencies[band], power)
+
+	def lombScargle(y, mask, n, points):
+		# Lomb-Scargle periodogram of mean free values y at the grid times of
+		# mask on the frequencies of rfftfreq(points); the trigonometric sums
+		# over the irregular times are discrete Fourier transforms of y and of
+		# mask, the double frequency sums those of mask at twice the index
+		spectrum = numpy.fft.rfft(y, points, axis = 1)
+		weights = numpy.fft.fft(mask.astype(numpy.float64), points, axis = 1)
+		double = weights[:, (2 * numpy.arange(spectrum.shape[1])) % points]
+		yc = spectrum.real
+		ys = -spectrum.imag
+		c2 = double.real
+		s2 = -double.imag
+		h = numpy.hypot(c2, s2)
+		cos2 = numpy.divide(c2, h, out = numpy.ones(h.shape), where = h > 0)
+		cosTau = numpy.sqrt(numpy.clip(0.5 * (1.0 + cos2), 0.0, 1.0))
+		sinTau = numpy.where(s2 < 0, -1.0, 1.0) * numpy.sqrt(numpy.clip(0.5 * (1.0 - cos2), 0.0, 1.0))
+		cc = 0.5 * (n[:, None] + h)
+		ss = 0.5 * (n[:, None] - h)
+		small = 1e-9 * numpy.maximum(n[:, None], 1)
+		power = numpy.divide((yc * cosTau + ys * sinTau) ** 2, cc, out = numpy.zeros(h.shape), where = cc > small)
+		power += numpy.divide((ys * cosTau - yc * sinTau) ** 2, ss, out = numpy.zeros(h.shape), where = ss > small)
+		variance = numpy.sum(y ** 2, axis = 1)
+		return numpy.divide(power, variance[:, None], out = numpy.zeros(h.shape), where = variance[:, None] > 0)
+
+	# ++++++++++++++++++++++++++
+
+	def __len__(self):
+		return len(self.times)
+
+	def getPeriods(self):
+		return 1.0 / self.frequencies
+
+	def getDateTimes(self):
+		return [datetime.datetime.fromtimestamp(time) for time in self.times]
+
+	def getUnit(self):
+		if self.method == EpsTlmSpectrum.METHOD.LOMBSCARGLE:
+			return "normalized"
+		return EpsTlmData.TYPE.physicalUnit(self.cmd[2]) + "^2/Hz"
+
+	# ++++++++++++++++++++++++++
+
+	def refine(self, row, index):
+		# (period, power) of the peaks at the column indices of the rows, the
+		# frequency refined by a parabola through the neighbouring bins
+		power = self.power[row, index]
+		lower = self.power[row, numpy.maximum(index - 1, 0)]
+		upper = self.power[row, numpy.minimum(index + 1, self.power.shape[1] - 1)]
+		curvature = lower - 2.0 * power + upper
+		inner = (index > 0) & (index < self.power.shape[1] - 1) & (curvature < 0)
+		offset = numpy.divide(0.5 * (lower - upper), curvature, out = numpy.zeros(numpy.shape(power)), where = inner)
+		spacing = self.frequencies[1] - self.frequencies[0] if len(self.frequencies) > 1 else 0.0
+		return (1.0 / (self.frequencies[index] + offset * spacing), power - 0.25 * (lower - upper) * offset)
+
+	def getDominantPeriods(self, count = 3, row = 0):
+		# up to count (period, power) of the strongest spectral peaks of a window
+		if row >= len(self) or self.power.shape[1] < 3:
+			return list()
+		power = numpy.nan_to_num(self.power[row], nan = -numpy.inf)
+		peaks = numpy.flatnonzero((power[1:-1] > power[:-2]) & (power[1:-1] >= power[2:]) & numpy.isfinite(power[1:-1])) + 1
+		peaks = peaks[numpy.argsort(-power[peaks], kind = "stable")[:count]]
+		periods, powers = self.refine(numpy.full(len(peaks), row), peaks)
+		return list(zip(periods.tolist(), powers.tolist()))
+
+	def getDominantPeriodSeries(self):
+		# (times, periods, powers) of the strongest frequency of every window,
+		# NaN for windows without a spectrum
+		valid = numpy.any(numpy.isfinite(self.power), axis = 1) if self.power.shape[1] else numpy.zeros(len(self), dtype = bool)
+		periods = numpy.full(len(self), numpy.nan)
+		powers = numpy.full(len(self), numpy.nan)
+		if numpy.any(valid):
+			rows = numpy.flatnonzero(valid)
+			index = numpy.argmax(numpy.nan_to_num(self.power[rows], nan = -numpy.inf), axis = 1)
+			periods[rows], powers[rows] = self.refine(rows, index)
+		return (self.times, periods, powers)
+
+	# ++++++++++++++++++++++++++
+
+	def writeBinary(self, fileName):
+		# NumPy archive of the window times, the frequencies and the power matrix
+		numpy.savez(fileName, times = self.times, frequencies = self.frequencies, power = self.power,
+			channel = numpy.array(EpsTlmData.cmdToString(self.cmd)), method = numpy.array(self.method))
+
+# ++++++++++++++++++++++++++
+
+SPECTRUM_CACHE_SIZE = 16
+
+def getSpectrum(eps, cmd, method = EpsTlmSpectrum.METHOD.FFT, cadence = None, minPeriod = None, maxPeriod = None, window = None, step = None, startTime = None, endTime = None):
+	# the spectrum is cached on eps per channel, method and window, and
+	# recomputed once the data list of the channel is replaced or grows; the
+	# least recently used of more than SPECTRUM_CACHE_SIZE spectra are dropped
+	data = eps.data.get(cmd)
+	signature = (data, len(data) if data is not None else 0)
+	key = (cmd, method, cadence, minPeriod, maxPeriod, window, step, startTime, endTime)
+	cache = getattr(eps, "spectrumCache", None)
+	if cache is None:
+		cache = eps.spectrumCache = collections.OrderedDict()
+	cached = cache.get(key)
+	if cached is None or cached[0][0] is not signature[0] or cached[0][1] != signature[1]:
+		cached = cache[key] = (signature, EpsTlmSpectrum(eps, cmd, method, cadence, minPeriod, maxPeriod, window, step, startTime, endTime))
+	cache.move_to_end(key)
+	while len(cache) > SPECTRUM_CACHE_SIZE:
+		cache.popitem(last = False)
+	return cached[1]
+
+def formatPeriod(seconds):
+	if seconds != seconds:
+		return "-"
+	if seconds >= 3600:
+		return "{:.3f} h".format(seconds / 3600.0)
+	if seconds >= 60:
+		return "{:.2f} min".format(seconds / 60.0)
+	return "{:.1f} s".format(seconds)
+
+
+
+# ###############################
+# ########     Main     #########
+# ###############################
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(prog = "EPS_TLM_Spectrum", description = "Computes spectra and dominant periods of EPS telemetry channels")
+	parser.add_argument("tlmFile", help = "EPS telemetry *.tlm file or folder containing *.tlm files")
+	parser.add_argument("-c", "--channel", action = "append", required = True, help = "channel to analyse, e.g. EPS:BCR1:CURRENT (repeatable)")
+	parser.add_argument("-m", "--method", default = EpsTlmSpectrum.METHOD.FFT,
+		choices = [EpsTlmSpectrum.METHOD.FFT, EpsTlmSpectrum.METHOD.LOMBSCARGLE], help = "resampled FFT or Lomb-Scargle periodogram")
+	parser.add_argument("--cadence", type = float, metavar = "SECONDS", help = "grid cadence, the median sample interval by default")
+	parser.add_argument("--min-period", type = float, metavar = "SECONDS", help = "shortest period, two grid intervals by default")
+	parser.add_argument("--max-period", type = float, metavar = "SECONDS", help = "longest period, half the window by default")
+	parser.add_argument("-w", "--window", type = float, metavar = "SECONDS", help = "rolling window length, the whole time range by default")
+	parser.add_argument("-s", "--step", type = float, metavar = "SECONDS", help = "rolling window step, the window length by default")
+	parser.add_argument("--from", dest = "startTime", help = "start of the analysed range, e.g. 2017-05-20 13:00:00")
+	parser.add_argument("--to", dest = "endTime", help = "end of the analysed range")
+	parser.add_argument("-n", "--top", type = int, default = 3, help = "number of dominant periods listed")
+	parser.add_argument("-o", "--output", help = "NumPy archive *.npz of the spectra, one per channel with the channel name appended")
+
+	args = parser.parse_args()
+	startTime = None if args.startTime is None else parseTime(args.startTime)
+	endTime = None if args.endTime is None else parseTime(args.endTime)
+	if (args.startTime and startTime is None) or (args.endTime and endTime is None):
+		parser.error("invalid time, expected e.g. 2017-05-20 13:00:00")
+	cmds = [EpsTlmData.cmdFromString(channel) for channel in args.channel]
+	if None in cmds:
+		parser.error("invalid channel in " + str(args.channel))
+
+	fr = EpsTlmFileReader()
+	fr.setFilter(EpsTlmFilter(cmds))
+	if os.path.isdir(args.tlmFile):
+		fr.setFolder(args.tlmFile, startTime, endTime)
+	else:
+		fr.setFile([args.tlmFile])
+	fr.readFileList()
+	fr.sortAllData()
+
+	for cmd in cmds:
+		spectrum = getSpectrum(fr, cmd, args.method, args.cadence, args.min_period, args.max_period, args.window, args.step, startTime, endTime)
+		name = EpsTlmData.cmdToString(cmd)
+		print(name + ":", len(spectrum), "window(s) of", formatPeriod(spectrum.window) + ",", "cadence", formatPeriod(spectrum.cadence) + ",", len(spectrum.frequencies), "frequencies")
+		if len(spectrum) == 1:
+			for period, power in spectrum.getDominantPeriods(args.top):
+				print("\t" + formatPeriod(period), "\t{:.6g}".format(power), spectrum.getUnit())
+		else:
+			times, periods, powers = spectrum.getDominantPeriodSeries()
+			for time, period, power in zip(spectrum.getDateTimes(), periods.tolist(), powers.tolist()):
+				print("\t" + str(time), "\t" + formatPeriod(period), "\t{:.6g}".format(power))
+		if args.output:
+			fileName = args.output if len(cmds) == 1 else os.path.splitext(args.output)[0] + "_" + name.replace(":", "_") + ".npz"
+			spectrum.writeBinary(fileName)
+			print("Output file", fileName)
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+
+from eps_tlm_parser import *
+
+import argparse
+import concurrent.futures
+import datetime
+import json
+import math
+import os
+
+
+
+# ###############################
+# ######   Channel Statistics   #
+# ###############################
+
+class EpsTlmChannelStatistics:
+
+	# running count, time span, min/max and Welford mean/variance of one
+	# channel; gaps are counted between consecutive samples from a set clock,
+	# samples before EpsTlmCatalog.MINIMUM_TIME count for the values only
+
+	def __init__(self, gapThreshold = 60.0):
+		self.gapThreshold = datetime.timedelta(seconds = gapThreshold)
+		self.count = 0
+		self.mean = 0.0
+		self.m2 = 0.0
+		self.min = math.inf
+		self.max = -math.inf
+		self.startTime = None
+		self.endTime = None
+		self.firstTime = None		# first and last sample with a set clock, in order
+		self.lastTime = None
+		self.gapCount = 0
+
+	# ++++++++++++++++++++++++++
+
+	def add(self, time, value):
+		if time >= EpsTlmCatalog.MINIMUM_TIME:
+			if self.lastTime is None:
+				self.firstTime = self.startTime = self.endTime = time
+			else:
+				if time - self.lastTime > self.gapThreshold:
+					self.gapCount += 1
+				if time < self.startTime: self.startTime = time
+				if time > self.endTime: self.endTime = time
+			self.lastTime = time
+
+		self.count += 1
+		delta = value - self.mean
+		self.mean += delta / self.count
+		self.m2 += delta * (value - self.mean)
+		if value < self.min: self.min = value
+		if value > self.max: self.max = value
+
+	# ++++++++++++++++++++++++++
+
+	def merge(self, other):
+		# other has to follow self in time, e.g. the statistics of the next file
+		if other.count == 0: return self
+		if self.count == 0:
+			self.__dict__.update(other.__dict__)
+			return self
+
+		if other.lastTime is not None:
+			if self.lastTime is None:
+				self.firstTime, self.startTime, self.endTime = other.firstTime, other.startTime, other.endTime
+			else:
+				if other.firstTime - self.lastTime > self.gapThreshold:
+					self.gapCount += 1
+				self.startTime = min(self.startTime, other.startTime)
+				self.endTime = max(self.endTime, other.endTime)
+			self.lastTime = other.lastTime
+		self.gapCount += other.gapCount
+
+		count = self.count + other.count
+		delta = other.mean - self.mean
+		self.mean += delta * other.count / count
+		self.m2 += other.m2 + delta * delta * self.count * other.count / count
+		self.count = count
+		self.min = min(self.min, other.min)
+		self.max = max(self.max, other.max)
+		return self
+
+	# ++++++++++++++++++++++++++
+
+	def stddev(self):
+		return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+	def toDict(self):
+		# NaN and infinite values as None, which JSON has no number for
+		def finite(value):
+			return value if self.count and math.isfinite(value) else None
+		return {
+			"count": self.count,
+			"start": str(self.startTime) if self.startTime is not None else None,
+			"end": str(self.endTime) if self.endTime is not None else None,
+			"min": finite(self.min),
+			"max": finite(self.max),
+			"mean": finite(self.mean),
+			"stddev": finite(self.stddev()),
+			"gaps": self.gapCount
+		}
+
+# ++++++++++++++++++++++++++
+
+class EpsTlmStatistics:
+
+	def __init__(self, gapThreshold = 60.0):
+		self.gapThreshold = gapThreshold
+		self.channels = dict()
+
+	# ++++++++++++++++++++++++++
+
+	def channel(self, cmd):
+		if cmd not in self.channels:
+			self.channels[cmd] = EpsTlmChannelStatistics(self.gapThreshold)
+		return self.channels[cmd]
+
+	def addBatch(self, batch):
+		# batch of raw (device, source, type, time, value) tuples as yielded by EpsTlmFileReader.iterRecordBatches
+		channels = dict()
+		for device, source, type, time, value in batch:
+			key = (device, source, type)
+			channel = channels.get(key)
+			if channel is None:
+				channel = channels[key] = self.channel((EpsTlmData.DEVICE(device), EpsTlmData.SOURCE(source), EpsTlmData.TYPE(type)))
+			channel.add(time, value)
+
+	def addTlmData(self, eps):
+		for cmd in EpsTlmData.VALID_COMMANDS:
+			if eps.commandIsValid(cmd):
+				for time, value in eps.data[cmd]:
+					self.channel(cmd).add(time, value)
+
+	def merge(self, other):
+		for cmd, channel in other.channels.items():
+			self.channel(cmd).merge(channel)
+		return self
+
+	# ++++++++++++++++++++++++++
+
+	def readFile(fileName, gapThreshold = 60.0, cmds = None, version = None):
+		stats = EpsTlmStatistics(gapThreshold)
+		fr = EpsTlmFileReader()
+		fr.setSchema(version)
+		for batch in fr.iterRecordBatches([fileName], cmds = cmds):
+			stats.addBatch(batch)
+		if fr.corruptFiles:
+			# the batches read before the file turned out to be corrupt do not count
+			stats = EpsTlmStatistics(gapThreshold)
+		return (stats, fr.corruptFiles)
+
+	def readFileList(fileList, gapThreshold = 60.0, cmds = None, version = None, jobs = None):
+		# files are processed in parallel and merged in the order of their first sample
+		results = list()
+		with concurrent.futures.ProcessPoolExecutor(max_workers = jobs) as executor:
+			futures = [executor.submit(EpsTlmStatistics.readFile, file, gapThreshold, cmds, version) for file in fileList]
+			for future in futures:
+				results.append(future.result())
+
+		stats = EpsTlmStatistics(gapThreshold)
+		corruptFiles = list()
+		for fileStats, fileCorruptFiles in results:
+			corruptFiles += fileCorruptFiles
+		perChannel = dict()
+		for fileStats, fileCorruptFiles in results:
+			for cmd, channel in fileStats.channels.items():
+				perChannel.setdefault(cmd, list()).append(channel)
+		for cmd, channels in perChannel.items():
+			for channel in sorted(channels, key = lambda channel: channel.firstTime or EpsTlmCatalog.MINIMUM_TIME):
+				stats.channel(cmd).merge(channel)
+		return (stats, corruptFiles)
+
+	# ++++++++++++++++++++++++++
+
+	def __str__(self):
+		lines = [" {:32s} | {:>8s} | {:19s} | {:19s} | {:>10s} | {:>10s} | {:>10s} | {:>10s} | {:>5s}".format(
+			"CHANNEL", "COUNT", "START", "END", "MIN", "MAX", "MEAN", "STDDEV", "GAPS")]
+		for cmd in EpsTlmData.VALID_COMMANDS:
+			channel = self.channels.get(cmd)
+			if channel is None or channel.count == 0: continue
+			lines.append(" {:32s} | {:8d} | {:19s} | {:19s} | {:10.3f} | {:10.3f} | {:10.3f} | {:10.3f} | {:5d}".format(
+				EpsTlmData.cmdToString(cmd), channel.count, str(channel.startTime), str(channel.endTime),
+				channel.min, channel.max, channel.mean, channel.stddev(), channel.gapCount))
+		return "\n".join(lines)
+
+	def toJson(self):
+		return json.dumps(dict((EpsTlmData.cmdToString(cmd), self.channels[cmd].toDict())
+			for cmd in EpsTlmData.VALID_COMMANDS if cmd in self.channels), indent = 1, allow_nan = False)
+
+
+
+# ###############################
+# ########     Main     #########
+# ###############################
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(prog = "EPS_TLM_Stats", description = "Computes per channel statistics of EPS telemetry *.tlm files in one pass")
+	parser.add_argument("tlmFile", nargs = "+", help = "EPS telemetry *.tlm file or folder containing *.tlm files")
+	parser.add_argument("-c", "--channel", action = "append", help = "restricts the statistics to a channel, e.g. EPS:BCR1:VOLTAGE (repeatable)")
+	parser.add_argument("-g", "--gap", type = float, default = 60.0, help = "sampling interval in seconds above which a gap is counted")
+	parser.add_argument("-j", "--jobs", type = int, default = None, help = "number of worker processes, all cores by default")
+	parser.add_argument("--json", help = "outputs JSON instead of a table", action = "store_true")
+	parser.add_argument("--schema", help = "record format version, detected from the file name or content by default", choices = sorted(EpsTlmSchema.REGISTRY))
+
+	args = parser.parse_args()
+	if args.jobs is not None and args.jobs < 1:
+		parser.error("invalid number of jobs " + str(args.jobs) + ", expected at least 1")
+	cmds = None
+	if args.channel:
+		cmds = [EpsTlmData.cmdFromString(channel) for channel in args.channel]
+		if None in cmds:
+			parser.error("invalid channel in " + str(args.channel))
+
+	fr = EpsTlmFileReader()
+	fileList = list()
+	for fileName in args.tlmFile:
+		if fr.setFolder(fileName):
+			fileList += sorted(fr.fileList)
+		elif os.path.isfile(fileName):
+			fileList.append(fileName)
+		else:
+			print("Specified telemetry file " + fileName + " does not exist")
+
+	stats, corruptFiles = EpsTlmStatistics.readFileList(fileList, args.gap, cmds, args.schema, args.jobs)
+	if args.json:
+		print(stats.toJson())
+	else:
+		print(stats)
+		if corruptFiles: print("Corrupt files:", corruptFiles)
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+
+from eps_tlm_parser import *
+
+import argparse
+import sqlite3
+import datetime
+import os
+
+
+
+# ###############################
+# #####   Telemetry Store   #####
+# ###############################
+
+class EpsTlmStore:
+
+	BATCH_SIZE = 20000
+
+	SCHEMA = """
+		CREATE TABLE IF NOT EXISTS samples (
+			device	INTEGER NOT NULL,
+			source	INTEGER NOT NULL,
+			type	INTEGER NOT NULL,
+			time	REAL NOT NULL,
+			value	REAL,
+			file	INTEGER
+		);
+		CREATE INDEX IF NOT EXISTS samples_channel_time ON samples (device, source, type, time);
+		CREATE TABLE IF NOT EXISTS ledger (
+			id		INTEGER PRIMARY KEY,
+			path	TEXT UNIQUE NOT NULL,
+			size	INTEGER NOT NULL,
+			mtime	REAL NOT NULL,
+			count	INTEGER NOT NULL,
+			imported	TEXT NOT NULL
+		);
+	"""
+
+	# ++++++++++++++++++++++++++
+
+	def __init__(self, databaseName, mode = ""):
+		self.databaseName = databaseName
+		self.connection = sqlite3.connect(databaseName)
+		self.connection.execute("PRAGMA journal_mode = WAL")
+		self.connection.execute("PRAGMA synchronous = NORMAL")
+		self.connection.executescript(EpsTlmStore.SCHEMA)
+		self.connection.commit()
+		self.validCommands = set(EpsTlmData.VALID_COMMANDS)
+		self.batch = list()
+		self.setMode(mode)
+		self.setProgressCallback(do_nothing)
+
+	# ++++++++++++++++++++++++++
+
+	def close(self):
+		self.commit()
+		self.connection.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	# ++++++++++++++++++++++++++
+
+	def setMode(self, mode):
+		self.modePrint = "p" in mode
+
+	def setProgressCallback(self, callback_function):
+		self.progressCallback = callback_function
+
+	def resetProgressCallback(self):
+		self.progressCallback = do_nothing
+
+	# ++++++++++++++++++++++++++
+
+	def commandIsValid(self, cmd):
+		return cmd in self.validCommands
+
+	# ++++++++++++++++++++++++++
+
+	def addData(self, device, source, type, time, value):
+		try:
+			cmd = (EpsTlmData.DEVICE(device), EpsTlmData.SOURCE(source), EpsTlmData.TYPE(type))
+		except ValueError:
+			return False
+		if not self.commandIsValid(cmd):
+			return False
+		self.batch.append((cmd[0].value, cmd[1].value, cmd[2].value, time.timestamp(), value, None))
+		if len(self.batch) >= EpsTlmStore.BATCH_SIZE:
+			self.flush()
+		return True
+
+	def addTlmData(self, eps, fileId = None):
+		count = 0
+		for cmd in EpsTlmData.VALID_COMMANDS:
+			if not self.commandIsValid(cmd) or not eps.commandIsValid(cmd): continue
+			device, source, type = cmd[0].value, cmd[1].value, cmd[2].value
+			for time, value in eps.data[cmd]:
+				self.batch.append((device, source, type, time.timestamp(), value, fileId))
+				if len(self.batch) >= EpsTlmStore.BATCH_SIZE:
+					self.flush()
+			count += len(eps.data[cmd])
+		return count
+
+	# ++++++++++++++++++++++++++
+
+	def flush(self):
+		if self.batch:
+			self.connection.executemany("INSERT INTO samples VALUES (?, ?, ?, ?, ?, ?)", self.batch)
+			self.batch = list()
+
+	def commit(self):
+		self.flush()
+		self.connection.commit()
+
+	# ++++++++++++++++++++++++++
+
+	def deleteData(self, cmd):
+		self.commit()
+		self.connection.execute("DELETE FROM samples WHERE device = ? AND source = ? AND type = ?",
+			(cmd[0].value, cmd[1].value, cmd[2].value))
+		self.connection.commit()
+
+	def deleteAllData(self):
+		self.batch = list()
+		self.connection.execute("DELETE FROM samples")
+		self.connection.execute("DELETE FROM ledger")
+		self.connection.commit()
+
+	# ++++++++++++++++++++++++++
+	# Ingestion ledger
+	# ++++++++++++++++++++++++++
+
+	def fileIsImported(self, fileName):
+		stat = os.stat(fileName)
+		row = self.connection.execute("SELECT size, mtime FROM ledger WHERE path = ?",
+			(os.path.abspath(fileName),)).fetchone()
+		return row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime
+
+	def importFile(self, fileName):
+		if not os.path.isfile(fileName):
+			print("Specified telemetry file " + fileName + " does not exist")
+			return False
+		if self.fileIsImported(fileName):
+			if self.modePrint: print("Skipping already imported file " + fileName)
+			return True
+
+		# samples and ledger entry are committed in one transaction,
+		# samples of a previous import of a changed file are replaced
+		path = os.path.abspath(fileName)
+		stat = os.stat(fileName)
+		self.commit()
+		row = self.connection.execute("SELECT id FROM ledger WHERE path = ?", (path,)).fetchone()
+		if row is not None:
+			fileId = row[0]
+			self.connection.execute("DELETE FROM samples WHERE file = ?", (fileId,))
+		else:
+			fileId = self.connection.execute("INSERT INTO ledger (path, size, mtime, count, imported) VALUES (?, 0, 0, 0, '')", (path,)).lastrowid
+
+		reader = EpsTlmFileReader()
+		count = 0
+		for batch in reader.iterRecordBatches([fileName], batchSize = EpsTlmStore.BATCH_SIZE):
+			self.connection.executemany("INSERT INTO samples VALUES (?, ?, ?, ?, ?, ?)",
+				[(device, source, type, time.timestamp(), value, fileId) for device, source, type, time, value in batch])
+			count += len(batch)
+		if reader.corruptFiles:
+			self.connection.rollback()
+			return False
+
+		self.connection.execute("UPDATE ledger SET size = ?, mtime = ?, count = ?, imported = ? WHERE id = ?",
+			(stat.st_size, stat.st_mtime, count, datetime.datetime.now().isoformat(" "), fileId))
+		self.connection.commit()
+		if self.modePrint: print("Imported " + str(count) + " values from " + fileName)
+		return True
+
+	def importFileList(self, fileList):
+		ret = True
+		it = 0
+		self.progressCallback(float(it) / max(1, len(fileList)))
+		for file in fileList:
+			ret &= self.importFile(file)
+			it += 1
+			self.progressCallback(float(it) / len(fileList))
+		return ret
+
+	def getImportedFiles(self):
+		return [row[0] for row in self.connection.execute("SELECT path FROM ledger ORDER BY path")]
+
+	# ++++++++++++++++++++++++++
+	# Queries
+	# ++++++++++++++++++++++++++
+
+	def __selectWindow(self, columns, cmd, startTime, endTime, suffix = ""):
+		query = "SELECT " + columns + " FROM samples WHERE device = ? AND source = ? AND type = ?"
+		parameters = [cmd[0].value, cmd[1].value, cmd[2].value]
+		if startTime is not None:
+			query += " AND time >= ?"
+			parameters.append(startTime.timestamp())
+		if endTime is not None:
+			query += " AND time <= ?"
+			parameters.append(endTime.timestamp())
+		self.commit()
+		return self.connection.execute(query + suffix, parameters)
+
+	def iterData(self, cmd, startTime = None, endTime = None):
+		if not self.commandIsValid(cmd): return
+		for time, value in self.__selectWindow("time, value", cmd, startTime, endTime, " ORDER BY time"):
+			yield (datetime.datetime.fromtimestamp(time), value)
+
+	def getData(self, cmd, startTime = None, endTime = None):
+		return list(self.iterData(cmd, startTime, endTime))
+
+	def getDataCount(self, cmd, startTime = None, endTime = None):
+		if not self.commandIsValid(cmd): return 0
+		return self.__selectWindow("COUNT(*)", cmd, startTime, endTime).fetchone()[0]
+
+	def getTimeRange(self, cmd = None, startTime = None):
+		# of cmd, without one of all channels, each answered from the index;
+		# a startTime of EpsTlmCatalog.MINIMUM_TIME leaves out an unset clock
+		if cmd is None:
+			ranges = [self.getTimeRange(cmd, startTime) for cmd in EpsTlmData.VALID_COMMANDS]
+			ranges = [timeRange for timeRange in ranges if timeRange is not None]
+			if not ranges: return None
+			return (min(timeRange[0] for timeRange in ranges), max(timeRange[1] for timeRange in ranges))
+		if not self.commandIsValid(cmd): return None
+		row = self.__selectWindow("MIN(time), MAX(time)", cmd, startTime, None).fetchone()
+		if row[0] is None: return None
+		return (datetime.datetime.fromtimestamp(row[0]), datetime.datetime.fromtimestamp(row[1]))
+
+	def toTlmData(self, startTime = None, endTime = None, cmds = None):
+		eps = EpsTlmData()
+		cmds = [cmd for cmd in (cmds if cmds is not None else EpsTlmData.VALID_COMMANDS) if eps.commandIsValid(cmd)]
+		self.progressCallback(0.0)
+		for it, cmd in enumerate(cmds):
+			eps.data[cmd] = self.getData(cmd, startTime, endTime)
+			self.progressCallback(float(it + 1) / len(cmds))
+		eps.publish(sorted = True)		# the queries are ordered by time
+		return eps
+
+
+
+# ###############################
+# ########     Main     #########
+# ###############################
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(prog = "EPS_TLM_Store", description = "Imports EPS telemetry *.tlm files into an SQLite database and queries it")
+	parser.add_argument("database", help = "SQLite database file")
+	parser.add_argument("-i", "--import", dest = "importPath", help = "EPS telemetry *.tlm file or folder containing *.tlm files to import")
+	parser.add_argument("-c", "--channel", help = "queries a channel, e.g. EPS:BCR1:VOLTAGE")
+	parser.add_argument("--from", dest = "startTime", help = "start of the queried time window, e.g. \"2017-05-20 01:00:00\"")
+	parser.add_argument("--to", dest = "endTime", help = "end of the queried time window")
+	parser.add_argument("-p", "--print", help = "prints the import progress", action = "store_true")
+
+	args = parser.parse_args()
+	store = EpsTlmStore(args.database, mode = "p" if args.print else "")
+
+	if args.importPath:
+		fr = EpsTlmFileReader()
+		if os.path.isdir(args.importPath):
+			fr.setFolder(args.importPath)
+		else:
+			fr.setFile([args.importPath])
+		print("Importing files", fr.fileList)
+		if store.importFileList(fr.fileList):
+			print("Import completed")
+		else:
+			print("Import failed")
+
+	if args.channel:
+		cmd = EpsTlmData.cmdFromString(args.channel)
+		startTime = parseTime(args.startTime) if args.startTime else None
+		endTime = parseTime(args.endTime) if args.endTime else None
+		if cmd is None or not store.commandIsValid(cmd):
+			print("Invalid channel " + args.channel)
+		elif (args.startTime and startTime is None) or (args.endTime and endTime is None):
+			print("Invalid time window")
+		else:
+			for item in store.iterData(cmd, startTime, endTime):
+				print(("  " + str(item[0]) + "   | {:10.3f}").format(item[1]))
+
+	if not args.importPath and not args.channel:
+		for cmd in EpsTlmData.VALID_COMMANDS:
+			timeRange = store.getTimeRange(cmd)
+			if timeRange is not None:
+				print(EpsTlmData.cmdToString(cmd), store.getDataCount(cmd), str(timeRange[0]), str(timeRange[1]))
+
+	store.close()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+from eps_tlm_parser import *
+
+import argparse
+import asyncio
+import datetime
+import random
+
+
+
+# ###############################
+# ######   Stream Decoder   #####
+# ###############################
+
+class EpsTlmStreamDecoder:
+
+	CHUNK_SIZE = 64 * 1024
+
+	# ++++++++++++++++++++++++++
+
+	def __init__(self, version = EpsTlmSchema.DEFAULT_VERSION):
+		self.decoder = EpsTlmSchema.get(version).compile()
+		self.validCmds = set((cmd[0].value, cmd[1].value, cmd[2].value) for cmd in EpsTlmData.VALID_COMMANDS)
+		self.buffer = b""
+		self.errorCount = 0
+		self.itemCount = 0
+
+	# ++++++++++++++++++++++++++
+
+	def decode(self, chunk):
+		# decodes all complete records, an incomplete trailing record is kept for the next chunk
+		self.buffer += chunk
+		records, end, skipped = self.decoder.decode(self.buffer)
+		self.itemCount += skipped
+		self.errorCount += skipped
+		batch = list()
+		for width, time, device, source, type, value in records:
+			self.itemCount += 1
+			if (device, source, type) not in self.validCmds:
+				self.errorCount += 1
+				continue
+			batch.append((device, source, type, datetime.datetime.fromtimestamp(int(time / 1e9)), value))
+		self.buffer = self.buffer[end:]
+		return batch
+
+	# ++++++++++++++++++++++++++
+
+	async def __iterChunks(self, source):
+		# accepts an asyncio.StreamReader (or anything with an awaitable read) or an async iterable of bytes
+		if hasattr(source, "read"):
+			while True:
+				chunk = await source.read(EpsTlmStreamDecoder.CHUNK_SIZE)
+				if not chunk: break
+				yield chunk
+		else:
+			async for chunk in source:
+				yield chunk
+
+	async def iterRecordBatches(self, source):
+		# the source is only read when the consumer asks for the next batch, so a slow
+		# consumer throttles the sender through the transport's flow control
+		async for chunk in self.__iterChunks(source):
+			batch = self.decode(chunk)
+			if batch:
+				yield batch
+		if self.buffer:
+			print("Discarding incomplete trailing record of " + str(len(self.buffer)) + " bytes")
+			self.buffer = b""
+
+	async def feed(self, source, eps):
+		async for batch in self.iterRecordBatches(source):
+			for record in batch:
+				eps.addData(*record)
+			eps.publish()
+		return eps
+
+
+
+# ###############################
+# ######   Stand-in Server   ####
+# ###############################
+
+async def serveFile(fileName, host = "127.0.0.1", port = 0, maxChunkSize = 4096, delay = 0.0):
+	# serves a *.tlm file in randomly sized chunks, so records are split across reads
+	with openTlmFile(fileName) as file:
+		content = file.read()
+
+	async def handleClient(reader, writer):
+		offset = 0
+		while offset < len(content):
+			size = random.randint(1, maxChunkSize)
+			writer.write(content[offset:offset + size])
+			await writer.drain()
+			offset += size
+			if delay: await asyncio.sleep(delay)
+		writer.close()
+
+	return await asyncio.start_server(handleClient, host, port)
+
+
+
+# ###############################
+# ########     Main     #########
+# ###############################
+
+async def receive(host, port, mode, limits = None):
+	# with limits, alarms are printed as soon as the batch raising them is decoded
+	reader, writer = await asyncio.open_connection(host, port)
+	decoder = EpsTlmStreamDecoder()
+	eps = EpsTlmData(mode)
+	if limits is not None:
+		from eps_tlm_limits import EpsTlmLimitChecker
+		EpsTlmLimitChecker(limits, lambda event: print("{}:{} |".format(host, port), EpsTlmLimitChecker.eventToString(event))).attach(eps)
+	eps = await decoder.feed(reader, eps)
+	writer.close()
+	return (decoder, eps)
+
+async def receiveAll(hostPorts, mode, serveFileName = None, feedCount = 1, limits = None):
+	server = None
+	if serveFileName:
+		server = await serveFile(serveFileName)
+		hostPorts = hostPorts + [server.sockets[0].getsockname()[:2]] * feedCount
+	results = await asyncio.gather(*[receive(host, port, mode, limits) for host, port in hostPorts])
+	if server is not None:
+		server.close()
+		await server.wait_closed()
+	return results
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(prog = "EPS_TLM_Stream", description = "Decodes EPS telemetry records received over TCP")
+	parser.add_argument("address", nargs = "*", help = "HOST:PORT of a telemetry feed, several feeds are decoded concurrently")
+	parser.add_argument("--serve", metavar = "TLMFILE", help = "serves a *.tlm file from a local stand-in server and decodes it")
+	parser.add_argument("-n", "--feeds", type = int, default = 1, help = "number of concurrent connections to the stand-in server")
+	parser.add_argument("-p", "--print", help = "prints the received values", action = "store_true")
+	parser.add_argument("-s", "--sorted", help = "prints the values sorted according to the data type", action = "store_true")
+	parser.add_argument("-l", "--limits", metavar = "FILE", help = "JSON limit table the received values are checked against, see eps_tlm_limits.py")
+
+	args = parser.parse_args()
+	hostPorts = list()
+	for address in args.address:
+		host, port = address.rsplit(":", 1)
+		hostPorts.append((host, int(port)))
+	if not hostPorts and not args.serve:
+		parser.error("no telemetry feed given")
+
+	limits = None
+	if args.limits:
+		from eps_tlm_limits import EpsTlmLimit
+		limits = EpsTlmLimit.readFile(args.limits)
+		if limits is None: sys.exit(1)
+
+	results = asyncio.run(receiveAll(hostPorts, "p" if args.print else "", args.serve, args.feeds, limits))
+	for decoder, eps in results:
+		print("Received", decoder.itemCount, "records,", decoder.errorCount, "invalid")
+		if args.sorted:
+			eps.sortAllData()
+			print(eps)
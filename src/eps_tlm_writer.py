@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+
+from eps_tlm_parser import *
+
+import argparse
+import os
+
+import numpy
+
+
+
+# ###############################
+# ########   File Merger   ######
+# ###############################
+
+def readRecords(fileName, filter = None, version = None, outputVersion = None, prefetcher = None):
+	# the valid records of a file passing filter, in their file order, as an
+	# array of the output record layout; None for a corrupt file
+	schema = EpsTlmSchema.get(version) if version is not None else EpsTlmSchema.detect(fileName)
+	decoder = schema.compile()
+	encoder = EpsTlmSchema.get(EpsTlmSchema.DEFAULT_VERSION if outputVersion is None else outputVersion).compileEncoder()
+	if filter is None: filter = EpsTlmFilter()
+	validKeys = EpsTlmValidKeys(EpsTlmData.VALID_COMMANDS)
+
+	arrays = list()
+	itemCount = 0
+	errorCount = 0
+	rest = b""
+	blocks = iterTlmBlocks(fileName) if prefetcher is None else prefetcher.iterBlocks(fileName)
+	for buffer in blocks:
+		if rest: buffer = rest + buffer
+		array = None
+		if decoder.dtype is not None:
+			end = len(buffer) - len(buffer) % decoder.record.size
+			array = numpy.frombuffer(buffer, dtype = decoder.dtype, count = end // decoder.record.size)
+			if numpy.all(array["width"] == decoder.width):
+				keys = filter.rawKeys(array)
+				valid = numpy.isin(keys, validKeys.array)
+				itemCount += len(array)
+				errorCount += len(array) - int(numpy.count_nonzero(valid))
+				array = array[valid & filter.mask(array, keys)]
+				rest = buffer[end:]
+			else:
+				array = None
+		if array is None:
+			# records of several widths, decoded one by one
+			records, consumed, count, invalid = decoder.decodeFiltered(buffer, filter, validKeys)
+			itemCount += count
+			errorCount += invalid
+			array = numpy.array([record[1:] for record in records], dtype = [(name, encoder.dtype[name]) for name in encoder.dtype.names[1:]])
+			rest = buffer[consumed:]
+		if errorCount and itemCount > EpsTlmFileReader.MINIMUM_COUNT and float(errorCount) / itemCount > EpsTlmFileReader.INVALID_VALUE_RATE_LIMIT:
+			print("EPS telemetry file", fileName, "is corrupt:", errorCount, "/", itemCount)
+			return None
+
+		converted = numpy.empty(len(array), dtype = encoder.dtype)
+		converted["width"] = encoder.width
+		for name in encoder.dtype.names[1:]:
+			converted[name] = array[name]
+		arrays.append(converted)
+	return numpy.concatenate(arrays) if arrays else numpy.zeros(0, dtype = encoder.dtype)
+
+# ++++++++++++++++++++++++++
+
+def recordKeys(array):
+	return (array["device"].astype(numpy.uint32) << 16) | (array["source"].astype(numpy.uint32) << 8) | array["type"]
+
+def sortRecords(array, deduplicate = True):
+	# sorts by time, channel and value; returns (array, removed duplicate count)
+	array = array[numpy.lexsort((array["value"], recordKeys(array), array["time"]))]
+	if not deduplicate or len(array) < 2:
+		return (array, 0)
+	keys = recordKeys(array)
+	unique = numpy.ones(len(array), dtype = bool)
+	unique[1:] = (array["time"][1:] != array["time"][:-1]) | (keys[1:] != keys[:-1]) | (array["value"][1:] != array["value"][:-1])
+	return (array[unique], len(array) - int(numpy.count_nonzero(unique)))
+
+# ++++++++++++++++++++++++++
+
+def mergeFiles(fileList, outputName, filter = None, version = None, outputVersion = None, deduplicate = True, progressCallback = do_nothing):
+	# merges the files into one time sorted file without invalid and, by
+	# default, duplicate records; returns (record count, removed duplicate
+	# count, merged files) or None if the output could not be written.
+	# the files are merged in the order of their earliest record, records
+	# earlier than the earliest record of the next file are final and
+	# written, so only the overlap of the files is held in memory. records
+	# of an unset clock would overlap every file, they are collected by the
+	# first pass and written ahead of the others
+	minimumTime = int(EpsTlmCatalog.MINIMUM_TIME.timestamp() * 1e9)
+	starts = list()
+	early = list()
+	merged = list()
+	prefetcher = EpsTlmPrefetcher(fileList)
+	try:
+		for it, fileName in enumerate(fileList):
+			progressCallback(0.5 * it / max(1, len(fileList)))
+			try:
+				array = readRecords(fileName, filter, version, outputVersion, prefetcher)
+			except IOError:
+				print("Error reading telemetry file " + fileName)
+				continue
+			if array is None: continue
+			merged.append(fileName)
+			early.append(array[array["time"] < minimumTime])
+			if len(early[-1]) < len(array):
+				starts.append((int(array["time"][array["time"] >= minimumTime].min()), fileName))
+	finally:
+		prefetcher.close()
+	starts.sort()
+
+	encoder = EpsTlmSchema.get(EpsTlmSchema.DEFAULT_VERSION if outputVersion is None else outputVersion).compileEncoder()
+	pending, duplicates = sortRecords(numpy.concatenate(early) if early else numpy.zeros(0, dtype = encoder.dtype), deduplicate)
+	count = 0
+	tmpName = outputName + ".tmp"
+	prefetcher = EpsTlmPrefetcher([fileName for start, fileName in starts])
+	try:
+		with open(tmpName, "wb") as of:
+			of.write(pending.tobytes())
+			count += len(pending)
+			pending = pending[:0]
+			for it, (start, fileName) in enumerate(starts):
+				progressCallback(0.5 + 0.5 * it / len(starts))
+				array = readRecords(fileName, filter, version, outputVersion, prefetcher)
+				array = array[array["time"] >= minimumTime]
+				pending, removed = sortRecords(numpy.concatenate((pending, array)), deduplicate)
+				duplicates += removed
+				final = len(pending) if it + 1 == len(starts) else int(numpy.searchsorted(pending["time"], starts[it + 1][0], side = "left"))
+				of.write(pending[:final].tobytes())
+				count += final
+				pending = pending[final:]
+		os.replace(tmpName, outputName)
+	except IOError:
+		print("Error writing telemetry file " + outputName)
+		if os.path.exists(tmpName): os.remove(tmpName)
+		return None
+	finally:
+		prefetcher.close()
+	progressCallback(1.0)
+	return (count, duplicates, merged)
+
+# ++++++++++++++++++++++++++
+
+def verifyFile(outputName, fileList, filter = None, version = None, deduplicate = True):
+	# reads the output and the input files back with EpsTlmFileReader and
+	# compares them channel by channel: equal samples and, in the output,
+	# ascending times; without duplicates removed the sample counts match too
+	expected = EpsTlmFileReader()
+	expected.setSchema(version)
+	expected.setFilter(filter)
+	expected.setFile(fileList)
+	if fileList and not expected.readFileList():
+		return False
+	actual = EpsTlmFileReader()
+	actual.setFile(outputName)
+	if not actual.readFile():
+		return False
+
+	ret = True
+	for cmd in EpsTlmData.VALID_COMMANDS:
+		times = [time for time, value in actual.data[cmd]]
+		if any(later < earlier for earlier, later in zip(times, times[1:])):
+			print("Channel", EpsTlmData.cmdToString(cmd), "is not sorted")
+			ret = False
+		if deduplicate:
+			equal = set(actual.data[cmd]) == set(expected.data[cmd]) and len(actual.data[cmd]) <= len(expected.data[cmd])
+		else:
+			equal = sorted(actual.data[cmd]) == sorted(expected.data[cmd])
+		if not equal:
+			print("Channel", EpsTlmData.cmdToString(cmd), "differs:", len(actual.data[cmd]), "/", len(expected.data[cmd]), "samples")
+			ret = False
+	return ret
+
+
+
+# ###############################
+# ########     Main     #########
+# ###############################
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(prog = "EPS_TLM_Writer", description = "Merges EPS telemetry *.tlm files into one time sorted *.tlm file without invalid and duplicate records")
+	parser.add_argument("tlmFile", nargs = "+", help = "EPS telemetry *.tlm file or folder containing *.tlm files")
+	parser.add_argument("-o", "--output", required = True, help = "output *.tlm file")
+	parser.add_argument("--channel", action = "append", help = "only writes this channel, e.g. EPS:BCR1:VOLTAGE (repeatable)")
+	parser.add_argument("--device", action = "append", help = "only writes the channels of this device, e.g. BAT (repeatable)", choices = [device.name for device in EpsTlmData.DEVICE])
+	parser.add_argument("--from", dest = "startTime", help = "only writes records from this time on, e.g. 2017-05-20 13:00:00")
+	parser.add_argument("--to", dest = "endTime", help = "only writes records up to this time")
+	parser.add_argument("--schema", help = "record format version of the input, detected from the file name or content by default", choices = sorted(EpsTlmSchema.REGISTRY))
+	parser.add_argument("-k", "--keep-duplicates", help = "keeps records repeated in several files", action = "store_true")
+	parser.add_argument("--verify", help = "reads the output back and compares it with the input", action = "store_true")
+
+	args = parser.parse_args()
+	startTime = None if args.startTime is None else parseTime(args.startTime)
+	endTime = None if args.endTime is None else parseTime(args.endTime)
+	if (args.startTime and startTime is None) or (args.endTime and endTime is None):
+		parser.error("invalid time, expected e.g. 2017-05-20 13:00:00")
+	cmds = None
+	if args.channel:
+		cmds = [EpsTlmData.cmdFromString(channel) for channel in args.channel]
+		if None in cmds:
+			parser.error("invalid channel in " + str(args.channel))
+	devices = None if not args.device else [EpsTlmData.DEVICE[device] for device in args.device]
+	filter = EpsTlmFilter(cmds, devices, startTime, endTime)
+
+	fr = EpsTlmFileReader()
+	fileList = list()
+	for fileName in args.tlmFile:
+		if fr.setFolder(fileName, startTime, endTime):
+			fileList += fr.fileList
+		elif os.path.isfile(fileName):
+			fileList.append(fileName)
+		else:
+			print("Specified telemetry file " + fileName + " does not exist")
+	fileList = [fileName for fileName in uniqueFileList(fileList) if os.path.abspath(fileName) != os.path.abspath(args.output)]
+
+	result = mergeFiles(fileList, args.output, filter, args.schema, deduplicate = not args.keep_duplicates)
+	if result is None:
+		print("Writing failed")
+		sys.exit(1)
+	count, duplicates, merged = result
+	print("Wrote", count, "records of", len(merged), "files to", args.output + ",", duplicates, "duplicates removed")
+	if args.verify:
+		if verifyFile(args.output, merged, filter, args.schema, not args.keep_duplicates):
+			print("Verification passed")
+		else:
+			print("Verification failed")
+			sys.exit(1)
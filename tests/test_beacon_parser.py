@@ -0,0 +1,44 @@
+import datetime
+
+from eps_beacon_parser import *
+
+
+def writeLog(fileName, beacons):
+	with open(fileName, "w") as of:
+		for time, rawBeacon in beacons:
+			of.write(str(time) + ";" + rawBeacon.hex() + "\n")
+
+def readLog(fileName):
+	br = EpsBeaconLogReader()
+	br.setFile([fileName])
+	assert br.readFileList()
+	return br
+
+
+def test_constant_beacon_is_sampled_once_per_window(tmp_path):
+	# a stable state sends byte identical beacons, one every 30 s
+	start = datetime.datetime(2017, 5, 20, 12, 0, 0)
+	rawBeacon = bytes(range(EpsBeaconData.FRAME.size))
+	fileName = str(tmp_path / "constant.log")
+	writeLog(fileName, [(start + datetime.timedelta(seconds = 30 * it), rawBeacon) for it in range(120)])
+
+	br = readLog(fileName)
+	cmd = EpsBeaconLogReader.CHANNELS[EpsBeaconData.VOL.BAT][0]
+	assert 55 <= len(br.data[cmd]) <= 65
+	assert br.duplicateCount == 120 - len(br.data[cmd])
+
+def test_repeated_reception_is_dropped(tmp_path):
+	# the same beacon received by a second station a few seconds later
+	start = datetime.datetime(2017, 5, 20, 12, 0, 0)
+	rawBeacons = [bytes([it]) * EpsBeaconData.FRAME.size for it in range(10)]
+	beacons = list()
+	for it, rawBeacon in enumerate(rawBeacons):
+		time = start + datetime.timedelta(seconds = 30 * it)
+		beacons += [(time, rawBeacon), (time + datetime.timedelta(seconds = 4), rawBeacon)]
+	fileName = str(tmp_path / "repeated.log")
+	writeLog(fileName, beacons)
+
+	br = readLog(fileName)
+	cmd = EpsBeaconLogReader.CHANNELS[EpsBeaconData.VOL.BAT][0]
+	assert len(br.data[cmd]) == 10
+	assert br.duplicateCount == 10
@@ -0,0 +1,67 @@
+import http.client
+import json
+import os
+import urllib.parse
+
+import pytest
+
+from eps_tlm_server import *
+
+SAMPLE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "eps_telemetry_sample_file.v1.0.tlm")
+CHANNEL = "EPS:BCR1:VOLTAGE"
+
+
+@pytest.fixture(scope = "module")
+def server():
+	fr = EpsTlmFileReader()
+	fr.setFile([SAMPLE_FILE])
+	assert fr.readFileList()
+	fr.sortAllData()
+	server = startServer(fr, port = 0)
+	yield server
+	server.shutdown()
+	server.server_close()
+
+def get(server, path, headers = {}):
+	connection = http.client.HTTPConnection(*server.server_address[:2])
+	try:
+		connection.request("GET", path, headers = headers)
+		response = connection.getresponse()
+		return (response.status, dict(response.getheaders()), response.read())
+	finally:
+		connection.close()
+
+
+def test_channels(server):
+	status, headers, body = get(server, "/channels")
+	assert status == 200
+	channels = dict((channel["channel"], channel) for channel in json.loads(body)["channels"])
+	eps = server.service.eps
+	cmd = EpsTlmData.cmdFromString(CHANNEL)
+	assert channels[CHANNEL]["count"] == len(eps.data[cmd])
+	assert channels[CHANNEL]["start"] == eps.data[cmd][0][0].timestamp()
+	assert channels[CHANNEL]["end"] == eps.data[cmd][-1][0].timestamp()
+
+def test_data_window(server):
+	eps = server.service.eps
+	cmd = EpsTlmData.cmdFromString(CHANNEL)
+	startTime, endTime = eps.data[cmd][100][0], eps.data[cmd][200][0]
+	query = urllib.parse.urlencode({"channel": CHANNEL, "from": str(startTime), "to": str(endTime)})
+	status, headers, body = get(server, "/data?" + query)
+	assert status == 200
+	result = json.loads(body)
+	expected = eps.getData(cmd, startTime, endTime)
+	assert result["time"] == [time.timestamp() for time, value in expected]
+	assert result["value"] == [value for time, value in expected]
+
+def test_not_modified(server):
+	status, headers, body = get(server, "/data?channel=" + CHANNEL)
+	assert status == 200 and "ETag" in headers
+	status, headers, body = get(server, "/data?channel=" + CHANNEL, {"If-None-Match": headers["ETag"]})
+	assert status == 304
+	assert body == b""
+
+def test_unknown_channel(server):
+	status, headers, body = get(server, "/data?channel=X:Y:Z")
+	assert status == 404
+	assert "error" in json.loads(body)
@@ -0,0 +1,37 @@
+import os
+
+from eps_tlm_stats import *
+
+SAMPLE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "eps_telemetry_sample_file.v1.0.tlm")
+RECORD_SIZE = 16		# of the v1.0 sample file, the device is the 10th byte
+
+
+def test_corrupt_file_is_not_counted(tmp_path):
+	# the last two thirds of the records get an unknown device
+	content = bytearray(open(SAMPLE_FILE, "rb").read())
+	count = len(content) // RECORD_SIZE
+	for it in range(count // 3, count):
+		content[it * RECORD_SIZE + 9] = 250
+	fileName = str(tmp_path / "corrupt.v1.0.tlm")
+	with open(fileName, "wb") as of:
+		of.write(content)
+
+	stats, corruptFiles = EpsTlmStatistics.readFileList([fileName, SAMPLE_FILE], jobs = 1)
+	assert corruptFiles == [fileName]
+	expected, corruptFiles = EpsTlmStatistics.readFile(SAMPLE_FILE)
+	assert corruptFiles == []
+	for cmd, channel in expected.channels.items():
+		assert stats.channels[cmd].count == channel.count
+
+def test_json_has_no_nan():
+	stats = EpsTlmStatistics()
+	time = datetime.datetime(2017, 5, 20, 12, 0, 0)
+	stats.channel(EpsTlmData.VALID_COMMANDS[0]).add(time, 1.0)
+	stats.channel(EpsTlmData.VALID_COMMANDS[0]).add(time + datetime.timedelta(seconds = 1), math.nan)
+	stats.channel(EpsTlmData.VALID_COMMANDS[1]).add(time, math.inf)
+
+	result = json.loads(stats.toJson())
+	first = result[EpsTlmData.cmdToString(EpsTlmData.VALID_COMMANDS[0])]
+	second = result[EpsTlmData.cmdToString(EpsTlmData.VALID_COMMANDS[1])]
+	assert first["count"] == 2 and first["mean"] is None and first["stddev"] is None
+	assert second["max"] is None and second["min"] is None
@@ -0,0 +1,31 @@
+import asyncio
+import os
+import random
+
+from eps_tlm_stream import *
+
+SAMPLE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "eps_telemetry_sample_file.v1.0.tlm")
+
+
+async def receiveFromStandIn(maxChunkSize, feedCount):
+	server = await serveFile(SAMPLE_FILE, maxChunkSize = maxChunkSize)
+	host, port = server.sockets[0].getsockname()[:2]
+	try:
+		return await asyncio.gather(*[receive(host, port, "") for it in range(feedCount)])
+	finally:
+		server.close()
+		await server.wait_closed()
+
+def test_stream_matches_file_reader():
+	# the stand-in splits records across randomly sized reads
+	random.seed(28)
+	fr = EpsTlmFileReader()
+	fr.setFile([SAMPLE_FILE])
+	assert fr.readFileList()
+	assert sum(len(fr.data[cmd]) for cmd in EpsTlmData.VALID_COMMANDS) > 0
+
+	results = asyncio.run(receiveFromStandIn(maxChunkSize = 97, feedCount = 2))
+	for decoder, eps in results:
+		assert decoder.buffer == b""
+		for cmd in EpsTlmData.VALID_COMMANDS:
+			assert eps.data[cmd] == fr.data[cmd], EpsTlmData.cmdToString(cmd)
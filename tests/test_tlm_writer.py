@@ -0,0 +1,84 @@
+import os
+import shutil
+
+import pytest
+
+import eps_tlm_parser
+from eps_tlm_parser import *
+from eps_tlm_writer import mergeFiles, verifyFile
+
+SAMPLE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "eps_telemetry_sample_file.v1.0.tlm")
+RAW_COMMANDS = [cmd for cmd in EpsTlmData.VALID_COMMANDS if cmd[0] not in EpsTlmData.DERIVED_DEVICES]
+
+
+def readTlmFile(fileName):
+	fr = EpsTlmFileReader()
+	fr.setFile([fileName])
+	assert fr.readFileList()
+	return fr
+
+@pytest.fixture(scope = "module")
+def sample():
+	fr = readTlmFile(SAMPLE_FILE)
+	fr.sortAllData()
+	return fr
+
+
+@pytest.mark.parametrize("withNumpy", [True, False])
+def test_write_round_trip(sample, tmp_path, monkeypatch, withNumpy):
+	if not withNumpy: monkeypatch.setattr(eps_tlm_parser, "numpy", None)
+	fileName = str(tmp_path / "written.v1.0.tlm")
+	count = sample.writeTlmFile(fileName)
+	assert count == sum(len(sample.data[cmd]) for cmd in RAW_COMMANDS)
+
+	written = readTlmFile(fileName)
+	for cmd in RAW_COMMANDS:
+		assert written.data[cmd] == sample.data[cmd], EpsTlmData.cmdToString(cmd)
+
+def test_write_paths_are_identical(sample, tmp_path, monkeypatch):
+	# the NumPy and the pure Python encoder write the same bytes
+	arrayName = str(tmp_path / "array.v1.0.tlm")
+	recordName = str(tmp_path / "record.v1.0.tlm")
+	sample.writeTlmFile(arrayName)
+	monkeypatch.setattr(eps_tlm_parser, "numpy", None)
+	sample.writeTlmFile(recordName)
+	with open(arrayName, "rb") as arrayFile, open(recordName, "rb") as recordFile:
+		assert arrayFile.read() == recordFile.read()
+
+def test_write_time_window(sample, tmp_path):
+	cmd = RAW_COMMANDS[0]
+	startTime, endTime = sample.data[cmd][100][0], sample.data[cmd][200][0]
+	fileName = str(tmp_path / "window.v1.0.tlm")
+	sample.writeTlmFile(fileName, cmds = [cmd], startTime = startTime, endTime = endTime)
+	written = readTlmFile(fileName)
+	assert written.data[cmd] == sample.getData(cmd, startTime, endTime)
+	assert all(len(written.data[other]) == 0 for other in RAW_COMMANDS if other != cmd)
+
+
+def test_merge_round_trip(sample, tmp_path):
+	# a file merged with a copy of itself gives the file, sorted
+	copyName = str(tmp_path / "copy.v1.0.tlm")
+	shutil.copyfile(SAMPLE_FILE, copyName)
+	fileName = str(tmp_path / "merged.v1.0.tlm")
+	count, duplicates, merged = mergeFiles([SAMPLE_FILE, copyName], fileName)
+	assert merged == [SAMPLE_FILE, copyName]
+	assert verifyFile(fileName, [SAMPLE_FILE, copyName])
+
+	written = readTlmFile(fileName)
+	assert count == sum(len(written.data[cmd]) for cmd in RAW_COMMANDS)
+	for cmd in RAW_COMMANDS:
+		times = [time for time, value in written.data[cmd]]
+		assert times == sorted(times), EpsTlmData.cmdToString(cmd)
+		assert sorted(set(written.data[cmd])) == sorted(set(sample.data[cmd])), EpsTlmData.cmdToString(cmd)
+
+def test_merge_keeps_duplicates(sample, tmp_path):
+	copyName = str(tmp_path / "copy.v1.0.tlm")
+	shutil.copyfile(SAMPLE_FILE, copyName)
+	fileName = str(tmp_path / "merged.v1.0.tlm")
+	count, duplicates, merged = mergeFiles([SAMPLE_FILE, copyName], fileName, deduplicate = False)
+	assert duplicates == 0
+	assert verifyFile(fileName, [SAMPLE_FILE, copyName], deduplicate = False)
+
+	written = readTlmFile(fileName)
+	for cmd in RAW_COMMANDS:
+		assert sorted(written.data[cmd]) == sorted(sample.data[cmd] * 2), EpsTlmData.cmdToString(cmd)